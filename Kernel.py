@@ -1,15 +1,26 @@
 import numpy as np
 import pandas as pd
 
-import os, queue, sys
-from message.Message import MessageType
-
-from util.util import log_print
+import os, sys
+import pickle
+import random
+import tempfile
+import traceback
+from message.Message import Message, MessageType
+
+from util import util
+from util.EventLog import EventLog
+from util.EventQueue import make_event_queue
+from util.LogSink import make_log_sink
+from util.PartitionedRun import PartitionedRun
+from util.order.Order import Order
+from util.util import log_print, be_silent, picklable
 
 
 class Kernel:
 
-  def __init__(self, kernel_name, random_state = None):
+  def __init__(self, kernel_name, random_state = None, event_queue = 'heap', ns_clock = False,
+               log_format = 'bz2', log_writers = 0):
     # kernel_name is for human readers only.
     self.name = kernel_name
     self.random_state = random_state
@@ -20,11 +31,29 @@ class Kernel:
       sys.exit()
 
     # A single message queue to keep everything organized by increasing
-    # delivery timestamp.
-    self.messages = queue.PriorityQueue()
+    # delivery timestamp.  The backend is pluggable (see util.EventQueue):
+    # 'heap' is a lock-free heapq keyed on integer nanoseconds, 'priority'
+    # is the original thread-safe queue.PriorityQueue.
+    self.messages = make_event_queue(event_queue)
+
+    # Opt-in integer clock.  When ns_clock is True, the Kernel keeps currentTime,
+    # agentCurrentTimes and all queued delivery times as plain integer nanoseconds
+    # since the epoch, and only builds pd.Timestamp objects at the edges (agent
+    # wakeup/receiveMessage/kernelStarting calls, fmtTime, and custom_state).
+    # Agents may pass either pd.Timestamp or integer ns to setWakeup in either mode.
+    self.ns_clock = ns_clock
+    self.tz = None
+
+    # Storage format for agent and summary logs (see util.LogSink): 'bz2' writes
+    # one pickled DataFrame per agent, as always; 'parquet' and 'arrow' write
+    # columnar files batched per agent type, and require pyarrow.  With
+    # log_writers > 0, serialization and compression run in a bounded pool of
+    # that many writer threads, and teardown only waits for the pool to drain.
+    self.log_sink = make_log_sink(log_format, writers = log_writers)
 
     # currentTime is None until after kernelStarting() event completes
-    # for all agents.  This is a pd.Timestamp that includes the date.
+    # for all agents.  This is a pd.Timestamp that includes the date
+    # (or integer nanoseconds since the epoch when ns_clock is set).
     self.currentTime = None
 
     # Timestamp at which the Kernel was created.  Primarily used to
@@ -42,7 +71,7 @@ class Kernel:
     # by separate statistical summary programs.  Detailed event
     # logging should go only to the agent's individual log.  This
     # is for things like "final position value" and such.
-    self.summaryLog = []
+    self.summaryLog = EventLog(columns=('AgentID', 'AgentStrategy', 'EventType', 'Event'), index=None)
 
     log_print ("Kernel initialized: {}", self.name)
 
@@ -53,8 +82,139 @@ class Kernel:
              num_simulations = 1, defaultComputationDelay = 1,
              defaultLatency = 1, agentLatency = None, latencyNoise = [ 1.0 ],
              agentLatencyModel = None, skip_log = False,
-             seed = None, oracle = None, log_dir = None):
+             seed = None, oracle = None, log_dir = None,
+             checkpoint_time = None, checkpoint = None,
+             partitions = None, lookahead = None):
+
+    self._configure(agents, startTime, stopTime, defaultComputationDelay, defaultLatency,
+                    agentLatency, latencyNoise, agentLatencyModel, skip_log, seed, oracle, log_dir)
+
+    # Note that num_simulations has not yet been really used or tested
+    # for anything.  Instead we have been running multiple simulations
+    # with coarse parallelization from a shell script.
+
+    # If checkpoint_time is given, the simulation pauses once every event up
+    # to that time has been processed and calls checkpoint(kernel), which may
+    # save the state (saveCheckpoint) or branch the rest of the simulation
+    # into variants (forkVariants), before the simulation carries on.
+    #
+    # If partitions is given, the (rest of the) simulation runs in parallel,
+    # one OS process per partition of the agents (see runPartitioned).
+    for sim in range(num_simulations):
+      log_print ("Starting sim {}", sim)
+
+      self.startSimulation()
 
+      if checkpoint_time is not None:
+        self.processEvents(checkpoint_time, pause = True)
+        log_print ("\n--- Kernel checkpoint at {} ---", self.fmtTime(self.currentTime))
+        checkpoint(self)
+
+      if partitions is None:
+        self.runToEnd()
+      else:
+        self.runPartitioned(partitions, lookahead)
+
+      self.stopSimulation()
+
+      log_print ("Ending sim {}", sim)
+
+    return self.finishSimulation()
+
+
+  # A step-wise alternative to runner, for drivers (e.g. reinforcement learning
+  # loops or interactive sessions) that need to pause the simulation, inspect
+  # or act on it, and carry on:
+  #
+  #   kernel.initialize(agents = agents, startTime = ..., stopTime = ..., ...)
+  #   while not kernel.done():
+  #     kernel.run_until(next_decision_time)   # or kernel.step(n_events)
+  #     ...inspect agents, call their methods (e.g. placeLimitOrder)...
+  #   custom_state = kernel.terminate()
+  #
+  # Between calls, messages that agents send are sent at the kernel's current
+  # time, as if they had been sent while handling the last event processed.
+  # A simulation driven this way processes exactly the events, in exactly the
+  # order, that runner would.
+
+  def initialize(self, agents = [], startTime = None, stopTime = None,
+                 defaultComputationDelay = 1, defaultLatency = 1, agentLatency = None,
+                 latencyNoise = [ 1.0 ], agentLatencyModel = None, skip_log = False,
+                 seed = None, oracle = None, log_dir = None):
+    # Sets up the simulation as runner would (see runner for the parameters)
+    # and starts the agents, leaving the kernel at startTime with no events
+    # processed yet.
+    self._configure(agents, startTime, stopTime, defaultComputationDelay, defaultLatency,
+                    agentLatency, latencyNoise, agentLatencyModel, skip_log, seed, oracle, log_dir)
+    self.startSimulation()
+
+
+  def step(self, n_events = 1):
+    # Processes up to n_events more events (with None, as many as it takes to
+    # reach a pause), stopping early at the kernel stop time.  Returns the
+    # number of events processed.
+    return self.processEvents(self.stopTime, max_events = n_events)
+
+
+  def run_until(self, timestamp):
+    # Processes every event up to and including timestamp, leaving later events
+    # queued (so the current time is at most timestamp).  Beyond the kernel stop
+    # time, runs to the end of the simulation.  Returns the number of events
+    # processed.
+    if self._clock(timestamp) >= self._clock(self.stopTime):
+      return self.processEvents(self.stopTime)
+
+    return self.processEvents(timestamp, pause = True)
+
+
+  def done(self):
+    # True once the simulation has no more events to process before its stop time.
+    return self.messages.empty() or not (self.currentTime <= self._clock(self.stopTime))
+
+
+  def pause(self):
+    # Called (e.g. by an agent that needs a decision from the driver) to make
+    # the current step or run_until call return once the event being handled
+    # is done.  runner ignores pauses.
+    self.pauseRequested = True
+
+
+  def runToEnd(self):
+    # Processes events to the end of the simulation, ignoring any pauses.
+    while not self.done():
+      self.processEvents(self.stopTime)
+
+
+  def runPartitioned(self, partitions, lookahead = None):
+    # Processes events to the end of the simulation as runToEnd does, but in
+    # parallel: the agents are split into partitions (a number of partitions
+    # to deal them to round-robin, or the partition of each agent), and the
+    # events of each partition are processed by its own OS process, kept in
+    # step with the others by conservative synchronization.  lookahead (ns)
+    # defaults to the smallest latency between agents in different
+    # partitions.  Results are identical to a sequential run (see
+    # util.PartitionedRun for the conditions) except for order ids: each
+    # partition numbers its orders from its own block (partition p from
+    # p * ORDER_ID_BLOCK), so the ids in the logs, and in any order held by
+    # an agent, differ from the sequential run's.  They are still unique
+    # and nothing in the simulation depends on their values, but orders
+    # cannot be matched across the two runs by id.  They are not remapped
+    # when the partitions are merged, as they are embedded in every order,
+    # message and log written.  scripts/check_partitions.sh compares the
+    # two runs' logs with order ids left out.
+    PartitionedRun(self, partitions, lookahead).run()
+
+
+  def terminate(self):
+    # Ends the simulation wherever it is: stops and terminates the agents
+    # (which write their logs), writes the summary log, and returns the
+    # custom state as runner does.
+    self.stopSimulation()
+    return self.finishSimulation()
+
+
+  def _configure(self, agents, startTime, stopTime, defaultComputationDelay, defaultLatency,
+                 agentLatency, latencyNoise, agentLatencyModel, skip_log, seed, oracle, log_dir):
     # agents must be a list of agents for the simulation,
     #        based on class agent.Agent
     self.agents = agents
@@ -71,6 +231,9 @@ class Kernel:
     self.startTime = startTime
     self.stopTime = stopTime
 
+    # Timezone (if any) to restore when converting the integer clock back to pd.Timestamp.
+    self.tz = getattr(startTime, 'tz', None)
+
     # The global seed, NOT used for anything agent-related.
     self.seed = seed
 
@@ -95,7 +258,7 @@ class Kernel:
 
     # This also nicely enforces agents being unable to act before
     # the simulation startTime.
-    self.agentCurrentTimes = [self.startTime] * len(agents)
+    self.agentCurrentTimes = [self._clock(self.startTime)] * len(agents)
 
     # agentComputationDelays is in nanoseconds, starts with a default
     # value from config, and can be changed by any agent at any time
@@ -138,182 +301,222 @@ class Kernel:
     log_print ("Kernel started: {}", self.name)
     log_print ("Simulation started!")
 
-    # Note that num_simulations has not yet been really used or tested
-    # for anything.  Instead we have been running multiple simulations
-    # with coarse parallelization from a shell script.
-    for sim in range(num_simulations):
-      log_print ("Starting sim {}", sim)
-
-      # Event notification for kernel init (agents should not try to
-      # communicate with other agents, as order is unknown).  Agents
-      # should initialize any internal resources that may be needed
-      # to communicate with other agents during agent.kernelStarting().
-      # Kernel passes self-reference for agents to retain, so they can
-      # communicate with the kernel in the future (as it does not have
-      # an agentID).
-      log_print ("\n--- Agent.kernelInitializing() ---")
-      for agent in self.agents:
-        agent.kernelInitializing(self)
-
-      # Event notification for kernel start (agents may set up
-      # communications or references to other agents, as all agents
-      # are guaranteed to exist now).  Agents should obtain references
-      # to other agents they require for proper operation (exchanges,
-      # brokers, subscription services...).  Note that we generally
-      # don't (and shouldn't) permit agents to get direct references
-      # to other agents (like the exchange) as they could then bypass
-      # the Kernel, and therefore simulation "physics" to send messages
-      # directly and instantly or to perform disallowed direct inspection
-      # of the other agent's state.  Agents should instead obtain the
-      # agent ID of other agents, and communicate with them only via
-      # the Kernel.  Direct references to utility objects that are not
-      # agents are acceptable (e.g. oracles).
-      log_print ("\n--- Agent.kernelStarting() ---")
-      for agent in self.agents:
-        agent.kernelStarting(self.startTime)
-
-      # Set the kernel to its startTime.
-      self.currentTime = self.startTime
-      log_print ("\n--- Kernel Clock started ---")
-      log_print ("Kernel.currentTime is now {}", self.currentTime)
-
-      # Start processing the Event Queue.
-      log_print ("\n--- Kernel Event Queue begins ---")
-      log_print ("Kernel will start processing messages.  Queue length: {}", len(self.messages.queue))
-
-      # Track starting wall clock time and total message count for stats at the end.
-      eventQueueWallClockStart = pd.Timestamp('now')
-      ttl_messages = 0
-
-      # Process messages until there aren't any (at which point there never can
-      # be again, because agents only "wake" in response to messages), or until
-      # the kernel stop time is reached.
-      while not self.messages.empty() and self.currentTime and (self.currentTime <= self.stopTime):
-        # Get the next message in timestamp order (delivery time) and extract it.
-        self.currentTime, event = self.messages.get()
-        msg_recipient, msg_type, msg = event
-
-        # Periodically print the simulation time and total messages, even if muted.
-        if ttl_messages % 100000 == 0:
-          print ("\n--- Simulation time: {}, messages processed: {}, wallclock elapsed: {} ---\n".format(
-                         self.fmtTime(self.currentTime), ttl_messages, pd.Timestamp('now') - eventQueueWallClockStart))
 
+  def startSimulation(self):
+    # Event notification for kernel init (agents should not try to
+    # communicate with other agents, as order is unknown).  Agents
+    # should initialize any internal resources that may be needed
+    # to communicate with other agents during agent.kernelStarting().
+    # Kernel passes self-reference for agents to retain, so they can
+    # communicate with the kernel in the future (as it does not have
+    # an agentID).
+    log_print ("\n--- Agent.kernelInitializing() ---")
+    for agent in self.agents:
+      agent.kernelInitializing(self)
+
+    # Event notification for kernel start (agents may set up
+    # communications or references to other agents, as all agents
+    # are guaranteed to exist now).  Agents should obtain references
+    # to other agents they require for proper operation (exchanges,
+    # brokers, subscription services...).  Note that we generally
+    # don't (and shouldn't) permit agents to get direct references
+    # to other agents (like the exchange) as they could then bypass
+    # the Kernel, and therefore simulation "physics" to send messages
+    # directly and instantly or to perform disallowed direct inspection
+    # of the other agent's state.  Agents should instead obtain the
+    # agent ID of other agents, and communicate with them only via
+    # the Kernel.  Direct references to utility objects that are not
+    # agents are acceptable (e.g. oracles).
+    log_print ("\n--- Agent.kernelStarting() ---")
+    for agent in self.agents:
+      agent.kernelStarting(self.startTime)
+
+    # Set the kernel to its startTime.
+    self.currentTime = self._clock(self.startTime)
+    log_print ("\n--- Kernel Clock started ---")
+    log_print ("Kernel.currentTime is now {}", self.fmtTime(self.currentTime))
+
+    # Start processing the Event Queue.
+    log_print ("\n--- Kernel Event Queue begins ---")
+    log_print ("Kernel will start processing messages.  Queue length: {}", len(self.messages))
+
+    # Track starting wall clock time and total message count for stats at the end.
+    self.eventQueueWallClockStart = pd.Timestamp('now')
+    self.ttl_messages = 0
+
+    # Set by pause() to end the current step.
+    self.pauseRequested = False
+
+
+  def processEvents(self, stopTime, pause = False, max_events = None):
+    # Processes events in timestamp order until the given stop time is reached,
+    # or max_events events have been processed, and returns the number processed.
+    # With pause, processing instead stops before the first event later than
+    # stopTime, so that a later call carries on exactly where this one left off.
+    stopTime = self._clock(stopTime)
+    agents = self.agents
+    processed = 0
+
+    # Control has returned to the driver since any earlier pause request.
+    self.pauseRequested = False
+
+    # Silent mode is fixed for the run, so test it once rather than building
+    # (and discarding) log_print arguments for every message.
+    verbose = not be_silent()
+
+    # Process messages until there aren't any (at which point there never can
+    # be again, because agents only "wake" in response to messages), or until
+    # the kernel stop time is reached.
+    while not self.messages.empty() and self.currentTime and (self.currentTime <= stopTime):
+      if pause and _ns(self.messages.next_time()) > _ns(stopTime): break
+      if max_events is not None and processed >= max_events: break
+      if self.pauseRequested:
+        self.pauseRequested = False
+        break
+      processed += 1
+
+      # Get the next message in timestamp order (delivery time) and extract it.
+      self.currentTime, event = self.messages.get()
+      msg_recipient, msg_type, msg = event
+
+      # Agents always see the current time as a pd.Timestamp.
+      now = self._timestamp(self.currentTime)
+
+      # Periodically print the simulation time and total messages, even if muted.
+      if self.ttl_messages % 100000 == 0:
+        print ("\n--- Simulation time: {}, messages processed: {}, wallclock elapsed: {} ---\n".format(
+                       self.fmtTime(now), self.ttl_messages, pd.Timestamp('now') - self.eventQueueWallClockStart))
+
+      if verbose:
         log_print ("\n--- Kernel Event Queue pop ---")
-        log_print ("Kernel handling {} message for agent {} at time {}", 
-                   msg_type, msg_recipient, self.fmtTime(self.currentTime))
+        log_print ("Kernel handling {} message for agent {} at time {}",
+                   msg_type, msg_recipient, self.fmtTime(now))
 
-        ttl_messages += 1
+      self.ttl_messages += 1
 
-        # In between messages, always reset the currentAgentAdditionalDelay.
-        self.currentAgentAdditionalDelay = 0
+      # In between messages, always reset the currentAgentAdditionalDelay.
+      self.currentAgentAdditionalDelay = 0
 
-        # Dispatch message to agent.
-        if msg_type == MessageType.WAKEUP:
+      # Dispatch message to agent.
+      if msg_type == MessageType.WAKEUP:
 
-          # Who requested this wakeup call?
-          agent = msg_recipient
+        # Who requested this wakeup call?
+        agent = msg_recipient
 
-          # Test to see if the agent is already in the future.  If so,
-          # delay the wakeup until the agent can act again.
-          if self.agentCurrentTimes[agent] > self.currentTime:
-            # Push the wakeup call back into the PQ with a new time.
-            self.messages.put((self.agentCurrentTimes[agent],
-                              (msg_recipient, msg_type, msg)))
+        # Test to see if the agent is already in the future.  If so,
+        # delay the wakeup until the agent can act again.
+        if self.agentCurrentTimes[agent] > self.currentTime:
+          # Push the wakeup call back into the PQ with a new time.
+          self.messages.put(self.agentCurrentTimes[agent],
+                            (msg_recipient, msg_type, msg))
+          if verbose:
             log_print ("Agent in future: wakeup requeued for {}",
                        self.fmtTime(self.agentCurrentTimes[agent]))
-            continue
-            
-          # Set agent's current time to global current time for start
-          # of processing.
-          self.agentCurrentTimes[agent] = self.currentTime
+          continue
+
+        # Set agent's current time to global current time for start
+        # of processing.
+        self.agentCurrentTimes[agent] = self.currentTime
 
-          # Wake the agent.
-          agents[agent].wakeup(self.currentTime)
+        # Wake the agent.
+        agents[agent].wakeup(now)
 
-          # Delay the agent by its computation delay plus any transient additional delay requested.
-          self.agentCurrentTimes[agent] += pd.Timedelta(self.agentComputationDelays[agent] +
-                                                        self.currentAgentAdditionalDelay)
+        # Delay the agent by its computation delay plus any transient additional delay requested.
+        self.agentCurrentTimes[agent] += self._delta(self.agentComputationDelays[agent] +
+                                                     self.currentAgentAdditionalDelay)
 
+        if verbose:
           log_print ("After wakeup return, agent {} delayed from {} to {}",
-                     agent, self.fmtTime(self.currentTime), self.fmtTime(self.agentCurrentTimes[agent]))
+                     agent, self.fmtTime(now), self.fmtTime(self.agentCurrentTimes[agent]))
 
-        elif msg_type == MessageType.MESSAGE:
+      elif msg_type == MessageType.MESSAGE:
 
-          # Who is receiving this message?
-          agent = msg_recipient
+        # Who is receiving this message?
+        agent = msg_recipient
 
-          # Test to see if the agent is already in the future.  If so,
-          # delay the message until the agent can act again.
-          if self.agentCurrentTimes[agent] > self.currentTime:
-            # Push the message back into the PQ with a new time.
-            self.messages.put((self.agentCurrentTimes[agent],
-                              (msg_recipient, msg_type, msg)))
+        # Test to see if the agent is already in the future.  If so,
+        # delay the message until the agent can act again.
+        if self.agentCurrentTimes[agent] > self.currentTime:
+          # Push the message back into the PQ with a new time.
+          self.messages.put(self.agentCurrentTimes[agent],
+                            (msg_recipient, msg_type, msg))
+          if verbose:
             log_print ("Agent in future: message requeued for {}",
                        self.fmtTime(self.agentCurrentTimes[agent]))
-            continue
+          continue
 
-          # Set agent's current time to global current time for start
-          # of processing.
-          self.agentCurrentTimes[agent] = self.currentTime
+        # Set agent's current time to global current time for start
+        # of processing.
+        self.agentCurrentTimes[agent] = self.currentTime
 
-          # Deliver the message.
-          agents[agent].receiveMessage(self.currentTime, msg)
+        # Deliver the message.
+        agents[agent].receiveMessage(now, msg)
 
-          # Delay the agent by its computation delay plus any transient additional delay requested.
-          self.agentCurrentTimes[agent] += pd.Timedelta(self.agentComputationDelays[agent] +
-                                                        self.currentAgentAdditionalDelay)
+        # Delay the agent by its computation delay plus any transient additional delay requested.
+        self.agentCurrentTimes[agent] += self._delta(self.agentComputationDelays[agent] +
+                                                     self.currentAgentAdditionalDelay)
 
+        if verbose:
           log_print ("After receiveMessage return, agent {} delayed from {} to {}",
-                     agent, self.fmtTime(self.currentTime), self.fmtTime(self.agentCurrentTimes[agent]))
+                     agent, self.fmtTime(now), self.fmtTime(self.agentCurrentTimes[agent]))
 
-        else:
-          raise ValueError("Unknown message type found in queue",
-                           "currentTime:", self.currentTime,
-                           "messageType:", self.msg.type)
-
-      if self.messages.empty():
-        log_print ("\n--- Kernel Event Queue empty ---")
-
-      if self.currentTime and (self.currentTime > self.stopTime):
-        log_print ("\n--- Kernel Stop Time surpassed ---")
-
-      # Record wall clock stop time and elapsed time for stats at the end.
-      eventQueueWallClockStop = pd.Timestamp('now')
-
-      eventQueueWallClockElapsed = eventQueueWallClockStop - eventQueueWallClockStart
-
-      # Event notification for kernel end (agents may communicate with
-      # other agents, as all agents are still guaranteed to exist).
-      # Agents should not destroy resources they may need to respond
-      # to final communications from other agents.
-      log_print ("\n--- Agent.kernelStopping() ---")
-      for agent in agents:
-        agent.kernelStopping()
-
-      # Event notification for kernel termination (agents should not
-      # attempt communication with other agents, as order of termination
-      # is unknown).  Agents should clean up all used resources as the
-      # simulation program may not actually terminate if num_simulations > 1.
-      log_print ("\n--- Agent.kernelTerminating() ---")
-      for agent in agents:
-        agent.kernelTerminating()
-
-      print ("Event Queue elapsed: {}, messages: {}, messages per second: {:0.1f}".format(
-             eventQueueWallClockElapsed, ttl_messages, 
-             ttl_messages / (eventQueueWallClockElapsed / (np.timedelta64(1, 's')))))
-      log_print ("Ending sim {}", sim)
+      else:
+        raise ValueError("Unknown message type found in queue",
+                         "currentTime:", self.fmtTime(self.currentTime),
+                         "messageType:", msg_type)
+
+    return processed
+
+
+  def stopSimulation(self):
+    if self.messages.empty():
+      log_print ("\n--- Kernel Event Queue empty ---")
 
+    if self.currentTime and (self.currentTime > self._clock(self.stopTime)):
+      log_print ("\n--- Kernel Stop Time surpassed ---")
 
+    # Record wall clock stop time and elapsed time for stats at the end.
+    eventQueueWallClockStop = pd.Timestamp('now')
+
+    self.eventQueueWallClockElapsed = eventQueueWallClockStop - self.eventQueueWallClockStart
+
+    # Event notification for kernel end (agents may communicate with
+    # other agents, as all agents are still guaranteed to exist).
+    # Agents should not destroy resources they may need to respond
+    # to final communications from other agents.
+    log_print ("\n--- Agent.kernelStopping() ---")
+    for agent in self.agents:
+      agent.kernelStopping()
+
+    # Event notification for kernel termination (agents should not
+    # attempt communication with other agents, as order of termination
+    # is unknown).  Agents should clean up all used resources as the
+    # simulation program may not actually terminate if num_simulations > 1.
+    log_print ("\n--- Agent.kernelTerminating() ---")
+    for agent in self.agents:
+      agent.kernelTerminating()
+
+    print ("Event Queue elapsed: {}, messages: {}, messages per second: {:0.1f}".format(
+           self.eventQueueWallClockElapsed, self.ttl_messages,
+           self.ttl_messages / (self.eventQueueWallClockElapsed / (np.timedelta64(1, 's')))))
+
+
+  def finishSimulation(self):
     # The Kernel adds a handful of custom state results for all simulations,
     # which configurations may use, print, log, or discard.
-    self.custom_state['kernel_event_queue_elapsed_wallclock'] = eventQueueWallClockElapsed
-    self.custom_state['kernel_slowest_agent_finish_time'] = max(self.agentCurrentTimes)
+    self.custom_state['kernel_event_queue_elapsed_wallclock'] = self.eventQueueWallClockElapsed
+    self.custom_state['kernel_messages'] = self.ttl_messages
+    self.custom_state['kernel_slowest_agent_finish_time'] = self._timestamp(max(self.agentCurrentTimes))
 
     # Agents will request the Kernel to serialize their agent logs, usually
     # during kernelTerminating, but the Kernel must write out the summary
     # log itself.
     self.writeSummaryLog()
 
+    # Write out any logs the sink has batched (e.g. per agent type) and wait
+    # for pending writes to finish.
+    self.log_sink.close()
+
     # This should perhaps be elsewhere, as it is explicitly financial, but it
     # is convenient to have a quick summary of the results for now.
     print ("Mean ending value by agent type:")
@@ -329,6 +532,143 @@ class Kernel:
     return self.custom_state
 
 
+  def resume(self):
+    # Carries a simulation paused at a checkpoint (e.g. one restored by
+    # loadCheckpoint) on to the kernel stop time, then ends it as runner
+    # would, and returns the custom state.
+    self.runToEnd()
+    return self.terminate()
+
+
+  def saveCheckpoint(self, path):
+    # Writes the complete state of a paused simulation to path: the Kernel
+    # with its event queue, agents (and so their order books and random
+    # states), oracle and latency model, plus the global state of the
+    # simulator (message and order id counters, the global NumPy and Python
+    # random states).  Call it from a runner checkpoint function.
+    # loadCheckpoint(path).resume() then completes the simulation exactly as
+    # the original would have.
+    self.log_sink.drain()
+
+    with open(path, 'wb') as f:
+      pickle.dump((self, _globalState()), f, protocol = pickle.HIGHEST_PROTOCOL)
+
+    log_print ("Kernel checkpoint written to {}", path)
+
+
+  @staticmethod
+  def loadCheckpoint(path):
+    # Restores a simulation saved by saveCheckpoint, including the global
+    # state of the simulator, and returns its Kernel.  The Kernel and its
+    # agents may be modified (e.g. a different log_dir or agent parameters)
+    # before calling resume().
+    with open(path, 'rb') as f:
+      kernel, state = pickle.load(f)
+
+    _setGlobalState(state)
+    return kernel
+
+
+  def forkVariants(self, variants, max_parallel = None):
+    # Completes a paused simulation once per variant, each from its own copy
+    # of the current state, and returns the custom state of each in order.
+    # Call it from a runner checkpoint function: the simulation up to the
+    # checkpoint is computed once however many variants follow it.
+    #
+    # Each variant is a function of the copied Kernel that modifies it
+    # (e.g. switches on an execution agent) before the copy is resumed.
+    # Unless a variant changes kernel.log_dir, variant i logs to
+    # log_dir + '_variant_i'.  This Kernel itself is left unchanged and
+    # carries on after forkVariants returns.
+    #
+    # Where the platform supports it, each variant runs in a child process
+    # forked from this one (at most max_parallel at a time, by default one
+    # per CPU), which shares the state copy-on-write.  Otherwise, variants
+    # run one after another, each in a copy made with pickle.
+    self.log_sink.drain()
+    sys.stdout.flush()
+
+    if not hasattr(os, 'fork'):
+      snapshot = pickle.dumps((self, _globalState()), protocol = pickle.HIGHEST_PROTOCOL)
+      results = []
+      for i, variant in enumerate(variants):
+        kernel, state = pickle.loads(snapshot)
+        _setGlobalState(state)
+        results.append(kernel._runVariant(i, variant))
+
+      _setGlobalState(pickle.loads(snapshot)[1])
+      return results
+
+    if max_parallel is None: max_parallel = os.cpu_count()
+
+    results = [None] * len(variants)
+    failed = []
+    pending = list(enumerate(variants))
+    running = {}
+
+    while pending or running:
+      # Start as many variants as allowed.
+      while pending and len(running) < max_parallel:
+        i, variant = pending.pop(0)
+        fd, path = tempfile.mkstemp(prefix = 'abides_variant_', suffix = '.pkl')
+        os.close(fd)
+
+        pid = os.fork()
+        if pid == 0:
+          # The child completes its variant, writes the result for its parent, and exits.
+          status = 0
+          try:
+            result = self._runVariant(i, variant)
+          except BaseException:
+            traceback.print_exc()
+            result, status = None, 1
+
+          with open(path, 'wb') as f:
+            pickle.dump({ k : picklable(v) for k, v in result.items() } if result else None, f)
+
+          sys.stdout.flush()
+          sys.stderr.flush()
+          os._exit(status)
+
+        running[pid] = (i, path)
+
+      # Collect a variant that has finished, or else wait for the earliest
+      # started.  Only the variants' own processes are waited on, so that
+      # any other children of this process are left to whoever started them.
+      for pid in running:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done: break
+      else:
+        pid = next(iter(running))
+        _, status = os.waitpid(pid, 0)
+
+      i, path = running.pop(pid)
+
+      # A variant that failed, or died (e.g. from a signal) before writing
+      # its result, leaves no result to load.
+      try:
+        if status != 0 or os.path.getsize(path) == 0:
+          failed.append(i)
+        else:
+          with open(path, 'rb') as f:
+            results[i] = pickle.load(f)
+      finally:
+        os.remove(path)
+
+    if failed:
+      raise RuntimeError("Simulation variants failed or died (see any tracebacks above)", failed)
+
+    return results
+
+
+  def _runVariant(self, i, variant):
+    log_dir = self.log_dir
+    variant(self)
+    if self.log_dir == log_dir: self.log_dir = '{}_variant_{}'.format(log_dir, i)
+
+    return self.resume()
+
+
   def sendMessage(self, sender = None, recipient = None, msg = None, delay = 0):
     # Called by an agent to send a message to another agent.  The kernel
     # supplies its own currentTime (i.e. "now") to prevent possible
@@ -367,30 +707,34 @@ class Kernel:
     # This means message delay (before latency) is the agent's standard computation delay
     # PLUS any accumulated delay for this wake cycle PLUS any one-time requested delay
     # for this specific message only.
-    sentTime = self.currentTime + pd.Timedelta(self.agentComputationDelays[sender] + 
-                                               self.currentAgentAdditionalDelay + delay)
+    sentTime = self.currentTime + self._delta(self.agentComputationDelays[sender] +
+                                              self.currentAgentAdditionalDelay + delay)
 
     # Apply communication delay per the agentLatencyModel, if defined, or the
     # agentLatency matrix [sender][recipient] otherwise.
     if self.agentLatencyModel is not None:
       latency = self.agentLatencyModel.get_latency(sender_id = sender, recipient_id = recipient)
-      deliverAt = sentTime + pd.Timedelta(latency)
-      log_print ("Kernel applied latency {}, accumulated delay {}, one-time delay {} on sendMessage from: {} to {}, scheduled for {}",
-                 latency, self.currentAgentAdditionalDelay, delay, self.agents[sender].name, self.agents[recipient].name,
-                 self.fmtTime(deliverAt))
+      deliverAt = sentTime + self._delta(latency)
+      if not be_silent():
+        log_print ("Kernel applied latency {}, accumulated delay {}, one-time delay {} on sendMessage from: {} to {}, scheduled for {}",
+                   latency, self.currentAgentAdditionalDelay, delay, self.agents[sender].name, self.agents[recipient].name,
+                   self.fmtTime(deliverAt))
     else:
       latency = self.agentLatency[sender][recipient]
       noise = self.random_state.choice(len(self.latencyNoise), 1, self.latencyNoise)[0]
-      deliverAt = sentTime + pd.Timedelta(latency + noise)
-      log_print ("Kernel applied latency {}, noise {}, accumulated delay {}, one-time delay {} on sendMessage from: {} to {}, scheduled for {}",
-                 latency, noise, self.currentAgentAdditionalDelay, delay, self.agents[sender].name, self.agents[recipient].name,
-                 self.fmtTime(deliverAt))
+      deliverAt = sentTime + self._delta(latency + noise)
+      if not be_silent():
+        log_print ("Kernel applied latency {}, noise {}, accumulated delay {}, one-time delay {} on sendMessage from: {} to {}, scheduled for {}",
+                   latency, noise, self.currentAgentAdditionalDelay, delay, self.agents[sender].name, self.agents[recipient].name,
+                   self.fmtTime(deliverAt))
 
     # Finally drop the message in the queue with priority == delivery time.
-    self.messages.put((deliverAt, (recipient, MessageType.MESSAGE, msg)))
+    self.messages.put(deliverAt, (recipient, MessageType.MESSAGE, msg))
 
-    log_print ("Sent time: {}, current time {}, computation delay {}", sentTime, self.currentTime, self.agentComputationDelays[sender])
-    log_print ("Message queued: {}", msg)
+    if not be_silent():
+      log_print ("Sent time: {}, current time {}, computation delay {}", self.fmtTime(sentTime),
+                 self.fmtTime(self.currentTime), self.agentComputationDelays[sender])
+      log_print ("Message queued: {}", msg)
 
 
 
@@ -401,9 +745,12 @@ class Kernel:
     # Sender is required and should be the ID of the agent making the call.
     # The agent is responsible for maintaining any required state; the
     # kernel will not supply any parameters to the wakeup() call.
+    # requestedTime may be a pd.Timestamp or integer nanoseconds since the epoch.
 
     if requestedTime is None:
-        requestedTime = self.currentTime + pd.TimeDelta(1)
+      requestedTime = self.currentTime + self._delta(1)
+    else:
+      requestedTime = self._clock(requestedTime)
 
     if sender is None:
       raise ValueError("setWakeup() called without valid sender ID",
@@ -411,14 +758,15 @@ class Kernel:
 
     if self.currentTime and (requestedTime < self.currentTime):
       raise ValueError("setWakeup() called with requested time not in future",
-                       "currentTime:", self.currentTime,
-                       "requestedTime:", requestedTime)
+                       "currentTime:", self.fmtTime(self.currentTime),
+                       "requestedTime:", self.fmtTime(requestedTime))
 
-    log_print ("Kernel adding wakeup for agent {} at time {}",
-               sender, self.fmtTime(requestedTime))
+    if not be_silent():
+      log_print ("Kernel adding wakeup for agent {} at time {}",
+                 sender, self.fmtTime(requestedTime))
 
-    self.messages.put((requestedTime,
-                      (sender, MessageType.WAKEUP, None)))
+    self.messages.put(requestedTime,
+                      (sender, MessageType.WAKEUP, None))
 
 
   def getAgentComputeDelay(self, sender = None):
@@ -500,39 +848,35 @@ class Kernel:
     # the Kernel will construct a filename based on the name of the Agent
     # requesting log archival.
 
+    # dfLog may also be a util.EventLog, which is converted here.
+
     if self.skip_log: return
 
+    if isinstance(dfLog, EventLog): dfLog = dfLog.to_dataframe()
+
     path = os.path.join(".", "log", self.log_dir)
 
+    # The log sink chooses the file extension.  Logs without an explicit filename
+    # may be batched with those of other agents of the same type.
     if filename:
-      file = "{}.bz2".format(filename)
+      self.log_sink.write(path, filename, dfLog)
     else:
-      file = "{}.bz2".format(self.agents[sender].name.replace(" ",""))
-
-    if not os.path.exists(path):
-      os.makedirs(path)
-
-    dfLog.to_pickle(os.path.join(path, file), compression='bz2')
+      self.log_sink.write(path, self.agents[sender].name.replace(" ",""), dfLog,
+                          group=self.agents[sender].type)
 
 
   def appendSummaryLog (self, sender, eventType, event):
     # We don't even include a timestamp, because this log is for one-time-only
     # summary reporting, like starting cash, or ending cash.
-    self.summaryLog.append({ 'AgentID' : sender,
-                             'AgentStrategy' : self.agents[sender].type,
-                             'EventType' : eventType, 'Event' : event })
+    self.summaryLog.append(sender, self.agents[sender].type, eventType, event)
 
 
   def writeSummaryLog (self):
     path = os.path.join(".", "log", self.log_dir)
-    file = "summary_log.bz2"
-
-    if not os.path.exists(path):
-      os.makedirs(path)
 
-    dfLog = pd.DataFrame(self.summaryLog)
+    dfLog = self.summaryLog.to_dataframe()
 
-    dfLog.to_pickle(os.path.join(path, file), compression='bz2')
+    self.log_sink.write(path, "summary_log", dfLog)
 
 
   def updateAgentState (self, agent_id, state):
@@ -548,12 +892,43 @@ class Kernel:
     self.custom_state['agent_state'][agent_id] = state
 
  
+  def _clock(self, t):
+    # Converts a simulation time supplied by an agent or config (pd.Timestamp or
+    # integer nanoseconds since the epoch) to the Kernel's internal representation.
+    if self.ns_clock:
+      return t.value if isinstance(t, pd.Timestamp) else int(t)
+
+    return pd.Timestamp(t, tz=self.tz) if isinstance(t, (int, np.integer)) else t
+
+
+  def _timestamp(self, t):
+    # Converts the Kernel's internal representation of a simulation time to the
+    # pd.Timestamp that agents expect.
+    if self.ns_clock:
+      return pd.Timestamp(t, tz=self.tz)
+
+    return t
+
+
+  def _delta(self, ns):
+    # Converts a whole-nanosecond delay to something that can be added to an
+    # internal simulation time.
+    if self.ns_clock:
+      return int(ns)
+
+    return pd.Timedelta(ns)
+
+
   @staticmethod
   def fmtTime(simulationTime):
     # The Kernel class knows how to pretty-print time.  It is assumed simulationTime
     # is in nanoseconds since midnight.  Note this is a static method which can be
     # called either on the class or an instance.
 
+    # Integer simulation times (ns_clock mode) are nanoseconds since the epoch.
+    if isinstance(simulationTime, (int, np.integer)):
+      return pd.Timestamp(simulationTime)
+
     # Try just returning the pd.Timestamp now.
     return (simulationTime)
 
@@ -567,3 +942,31 @@ class Kernel:
 
     return "{:02d}:{:02d}:{:02d}.{:09d}".format(hr, m, s, ns)
 
+
+def _ns(t):
+  # Integer nanoseconds for a simulation time in either clock representation.
+  return getattr(t, 'value', t)
+
+
+def _globalState():
+  # Simulator state held outside the Kernel and its agents, which a checkpoint
+  # must carry for the simulation to resume exactly as it would have run on.
+  # (LimitOrder imports Kernel, so it is imported here.)
+  from util.order import LimitOrder
+
+  return { 'message_uniq' : Message.uniq, 'order_id' : Order.order_id,
+           'order_ids' : set(Order._order_ids), 'np_random' : np.random.get_state(),
+           'random' : random.getstate(), 'silent_mode' : util.silent_mode,
+           'limit_order_silent_mode' : LimitOrder.silent_mode }
+
+
+def _setGlobalState(state):
+  from util.order import LimitOrder
+
+  Message.uniq = state['message_uniq']
+  Order.order_id = state['order_id']
+  Order._order_ids = set(state['order_ids'])
+  np.random.set_state(state['np_random'])
+  random.setstate(state['random'])
+  util.silent_mode = state['silent_mode']
+  LimitOrder.silent_mode = state['limit_order_silent_mode']
@@ -1,7 +1,5 @@
-import pandas as pd
-
-from copy import deepcopy
-from util.util import log_print
+from util.EventLog import EventLog, snapshot
+from util.util import log_print, be_silent
 
 class Agent:
 
@@ -34,16 +32,10 @@ class Agent:
     self.currentTime = None
 
     # Agents may choose to maintain a log.  During simulation,
-    # it should be stored as a list of dictionaries.  The expected
-    # keys by default are: EventTime, EventType, Event.  Other
-    # Columns may be added, but will then require specializing
-    # parsing and will increase output dataframe size.  If there
-    # is a non-empty log, it will be written to disk as a Dataframe
-    # at kernel termination.
-
-    # It might, or might not, make sense to formalize these log Events
-    # as a class, with enumerated EventTypes and so forth.
-    self.log = []
+    # it is stored as a columnar util.EventLog with columns
+    # EventTime, EventType, Event.  If there is a non-empty log,
+    # it will be written to disk as a Dataframe at kernel termination.
+    self.log = EventLog()
     self.logEvent("AGENT_TYPE", type)
 
 
@@ -71,8 +63,9 @@ class Agent:
     # Base Agent schedules a wakeup call for the first available timestamp.
     # Subclass agents may override this behavior as needed.
 
-    log_print ("Agent {} ({}) requesting kernel wakeup at time {}",
-           self.id, self.name, self.kernel.fmtTime(startTime))
+    if not be_silent():
+      log_print ("Agent {} ({}) requesting kernel wakeup at time {}",
+                 self.id, self.name, self.kernel.fmtTime(startTime))
 
     self.setWakeup(startTime)
 
@@ -91,24 +84,22 @@ class Agent:
     # If this agent has been maintaining a log, convert it to a Dataframe
     # and request that the Kernel write it to disk before terminating.
     if self.log and self.log_to_file:
-      dfLog = pd.DataFrame(self.log)
-      dfLog.set_index('EventTime', inplace=True)
-      self.writeLog(dfLog)
+      self.writeLog(self.log.to_dataframe())
 
 
   ### Methods for internal use by agents (e.g. bookkeeping).
 
   def logEvent (self, eventType, event = '', appendSummaryLog = False):
-    # Adds an event to this agent's log.  The deepcopy of the Event field,
+    # Adds an event to this agent's log.  The snapshot of the Event field,
     # often an object, ensures later state changes to the object will not
-    # retroactively update the logged event.
+    # retroactively update the logged event.  Scalars are stored as they are
+    # and flat dictionaries are copied shallowly; anything else is deep copied.
 
     # We can make a single copy of the object (in case it is an arbitrary
     # class instance) for both potential log targets, because we don't
     # alter logs once recorded.
-    e = deepcopy(event)
-    self.log.append({ 'EventTime' : self.currentTime, 'EventType' : eventType,
-                      'Event' : e })
+    e = snapshot(event)
+    self.log.append(self.currentTime, eventType, e)
 
     if appendSummaryLog: self.kernel.appendSummaryLog(self.id, eventType, e)
 
@@ -126,8 +117,9 @@ class Agent:
 
     self.currentTime = currentTime
 
-    log_print ("At {}, agent {} ({}) received: {}",
-                  self.kernel.fmtTime(currentTime), self.id, self.name, msg)
+    if not be_silent():
+      log_print ("At {}, agent {} ({}) received: {}",
+                 self.kernel.fmtTime(currentTime), self.id, self.name, msg)
 
 
   def wakeup (self, currentTime):
@@ -137,8 +129,9 @@ class Agent:
 
     self.currentTime = currentTime
 
-    log_print ("At {}, agent {} ({}) received wakeup.",
-                  self.kernel.fmtTime(currentTime), self.id, self.name)
+    if not be_silent():
+      log_print ("At {}, agent {} ({}) received wakeup.",
+                 self.kernel.fmtTime(currentTime), self.id, self.name)
 
 
   ### Methods used to request services from the Kernel.  These should be used
@@ -107,7 +107,7 @@ class DynamicCppiAgent(TradingAgent):
             return
 
         delta_time = self.random_state.exponential(scale=1.0 / self.lambda_a)
-        self.setWakeup(currentTime + pd.Timedelta('{}ns'.format(int(round(delta_time)))))
+        self.setWakeup(currentTime + pd.Timedelta(int(round(delta_time))))
 
         if self.mkt_closed and (not self.symbol in self.daily_close_price):
             self.getCurrentSpread(self.symbol)
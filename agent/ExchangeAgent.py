@@ -4,12 +4,19 @@
 # the levels of order stream history to maintain per symbol (maintains all orders that led to the last N trades),
 # whether to log all order activity to the agent log, and a random state object (already seeded) to use
 # for stochasticity.
+#
+# For market replay, the exchange can also consume historical order streams directly (see replay below),
+# rather than receiving each historical order as a message from a replay agent.
 from agent.FinancialAgent import FinancialAgent
 from message.Message import Message
+from util.MarketFeatures import MarketFeatures
 from util.OrderBook import OrderBook
+from util.order.LimitOrder import LimitOrder
 from util.util import log_print
 
 import datetime as dt
+import heapq
+import math
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -18,13 +25,12 @@ warnings.simplefilter(action='ignore', category=UserWarning)
 import pandas as pd
 pd.set_option('display.max_rows', 500)
 
-from copy import deepcopy
-
 
 class ExchangeAgent(FinancialAgent):
 
   def __init__(self, id, name, type, mkt_open, mkt_close, symbols, book_freq='S', wide_book=False, pipeline_delay = 40000,
-               computation_delay = 1, stream_history = 0, log_orders = False, random_state = None):
+               computation_delay = 1, stream_history = 0, log_orders = False, random_state = None,
+               replay = None, replay_agent_id = None, feature_params = None, legacy_transacted_volume = False):
 
     super().__init__(id, name, type, random_state)
 
@@ -47,27 +53,65 @@ class ExchangeAgent(FinancialAgent):
     # to support certain agents from the auction literature (GD, HBL, etc).
     self.stream_history = stream_history
 
+    # Answer transacted volume queries as before the trade ledger, from the order history, which counts most
+    # executions from both sides of the trade?  Only for reproducing results of earlier versions.
+    self.legacy_transacted_volume = legacy_transacted_volume
+
     # Log all order activity?
     self.log_orders = log_orders
 
+    # At what frequency will we archive the order books for visualization and analysis?
+    # (Set before the order books are created, as they only track level changes when needed.)
+    self.book_freq = book_freq
+
+    # Store orderbook in wide format?
+    self.wide_book = wide_book
+
     # Create an order book for each symbol.
     self.order_books = {}
 
     for symbol in symbols:
       self.order_books[symbol] = OrderBook(self, symbol)
 
-    # At what frequency will we archive the order books for visualization and analysis?
-    self.book_freq = book_freq
-
-    # Store orderbook in wide format? ONLY WORKS with book_freq == 0
-    self.wide_book = wide_book
-
     # The subscription dict is a dictionary with the key = agent ID,
     # value = dict (key = symbol, value = list [levels (no of levels to recieve updates for),
-    # frequency (min number of ns between messages), last agent update timestamp]
-    # e.g. {101 : {'AAPL' : [1, 10, pd.Timestamp(10:00:00)}}
+    # frequency (min number of ns between messages), last agent update timestamp,
+    # market features to receive instead of levels (None for levels),
+    # whether to send changed levels only (L2 deltas), number of messages sent, levels last sent (bids, asks)]
+    # e.g. {101 : {'AAPL' : [1, 10, pd.Timestamp(10:00:00), None, False, 0, None]}}
     self.subscription_dict = {}
 
+    # Subscriptions waiting for their next message, in a heap per symbol ordered by the earliest order book
+    # update time (in ns) at which each is due: entries (due, rank, seq, agent ID, symbol, subscription), where
+    # rank orders agents by first subscription.  Publishing then only touches the subscriptions that are due,
+    # instead of checking every subscriber after every order.  Entries for cancelled or replaced subscriptions
+    # are discarded when they reach the front.
+    self.subscription_queues = {}
+    self.subscriber_rank = {}
+    self.subscription_seq = 0
+
+    # Microstructure features (util.MarketFeatures) maintained for feature subscribers, by symbol.  Each
+    # symbol's features are created, and start tracking the book, at its first feature subscription.
+    # feature_params are passed to each MarketFeatures (e.g. {'depth': 10, 'vwap_window': '1min'}).
+    self.feature_params = feature_params if feature_params is not None else {}
+    self.market_features = {}
+
+    # Historical order streams to replay directly into the order books: a dictionary with key = symbol,
+    # value = time-ordered source with peek_time() and next_batch() (e.g. a util.ReplayStore cursor).
+    # The exchange wakes at each historical timestamp and applies that batch to the book itself, so
+    # historical orders cost one event queue entry per timestamp instead of a round trip of messages
+    # per order.  Only the orders of the simulated agents travel through the kernel.
+    self.replay = replay if replay is not None else {}
+
+    # While a batch of order instructions from one agent is being applied (see receiveMessage), the order
+    # acceptances and cancellations for that agent are collected here, as (agent id, {message type: [orders]}),
+    # and sent as one ORDER_BATCH_ACK.
+    self.batch_acks = None
+
+    # Historical orders are attributed to this agent id (by default, the exchange itself).  Notifications
+    # addressed to it (acceptances, executions, cancellations) are not sent.
+    self.replay_agent_id = replay_agent_id if replay_agent_id is not None else id
+
   # The exchange agent overrides this to obtain a reference to an oracle.
   # This is needed to establish a "last trade price" at open (i.e. an opening
   # price) in case agents query last trade before any simulated trades are made.
@@ -110,6 +154,60 @@ class ExchangeAgent(FinancialAgent):
         print("Time taken to log the order book: {}".format(end_time - start_time))
         print("Order book archival complete.")
 
+  def wakeup(self, currentTime):
+    super().wakeup(currentTime)
+
+    if self.replay:
+      self.replayOrders(currentTime)
+
+  def replayOrders(self, currentTime):
+    # Apply every historical order due by now to the order books, then ask to be woken for the next batch.
+    self.setComputationDelay(self.computation_delay)
+
+    # Like orders received after the close, historical orders after the close are discarded.
+    if currentTime > self.mkt_close: return
+
+    next_time = None
+    for symbol, source in self.replay.items():
+      t = source.peek_time()
+      while t is not None and t <= currentTime:
+        _, orders = source.next_batch()
+        for order in orders:
+          self.replayOrder(currentTime, symbol, order)
+        t = source.peek_time()
+
+      if t is not None and (next_time is None or t < next_time): next_time = t
+
+    if next_time is not None:
+      self.setWakeup(next_time)
+
+  def replayOrder(self, currentTime, symbol, order):
+    # Apply one historical order (a dictionary with ORDER_ID, SIZE, PRICE and BUY_SELL_FLAG) to the book for symbol.
+    # As in MarketReplayAgent, an unknown id with a positive size is a new limit order, a zero size cancels the
+    # resting order, and anything else modifies it.
+    book = self.order_books[symbol]
+    order_id = order['ORDER_ID']
+    is_buy_order = order['BUY_SELL_FLAG'] == 'BUY'
+
+    existing_order = book.bids.get(order_id)
+    if existing_order is None: existing_order = book.asks.get(order_id)
+
+    if existing_order is None:
+      if order['SIZE'] <= 0: return
+      new_order = LimitOrder(self.replay_agent_id, currentTime, symbol, order['SIZE'], is_buy_order, order['PRICE'],
+                             order_id=order_id)
+      if self.log_orders: self.logEvent('LIMIT_ORDER', new_order.to_dict())
+      book.handleLimitOrder(new_order)
+    elif order['SIZE'] == 0:
+      if self.log_orders: self.logEvent('CANCEL_ORDER', existing_order.to_dict())
+      book.cancelOrder(existing_order)
+    else:
+      if self.log_orders: self.logEvent('MODIFY_ORDER', existing_order.to_dict())
+      book.modifyOrder(existing_order, LimitOrder(self.replay_agent_id, currentTime, symbol, order['SIZE'],
+                                                  is_buy_order, order['PRICE'], order_id=order_id))
+
+    self.publishOrderBookData([symbol])
+
   def receiveMessage(self, currentTime, msg):
     super().receiveMessage(currentTime, msg)
 
@@ -146,6 +244,9 @@ class ExchangeAgent(FinancialAgent):
     # Log order messages only if that option is configured.  Log all other messages.
     if msg.body['msg'] in ['LIMIT_ORDER', 'MARKET_ORDER', 'CANCEL_ORDER', 'MODIFY_ORDER']:
       if self.log_orders: self.logEvent(msg.body['msg'], msg.body['order'].to_dict())
+    elif msg.body['msg'] in ['LIMIT_ORDERS', 'CANCEL_ALL_ORDERS', 'REPLACE_ORDERS']:
+      if self.log_orders:
+        self.logEvent(msg.body['msg'], [order.to_dict() for order in msg.body.get('orders', [])])
     else:
       self.logEvent(msg.body['msg'], msg.body['sender'])
 
@@ -241,9 +342,10 @@ class ExchangeAgent(FinancialAgent):
       if order.symbol not in self.order_books:
         log_print("Limit Order discarded.  Unknown symbol: {}", order.symbol)
       else:
-        # Hand the order to the order book for processing.
-        self.order_books[order.symbol].handleLimitOrder(deepcopy(order))
-        self.publishOrderBookData()
+        # Hand the order to the order book for processing.  Orders are not copied on arrival:
+        # the sending agent keeps its own copy, and the order book only clones what it sends back.
+        self.order_books[order.symbol].handleLimitOrder(order)
+        self.publishOrderBookData([order.symbol])
     elif msg.body['msg'] == "MARKET_ORDER":
       order = msg.body['order']
       log_print("{} received MARKET_ORDER: {}", self.name, order)
@@ -251,8 +353,8 @@ class ExchangeAgent(FinancialAgent):
         log_print("Market Order discarded.  Unknown symbol: {}", order.symbol)
       else:
         # Hand the market order to the order book for processing.
-        self.order_books[order.symbol].handleMarketOrder(deepcopy(order))
-        self.publishOrderBookData()
+        self.order_books[order.symbol].handleMarketOrder(order)
+        self.publishOrderBookData([order.symbol])
     elif msg.body['msg'] == "CANCEL_ORDER":
       # Note: this is somewhat open to abuse, as in theory agents could cancel other agents' orders.
       # An agent could also become confused if they receive a (partial) execution on an order they
@@ -264,8 +366,8 @@ class ExchangeAgent(FinancialAgent):
         log_print("Cancellation request discarded.  Unknown symbol: {}", order.symbol)
       else:
         # Hand the order to the order book for processing.
-        self.order_books[order.symbol].cancelOrder(deepcopy(order))
-        self.publishOrderBookData()
+        self.order_books[order.symbol].cancelOrder(order)
+        self.publishOrderBookData([order.symbol])
     elif msg.body['msg'] == 'MODIFY_ORDER':
       # Replace an existing order with a modified order.  There could be some timing issues
       # here.  What if an order is partially executed, but the submitting agent has not
@@ -275,120 +377,179 @@ class ExchangeAgent(FinancialAgent):
       # happens.
       order = msg.body['order']
       new_order = msg.body['new_order']
-      log_print("{} received MODIFY_ORDER: {}, new order: {}".format(self.name, order, new_order))
+      log_print("{} received MODIFY_ORDER: {}, new order: {}", self.name, order, new_order)
       if order.symbol not in self.order_books:
-        log_print("Modification request discarded.  Unknown symbol: {}".format(order.symbol))
+        log_print("Modification request discarded.  Unknown symbol: {}", order.symbol)
+      else:
+        self.order_books[order.symbol].modifyOrder(order, new_order)
+        self.publishOrderBookData([order.symbol])
+    elif msg.body['msg'] in ['LIMIT_ORDERS', 'CANCEL_ALL_ORDERS', 'REPLACE_ORDERS']:
+      # Batched order instructions for one symbol: place several limit orders, cancel all of the agent's
+      # resting orders, or both (replace the agent's orders, e.g. a market maker's ladder).  The batch is
+      # applied in one step, with no other activity in between, and the agent receives one ORDER_BATCH_ACK
+      # listing the orders cancelled and accepted instead of a message per order.  Executions are still
+      # notified individually.
+      symbol, agent_id = msg.body['symbol'], msg.body['sender']
+      log_print("{} received {} ({}) from agent {}", self.name, msg.body['msg'], symbol, agent_id)
+      if symbol not in self.order_books:
+        log_print("Batch order request discarded.  Unknown symbol: {}", symbol)
       else:
-        self.order_books[order.symbol].modifyOrder(deepcopy(order), deepcopy(new_order))
-        self.publishOrderBookData()
+        book = self.order_books[symbol]
+        self.batch_acks = (agent_id, {'ORDER_CANCELLED': [], 'ORDER_ACCEPTED': []})
+
+        if msg.body['msg'] != 'LIMIT_ORDERS':
+          book.cancelAgentOrders(agent_id)
+        if msg.body['msg'] != 'CANCEL_ALL_ORDERS':
+          for order in msg.body['orders']:
+            book.handleLimitOrder(order)
+
+        acks = self.batch_acks[1]
+        self.batch_acks = None
+
+        self.sendMessage(agent_id, Message({"msg": "ORDER_BATCH_ACK", "symbol": symbol,
+                                            "cancelled": acks['ORDER_CANCELLED'],
+                                            "accepted": acks['ORDER_ACCEPTED']}))
+        self.publishOrderBookData([symbol])
 
   def updateSubscriptionDict(self, msg, currentTime):
     # The subscription dict is a dictionary with the key = agent ID,
     # value = dict (key = symbol, value = list [levels (no of levels to recieve updates for),
-    # frequency (min number of ns between messages), last agent update timestamp]
-    # e.g. {101 : {'AAPL' : [1, 10, pd.Timestamp(10:00:00)}}
+    # frequency (min number of ns between messages), last agent update timestamp,
+    # market features to receive instead of levels (None for levels),
+    # whether to send changed levels only (L2 deltas), number of messages sent, levels last sent (bids, asks)]
+    # e.g. {101 : {'AAPL' : [1, 10, pd.Timestamp(10:00:00), None, False, 0, None]}}
     if msg.body['msg'] == "MARKET_DATA_SUBSCRIPTION_REQUEST":
       agent_id, symbol, levels, freq = msg.body['sender'], msg.body['symbol'], msg.body['levels'], msg.body['freq']
-      self.subscription_dict[agent_id] = {symbol: [levels, freq, currentTime]}
+      features = msg.body.get('features')
+      if features is not None:
+        MarketFeatures.check(features)
+        if symbol not in self.market_features:
+          self.market_features[symbol] = MarketFeatures(self.order_books[symbol], **self.feature_params)
+          self.market_features[symbol].update(currentTime)
+      subscription = [levels, freq, currentTime, features, msg.body.get('delta', False), 0, None]
+      self.subscription_dict[agent_id] = {symbol: subscription}
+      self.subscriber_rank.setdefault(agent_id, len(self.subscriber_rank))
+      self.queueSubscription(agent_id, symbol, subscription)
     elif msg.body['msg'] == "MARKET_DATA_SUBSCRIPTION_CANCELLATION":
       agent_id, symbol = msg.body['sender'], msg.body['symbol']
       del self.subscription_dict[agent_id][symbol]
 
-  def publishOrderBookData(self):
+  def publishOrderBookData(self, symbols=None):
     '''
     The exchange agents sends an order book update to the agents using the subscription API if one of the following
     conditions are met:
     1) agent requests ALL order book updates (freq == 0)
     2) order book update timestamp > last time agent was updated AND the orderbook update time stamp is greater than
     the last agent update time stamp by a period more than that specified in the freq parameter.
+
+    Agents that subscribed to market features are sent a MARKET_FEATURES message with their values instead of
+    the order book levels, and agents that subscribed to L2 deltas are sent only the levels that changed.
+
+    symbols are the symbols whose order books were updated (default: all of them).  Only their market features
+    are updated, so the cached features of the other books stay valid.
     '''
-    for agent_id, params in self.subscription_dict.items():
-      for symbol, values in params.items():
-        levels, freq, last_agent_update = values[0], values[1], values[2]
-        orderbook_last_update = self.order_books[symbol].last_update_ts
-        if (freq == 0) or \
-           ((orderbook_last_update > last_agent_update) and ((orderbook_last_update - last_agent_update).delta >= freq)):
-          self.sendMessage(agent_id, Message({"msg": "MARKET_DATA",
-                                              "symbol": symbol,
-                                              "bids": self.order_books[symbol].getInsideBids(levels),
-                                              "asks": self.order_books[symbol].getInsideAsks(levels),
-                                              "last_transaction": self.order_books[symbol].last_trade,
-                                              "exchange_ts": self.currentTime}))
-          self.subscription_dict[agent_id][symbol][2] = orderbook_last_update
+    # Called after every order book update.
+    for symbol in self.market_features if symbols is None else symbols:
+      features = self.market_features.get(symbol)
+      if features is not None: features.update(self.currentTime)
+
+    # Collect the subscriptions now due from the front of each symbol's queue.
+    due = []
+    for symbol, queue in self.subscription_queues.items():
+      orderbook_last_update = self.order_books[symbol].last_update_ts
+      now = orderbook_last_update.value if orderbook_last_update is not None else -math.inf
+      while queue and queue[0][0] <= now:
+        entry = heapq.heappop(queue)
+        if self.subscription_dict.get(entry[3], {}).get(symbol) is entry[5]: due.append(entry)
+
+    # Send in the order the agents first subscribed, as when every subscription was checked in turn.
+    due.sort(key=lambda entry: entry[1])
+
+    for _, _, _, agent_id, symbol, subscription in due:
+      levels, features, delta, sent, last_sent = subscription[0], subscription[3], subscription[4], subscription[5], subscription[6]
+      book = self.order_books[symbol]
+      if features is not None:
+        self.sendMessage(agent_id, Message({"msg": "MARKET_FEATURES",
+                                            "symbol": symbol,
+                                            "features": self.market_features[symbol].values(features),
+                                            "last_transaction": book.last_trade,
+                                            "exchange_ts": self.currentTime}))
+      elif delta:
+        # L2 delta subscribers get the levels that changed since their last message (volume 0 for a level that
+        # is gone), after a first message with all levels.  Messages are numbered, as they may arrive out of order.
+        bids, asks = book.getInsideBids(levels), book.getInsideAsks(levels)
+        self.sendMessage(agent_id, Message({"msg": "MARKET_DATA",
+                                            "symbol": symbol,
+                                            "bids": self.bookDelta(last_sent[0], bids) if sent else bids,
+                                            "asks": self.bookDelta(last_sent[1], asks) if sent else asks,
+                                            "delta": sent > 0,
+                                            "seq": sent,
+                                            "last_transaction": book.last_trade,
+                                            "exchange_ts": self.currentTime}))
+        subscription[6] = (bids, asks)
+      else:
+        bids, asks = book.getInsideBids(levels), book.getInsideAsks(levels)
+        self.sendMessage(agent_id, Message({"msg": "MARKET_DATA",
+                                            "symbol": symbol,
+                                            "bids": bids,
+                                            "asks": asks,
+                                            "last_transaction": book.last_trade,
+                                            "exchange_ts": self.currentTime}))
+      subscription[2] = book.last_update_ts
+      subscription[5] = sent + 1
+      self.queueSubscription(agent_id, symbol, subscription)
+
+  def queueSubscription(self, agent_id, symbol, subscription):
+    # Queue a subscription until the first order book update at least freq ns after its last update
+    # (any update at all, if freq is 0).  freq may also be given as a pd.Timedelta.
+    freq, last_agent_update = subscription[1], subscription[2]
+    if isinstance(freq, pd.Timedelta): freq = freq.value
+    due = last_agent_update.value + math.ceil(freq) if freq else -math.inf
+
+    heapq.heappush(self.subscription_queues.setdefault(symbol, []),
+                   (due, self.subscriber_rank[agent_id], self.subscription_seq, agent_id, symbol, subscription))
+    self.subscription_seq += 1
+
+  @staticmethod
+  def bookDelta(old, new):
+    # The levels of new that differ from old, and (price, 0) for each price of old no longer in new.
+    if old is new: return []
+    old = dict(old)
+    delta = [(price, volume) for price, volume in new if old.pop(price, None) != volume]
+    delta.extend((price, 0) for price in old)
+    return delta
 
   def logOrderBookSnapshots(self, symbol):
     """
     Log full depth quotes (price, volume) from this order book at some pre-determined frequency. Here we are looking at
     the actual log for this order book (i.e. are there snapshots to export, independent of the requested frequency).
+    The order book log (util.BookLog) holds level deltas, which are expanded into the archive format vectorially.
     """
-    def get_quote_range_iterator(s):
-      """ Helper method for order book logging. Takes pandas Series and returns python range() from first to last
-          element.
-      """
-      forbidden_values = [0, 19999900] # TODO: Put constant value in more sensible place!
-      quotes = sorted(s)
-      for val in forbidden_values:
-        try: quotes.remove(val)
-        except ValueError:
-          pass
-      return quotes
+    forbidden_values = [0, 19999900] # TODO: Put constant value in more sensible place!
 
     book = self.order_books[symbol]
 
     if book.book_log:
 
       print("Logging order book to file...")
-      dfLog = book.book_log_to_df()
-      dfLog.set_index('QuoteTime', inplace=True)
-      dfLog = dfLog[~dfLog.index.duplicated(keep='last')]
-      dfLog.sort_index(inplace=True)
 
       if str(self.book_freq).isdigit() and int(self.book_freq) == 0:  # Save all possible information
-        # Get the full range of quotes at the finest possible resolution.
-        quotes = get_quote_range_iterator(dfLog.columns.unique())
-
-        # Restructure the log to have multi-level rows of all possible pairs of time and quote
-        # with volume as the only column.
-        if not self.wide_book:
-          filledIndex = pd.MultiIndex.from_product([dfLog.index, quotes], names=['time', 'quote'])
-          dfLog = dfLog.stack()
-          dfLog = dfLog.reindex(filledIndex)
-
+        # One row per distinct snapshot time, keeping the last snapshot taken at that time.
+        time_idx = book.book_log.snapshot_times()
         filename = f'ORDERBOOK_{symbol}_FULL'
 
       else:  # Sample at frequency self.book_freq
-        # With multiple quotes in a nanosecond, use the last one, then resample to the requested freq.
-        dfLog = dfLog.resample(self.book_freq).ffill()
-        dfLog.sort_index(inplace=True)
-
-        # Create a fully populated index at the desired frequency from market open to close.
-        # Then project the logged data into this complete index.
-        time_idx = pd.date_range(self.mkt_open, self.mkt_close, freq=self.book_freq, closed='right')
-        dfLog = dfLog.reindex(time_idx, method='ffill')
-        dfLog.sort_index(inplace=True)
-
-        if not self.wide_book:
-          dfLog = dfLog.stack()
-          dfLog.sort_index(inplace=True)
-
-          # Get the full range of quotes at the finest possible resolution.
-          quotes = get_quote_range_iterator(dfLog.index.get_level_values(1).unique())
-
-          # Restructure the log to have multi-level rows of all possible pairs of time and quote
-          # with volume as the only column.
-          filledIndex = pd.MultiIndex.from_product([time_idx, quotes], names=['time', 'quote'])
-          dfLog = dfLog.reindex(filledIndex)
-
+        # Create a fully populated index at the desired frequency from market open (exclusive) to
+        # close, holding the book as of the latest snapshot at or before each time.
+        time_idx = pd.date_range(self.mkt_open, self.mkt_close, freq=self.book_freq)
+        time_idx = time_idx[time_idx > self.mkt_open]
         filename = f'ORDERBOOK_{symbol}_FREQ_{self.book_freq}'
 
-      # Final cleanup
-      if not self.wide_book:
-        dfLog.rename('Volume')
-        df = pd.SparseDataFrame(index=dfLog.index)
-        df['Volume'] = dfLog
+      if self.wide_book:
+        df = book.book_log.to_wide(time_idx)
       else:
-        df = dfLog
-        df = df.reindex(sorted(df.columns), axis=1)
+        # Multi-level rows of (time, quote) for every non-zero level, with volume as the only column.
+        df = book.book_log.to_narrow(time_idx, exclude=forbidden_values)
 
       # Archive the order book snapshots directly to a file named with the symbol, rather than
       # to the exchange agent log.
@@ -401,11 +562,20 @@ class ExchangeAgent(FinancialAgent):
     # TODO: probably organize the order types into categories once there are more, so we can
     # take action by category (e.g. ORDER-related messages) instead of enumerating all message
     # types to be affected.
-    if msg.body['msg'] in ['ORDER_ACCEPTED', 'ORDER_CANCELLED', 'ORDER_EXECUTED']:
+    if self.batch_acks is not None and recipientID == self.batch_acks[0] and \
+       msg.body['msg'] in ['ORDER_ACCEPTED', 'ORDER_CANCELLED']:
+      # Acknowledgements for an agent's batch of orders are sent together once the batch is done.
+      self.batch_acks[1][msg.body['msg']].append(msg.body['order'])
+      if self.log_orders: self.logEvent(msg.body['msg'], msg.body['order'].to_dict())
+    elif self.replay and recipientID == self.replay_agent_id:
+      # Notifications about historical orders have no one to receive them.
+      if self.log_orders and msg.body['msg'] in ['ORDER_ACCEPTED', 'ORDER_CANCELLED', 'ORDER_EXECUTED']:
+        self.logEvent(msg.body['msg'], msg.body['order'].to_dict())
+    elif msg.body['msg'] in ['ORDER_ACCEPTED', 'ORDER_CANCELLED', 'ORDER_EXECUTED', 'ORDER_BATCH_ACK']:
       # Messages that require order book modification (not simple queries) incur the additional
       # parallel processing delay as configured.
       super().sendMessage(recipientID, msg, delay = self.pipeline_delay)
-      if self.log_orders: self.logEvent(msg.body['msg'], msg.body['order'].to_dict())
+      if self.log_orders and 'order' in msg.body: self.logEvent(msg.body['msg'], msg.body['order'].to_dict())
     else:
       # Other message types incur only the currently-configured computation delay for this agent.
       super().sendMessage(recipientID, msg)
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from agent.TradingAgent import TradingAgent
+from util.util import log_print
+
+
+class GymAgent(TradingAgent):
+    """
+    A trading agent whose decisions are made outside the simulation, by a learner driving the Kernel step by step
+    (see util.VectorEnv).
+
+    At every decision point (each wake_freq while the market is open, once the agent has the current book to depth
+    levels) the agent asks the Kernel to pause.  The driver then reads observe() and reward(), and hands the agent its
+    next action with act(action) before resuming the simulation.  When the agent is not being driven (e.g. its config
+    is run by abides.py), it acts with default_action() instead.
+
+    By default the observation is [holdings, mid, spread, bid volume, ask volume, minutes to close] (prices in cents,
+    volumes over the first depth levels), the action is a single number of shares to buy (positive) or sell (negative)
+    with a market order, clipped to max_trade, and the reward is the change in the agent's portfolio value (marked to
+    the mid) since the previous decision.  Subclasses may override observe, act, reward and default_action together
+    with observation_size and action_size.
+    """
+
+    observation_size = 6
+    action_size = 1
+
+    def __init__(self, id, name, type, symbol, starting_cash, wake_freq='1min', depth=10, max_trade=100,
+                 log_orders=False, random_state=None):
+        super().__init__(id, name, type, starting_cash=starting_cash, log_orders=log_orders, random_state=random_state)
+        self.symbol = symbol
+        self.wake_freq = pd.Timedelta(wake_freq)
+        self.depth = depth
+        self.max_trade = max_trade
+
+        # Set by the driver.  An agent that is not driven decides for itself.
+        self.driven = False
+
+        # True from a decision point until the driver (or default_action) has acted.
+        self.awaiting_action = False
+
+        self.state = 'AWAITING_WAKEUP'
+        self.last_value = None
+
+    def wakeup(self, currentTime):
+        can_trade = super().wakeup(currentTime)
+        if not can_trade: return
+
+        self.setWakeup(currentTime + self.wake_freq)
+        self.getCurrentSpread(self.symbol, depth=self.depth)
+        self.state = 'AWAITING_SPREAD'
+
+    def getWakeFrequency(self):
+        return self.wake_freq
+
+    def receiveMessage(self, currentTime, msg):
+        super().receiveMessage(currentTime, msg)
+
+        if self.state == 'AWAITING_SPREAD' and msg.body['msg'] == 'QUERY_SPREAD':
+            self.state = 'AWAITING_WAKEUP'
+            if self.mkt_closed: return
+            self.decide()
+
+    def decide(self):
+        """ Marks a decision point: pauses the Kernel for the driver, or acts on default_action(). """
+        self.awaiting_action = True
+        if self.driven:
+            self.kernel.pause()
+        else:
+            self.act(self.default_action())
+
+    def observe(self):
+        """ Returns the current observation as a float64 array of observation_size. """
+        bids, asks = self.known_bids.get(self.symbol, []), self.known_asks.get(self.symbol, [])
+        bid = bids[0][0] if bids else None
+        ask = asks[0][0] if asks else None
+
+        mid = (bid + ask) / 2 if bid and ask else self.last_trade.get(self.symbol, np.nan)
+        spread = ask - bid if bid and ask else np.nan
+        to_close = (self.mkt_close - self.currentTime) / pd.Timedelta('1min') if self.mkt_close else np.nan
+
+        return np.array([self.getHoldings(self.symbol), mid, spread, sum(v for _, v in bids), sum(v for _, v in asks),
+                         to_close], dtype=np.float64)
+
+    def reward(self):
+        """ Returns the change in portfolio value (cents, marked to the mid) since the last call. """
+        value = self.portfolio_value()
+        reward = 0.0 if self.last_value is None else float(value - self.last_value)
+        self.last_value = value
+        return reward
+
+    def portfolio_value(self):
+        """ Returns cash plus the shares held marked to the mid (or the last trade), as markToMarket would value
+            them, but without logging MARK_TO_MARKET events at every decision point. """
+        value = self.holdings['CASH']
+        if self.symbol not in self.last_trade: return value
+
+        _, _, mid = self.getKnownBidAskMidpoint(self.symbol)
+        return value + (mid if mid is not None else self.last_trade[self.symbol]) * self.getHoldings(self.symbol)
+
+    def act(self, action):
+        """ Applies action (an array of action_size): trades the given number of shares at market. """
+        self.awaiting_action = False
+
+        quantity = int(np.clip(np.round(action[0]), -self.max_trade, self.max_trade))
+        if quantity == 0: return
+
+        log_print("{} trading {} shares at market", self.name, quantity)
+        self.placeMarketOrder(self.symbol, abs(quantity), quantity > 0)
+
+    def default_action(self):
+        """ The action taken when the agent is not driven: do nothing. """
+        return np.zeros(self.action_size)
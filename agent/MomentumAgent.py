@@ -1,4 +1,5 @@
 from agent.TradingAgent import TradingAgent
+from util.Indicators import SimpleMovingAverage, moving_average
 import pandas as pd
 import numpy as np
 
@@ -22,7 +23,9 @@ class MomentumAgent(TradingAgent):
         self.wake_up_freq = wake_up_freq
         self.subscribe = subscribe  # Flag to determine whether to subscribe to data or use polling mechanism
         self.subscription_requested = False
-        self.mid_list, self.avg_20_list, self.avg_50_list = [], [], []
+        # Moving averages of the observed mid prices, and the latest of each rounded to the cent.
+        self.avg_20, self.avg_50 = SimpleMovingAverage(20), SimpleMovingAverage(50)
+        self.last_avg_20, self.last_avg_50 = None, None
         self.log_orders = log_orders
         self.state = "AWAITING_WAKEUP"
 
@@ -33,7 +36,7 @@ class MomentumAgent(TradingAgent):
         """ Agent wakeup is determined by self.wake_up_freq """
         can_trade = super().wakeup(currentTime)
         if self.subscribe and not self.subscription_requested:
-            super().requestDataSubscription(self.symbol, levels=1, freq=10e9)
+            super().requestDataSubscription(self.symbol, levels=0, freq=10e9, features=['bid', 'ask'])
             self.subscription_requested = True
             self.state = 'AWAITING_MARKET_DATA'
         elif can_trade and not self.subscribe:
@@ -48,19 +51,22 @@ class MomentumAgent(TradingAgent):
             self.placeOrders(bid, ask)
             self.setWakeup(currentTime + self.getWakeFrequency())
             self.state = 'AWAITING_WAKEUP'
-        elif self.subscribe and self.state == 'AWAITING_MARKET_DATA' and msg.body['msg'] == 'MARKET_DATA':
-            bids, asks = self.known_bids[self.symbol], self.known_asks[self.symbol]
-            if bids and asks: self.placeOrders(bids[0][0], asks[0][0])
+        elif self.subscribe and self.state == 'AWAITING_MARKET_DATA' and msg.body['msg'] == 'MARKET_FEATURES':
+            bid, ask = self.known_features[self.symbol]['bid'], self.known_features[self.symbol]['ask']
+            if bid and ask: self.placeOrders(bid, ask)
             self.state = 'AWAITING_MARKET_DATA'
 
     def placeOrders(self, bid, ask):
         """ Momentum Agent actions logic """
         if bid and ask:
-            self.mid_list.append((bid + ask) / 2)
-            if len(self.mid_list) > 20: self.avg_20_list.append(MomentumAgent.ma(self.mid_list, n=20)[-1].round(2))
-            if len(self.mid_list) > 50: self.avg_50_list.append(MomentumAgent.ma(self.mid_list, n=50)[-1].round(2))
-            if len(self.avg_20_list) > 0 and len(self.avg_50_list) > 0:
-                if self.avg_20_list[-1] >= self.avg_50_list[-1]:
+            mid = (bid + ask) / 2
+            self.avg_20.update(mid)
+            self.avg_50.update(mid)
+            # Each average is used once more than its window of mid prices has been observed.
+            if self.avg_20.count > 20: self.last_avg_20 = np.round(self.avg_20.value, 2)
+            if self.avg_50.count > 50: self.last_avg_50 = np.round(self.avg_50.value, 2)
+            if self.last_avg_20 is not None and self.last_avg_50 is not None:
+                if self.last_avg_20 >= self.last_avg_50:
                     self.placeLimitOrder(self.symbol, quantity=self.size, is_buy_order=True, limit_price=ask)
                 else:
                     self.placeLimitOrder(self.symbol, quantity=self.size, is_buy_order=False, limit_price=bid)
@@ -70,6 +76,4 @@ class MomentumAgent(TradingAgent):
 
     @staticmethod
     def ma(a, n=20):
-        ret = np.cumsum(a, dtype=float)
-        ret[n:] = ret[n:] - ret[:-n]
-        return ret[n - 1:] / n
\ No newline at end of file
+        return moving_average(a, n)
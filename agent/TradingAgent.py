@@ -3,7 +3,7 @@ from agent.ExchangeAgent import ExchangeAgent
 from message.Message import Message
 from util.order.LimitOrder import LimitOrder
 from util.order.MarketOrder import MarketOrder
-from util.util import log_print
+from util.util import log_print, be_silent
 
 from copy import deepcopy
 import sys
@@ -73,6 +73,15 @@ class TradingAgent(FinancialAgent):
     self.known_bids = {}
     self.known_asks = {}
 
+    # The agent remembers the last market features (a dictionary of feature name -> value) it received
+    # for each symbol, when subscribed to a feature stream.
+    self.known_features = {}
+
+    # For L2 delta subscriptions, by symbol: the sequence number of the last message applied to the known
+    # bids and asks, and any later messages that arrived ahead of their turn.
+    self.delta_seq = {}
+    self.pending_deltas = {}
+
     # The agent remembers the order history communicated by the exchange
     # when such is requested by an agent (for example, a heuristic belief
     # learning agent).
@@ -178,10 +187,17 @@ class TradingAgent(FinancialAgent):
     # the market open and closed times, and is the market not already closed.
     return (self.mkt_open and self.mkt_close) and not self.mkt_closed
 
-  def requestDataSubscription(self, symbol, levels, freq):
+  # Used by any Trading Agent subclass to subscribe to market data from the Exchange Agent.  By default the
+  # agent receives MARKET_DATA messages with the top levels of the book.  With a list of market features
+  # (see util.MarketFeatures.FEATURES, e.g. ['mid', 'imbalance']) it instead receives MARKET_FEATURES
+  # messages with their values, computed once by the exchange for all subscribers, and levels is ignored.
+  # With delta=True, MARKET_DATA messages after the first carry only the levels that changed; the agent
+  # applies them to known_bids and known_asks, which it should read instead of the message itself.
+  def requestDataSubscription(self, symbol, levels, freq, features=None, delta=False):
       self.sendMessage(recipientID = self.exchangeID,
                        msg = Message({"msg": "MARKET_DATA_SUBSCRIPTION_REQUEST",
-                                      "sender": self.id, "symbol": symbol, "levels": levels, "freq": freq}))
+                                      "sender": self.id, "symbol": symbol, "levels": levels, "freq": freq,
+                                      "features": features, "delta": delta}))
 
   # Used by any Trading Agent subclass to cancel subscription to market data from the Exchange Agent
   def cancelDataSubscription(self, symbol):
@@ -227,6 +243,14 @@ class TradingAgent(FinancialAgent):
 
       self.orderCancelled(order)
 
+    elif msg.body['msg'] == "ORDER_BATCH_ACK":
+      # A batch of orders was applied.  Call orderCancelled and orderAccepted for each order listed, in the
+      # order the exchange processed them (cancellations first).
+      for order in msg.body['cancelled']:
+        self.orderCancelled(order)
+      for order in msg.body['accepted']:
+        self.orderAccepted(order)
+
     elif msg.body['msg'] == "MKT_CLOSED":
       # We've tried to ask the exchange for something after it closed.  Remember this
       # so we stop asking for things that can't happen.
@@ -261,6 +285,9 @@ class TradingAgent(FinancialAgent):
     elif msg.body['msg'] == 'MARKET_DATA':
       self.handleMarketData(msg)
 
+    elif msg.body['msg'] == 'MARKET_FEATURES':
+      self.handleMarketFeatures(msg)
+
     # Now do we know the market hours?
     have_mkt_hours = self.mkt_open is not None and self.mkt_close is not None
 
@@ -295,7 +322,10 @@ class TradingAgent(FinancialAgent):
                                                 "symbol" : symbol, "length" : length }))
 
   def get_transacted_volume(self, symbol, lookback_period='10min'):
-    """ Used by any trading agent subclass to query the total transacted volume in a given lookback period """
+    """ Used by any trading agent subclass to query the total transacted volume in a given lookback period.
+        lookback_period may also be a list of periods, in which case the exchange answers with a dictionary
+        of lookback_period -> volume for all of them in one message.
+    """
     self.sendMessage(self.exchangeID, Message({ "msg": "QUERY_TRANSACTED_VOLUME", "sender": self.id,
                                                 "symbol": symbol, "lookback_period": lookback_period}))
 
@@ -304,6 +334,64 @@ class TradingAgent(FinancialAgent):
   # The call may optionally specify an order_id (otherwise global autoincrement is used) and
   # whether cash or risk limits should be enforced or ignored for the order.
   def placeLimitOrder (self, symbol, quantity, is_buy_order, limit_price, order_id=None, ignore_risk = True, tag = None):
+    order = self.createLimitOrder(symbol, quantity, is_buy_order, limit_price, order_id, ignore_risk, tag)
+
+    if order is not None:
+      self.sendMessage(self.exchangeID, Message({ "msg" : "LIMIT_ORDER", "sender": self.id,
+                                                  "order" : order })) 
+
+      # Log this activity.
+      if self.log_orders: self.logEvent('ORDER_SUBMITTED', order.to_dict())
+
+  # Used by any Trading Agent subclass to place several limit orders for one symbol in a single message.
+  # orders is a list of (quantity, is_buy_order, limit_price) tuples, each treated as by placeLimitOrder.
+  # The exchange acknowledges the accepted orders together in one ORDER_BATCH_ACK.
+  def placeLimitOrders (self, symbol, orders, ignore_risk = True, tag = None):
+    placed = self.createLimitOrders(symbol, orders, ignore_risk, tag)
+    if not placed: return
+
+    self.sendMessage(self.exchangeID, Message({ "msg" : "LIMIT_ORDERS", "sender": self.id,
+                                                "symbol" : symbol, "orders" : placed }))
+
+    if self.log_orders:
+      for order in placed: self.logEvent('ORDER_SUBMITTED', order.to_dict())
+
+  # Used by any Trading Agent subclass to cancel all of its resting orders for a symbol with one message.
+  # The exchange cancels whatever the agent has resting in the book and lists the cancelled orders in one
+  # ORDER_BATCH_ACK.
+  def cancelAllOrdersForSymbol (self, symbol):
+    self.sendMessage(self.exchangeID, Message({ "msg" : "CANCEL_ALL_ORDERS", "sender": self.id,
+                                                "symbol" : symbol }))
+
+    if self.log_orders: self.logEvent('CANCEL_ALL_SUBMITTED', symbol)
+
+  # Used by any Trading Agent subclass to atomically replace all of its resting orders for a symbol with
+  # new limit orders (given as for placeLimitOrders), e.g. to move a market making ladder.  No other
+  # activity reaches the book between the cancellations and the new orders, and the exchange acknowledges
+  # both in one ORDER_BATCH_ACK.
+  def replaceAllOrdersForSymbol (self, symbol, orders, ignore_risk = True, tag = None):
+    placed = self.createLimitOrders(symbol, orders, ignore_risk, tag)
+
+    self.sendMessage(self.exchangeID, Message({ "msg" : "REPLACE_ORDERS", "sender": self.id,
+                                                "symbol" : symbol, "orders" : placed }))
+
+    if self.log_orders:
+      self.logEvent('CANCEL_ALL_SUBMITTED', symbol)
+      for order in placed: self.logEvent('ORDER_SUBMITTED', order.to_dict())
+
+  def createLimitOrders (self, symbol, orders, ignore_risk = True, tag = None):
+    # Creates the limit orders for placeLimitOrders and replaceAllOrdersForSymbol, skipping any rejected.
+    placed = []
+    for quantity, is_buy_order, limit_price in orders:
+      order = self.createLimitOrder(symbol, quantity, is_buy_order, limit_price, ignore_risk=ignore_risk, tag=tag)
+      if order is not None: placed.append(order)
+
+    return placed
+
+  # Creates a limit order and records it among the agent's open orders, ready to send to the exchange.
+  # Returns None (and records nothing) if the quantity is not positive or the order would break the
+  # agent's at-risk limits.
+  def createLimitOrder (self, symbol, quantity, is_buy_order, limit_price, order_id=None, ignore_risk = True, tag = None):
     order = LimitOrder(self.id, self.currentTime, symbol, quantity, is_buy_order, limit_price, order_id, tag)
 
     if quantity > 0:
@@ -322,8 +410,9 @@ class TradingAgent(FinancialAgent):
         new_at_risk = self.markToMarket(new_holdings) - new_holdings['CASH']
 
         if (new_at_risk > at_risk) and (new_at_risk > self.starting_cash):
-          log_print ("TradingAgent ignored limit order due to at-risk constraints: {}\n{}", order, self.fmtHoldings(self.holdings))
-          return
+          if not be_silent():
+            log_print ("TradingAgent ignored limit order due to at-risk constraints: {}\n{}", order, self.fmtHoldings(self.holdings))
+          return None
 
       # Copy the intended order for logging, so any changes made to it elsewhere
       # don't retroactively alter our "as placed" log of the order.  Eventually
@@ -331,14 +420,11 @@ class TradingAgent(FinancialAgent):
       # objects inside the order (we're halfway there) so there CAN be just a single
       # object per order, that never alters its original state, and eliminate all these copies.
       self.orders[order.order_id] = deepcopy(order)
-      self.sendMessage(self.exchangeID, Message({ "msg" : "LIMIT_ORDER", "sender": self.id,
-                                                  "order" : order })) 
-
-      # Log this activity.
-      if self.log_orders: self.logEvent('ORDER_SUBMITTED', order.to_dict())
+      return order
 
     else:
       log_print ("TradingAgent ignored limit order of quantity zero: {}", order)
+      return None
 
   def placeMarketOrder(self, symbol, quantity, is_buy_order, order_id=None, ignore_risk = True, tag=None):
     """
@@ -365,8 +451,9 @@ class TradingAgent(FinancialAgent):
         new_at_risk = self.markToMarket(new_holdings) - new_holdings['CASH']
 
         if (new_at_risk > at_risk) and (new_at_risk > self.starting_cash):
-          log_print("TradingAgent ignored market order due to at-risk constraints: {}\n{}",
-                    order, self.fmtHoldings(self.holdings))
+          if not be_silent():
+            log_print("TradingAgent ignored market order due to at-risk constraints: {}\n{}",
+                      order, self.fmtHoldings(self.holdings))
           return
       self.orders[order.order_id] = deepcopy(order)
       self.sendMessage(self.exchangeID, Message({"msg" : "MARKET_ORDER", "sender": self.id, "order": order}))
@@ -516,8 +603,49 @@ class TradingAgent(FinancialAgent):
     Handles Market Data messages for agents using subscription mechanism
     '''
     symbol = msg.body['symbol']
-    self.known_asks[symbol] = msg.body['asks']
-    self.known_bids[symbol] = msg.body['bids']
+
+    if 'seq' not in msg.body:
+      self.known_asks[symbol] = msg.body['asks']
+      self.known_bids[symbol] = msg.body['bids']
+      self.last_trade[symbol] = msg.body['last_transaction']
+      self.exchange_ts[symbol] = msg.body['exchange_ts']
+      return
+
+    # L2 delta subscription.  Each message holds the changes since the one before it, but messages may arrive
+    # out of order, so they are applied strictly in sequence, holding any that arrive early.  Message 0 of a
+    # (new) subscription holds all levels.
+    if msg.body['seq'] == 0: self.delta_seq[symbol] = -1
+
+    pending = self.pending_deltas.setdefault(symbol, {})
+    pending[msg.body['seq']] = msg
+
+    while self.delta_seq.get(symbol, -1) + 1 in pending:
+      self.delta_seq[symbol] = self.delta_seq.get(symbol, -1) + 1
+      body = pending.pop(self.delta_seq[symbol]).body
+
+      if body['delta']:
+        self.known_bids[symbol] = self.applyBookDelta(self.known_bids[symbol], body['bids'], reverse=True)
+        self.known_asks[symbol] = self.applyBookDelta(self.known_asks[symbol], body['asks'], reverse=False)
+      else:
+        self.known_bids[symbol] = body['bids']
+        self.known_asks[symbol] = body['asks']
+
+      self.last_trade[symbol] = body['last_transaction']
+      self.exchange_ts[symbol] = body['exchange_ts']
+
+  @staticmethod
+  def applyBookDelta(levels, delta, reverse):
+    # Returns the (price, volume) levels with the changed levels in delta applied, best price first.
+    book = dict(levels)
+    book.update(delta)
+    return sorted([(price, volume) for price, volume in book.items() if volume], reverse=reverse)
+
+  def handleMarketFeatures(self, msg):
+    '''
+    Handles Market Features messages for agents subscribed to a feature stream
+    '''
+    symbol = msg.body['symbol']
+    self.known_features[symbol] = msg.body['features']
     self.last_trade[symbol] = msg.body['last_transaction']
     self.exchange_ts[symbol] = msg.body['exchange_ts']
 
@@ -1,4 +1,5 @@
 from agent.TradingAgent import TradingAgent
+from util.Indicators import moving_average
 import pandas as pd
 import numpy as np
 from math import floor
@@ -33,7 +34,7 @@ class WbrAgent(TradingAgent):
         """ Agent wakeup is determined by self.wake_up_freq """
         can_trade = super().wakeup(currentTime)
         if self.subscribe and not self.subscription_requested:
-            super().requestDataSubscription(self.symbol, levels=1, freq=10e9)
+            super().requestDataSubscription(self.symbol, levels=0, freq=10e9, features=['bid', 'ask'])
             self.subscription_requested = True
             self.state = 'AWAITING_MARKET_DATA'
         elif can_trade and not self.subscribe:
@@ -55,9 +56,9 @@ class WbrAgent(TradingAgent):
             self.placeOrders(bid, ask)
             self.setWakeup(currentTime + self.getWakeFrequency())
             self.state = 'AWAITING_WAKEUP'
-        elif self.subscribe and self.state == 'AWAITING_MARKET_DATA' and msg.body['msg'] == 'MARKET_DATA':
-            bids, asks = self.known_bids[self.symbol], self.known_asks[self.symbol]
-            if bids and asks: self.placeOrders(bids[0][0], asks[0][0])
+        elif self.subscribe and self.state == 'AWAITING_MARKET_DATA' and msg.body['msg'] == 'MARKET_FEATURES':
+            bid, ask = self.known_features[self.symbol]['bid'], self.known_features[self.symbol]['ask']
+            if bid and ask: self.placeOrders(bid, ask)
             self.state = 'AWAITING_MARKET_DATA'
 
     def getCurrentMidPrice(self, bid, ask):
@@ -143,6 +144,5 @@ class WbrAgent(TradingAgent):
 
     @staticmethod
     def ma(a, n=20):
-        ret = np.cumsum(a, dtype=float)
-        ret[n:] = ret[n:] - ret[:-n]
-        return ret[n - 1:] / n
+        return moving_average(a, n)
+
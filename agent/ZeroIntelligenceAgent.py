@@ -130,7 +130,7 @@ class ZeroIntelligenceAgent(TradingAgent):
         # distribution in alternate Beta formation with Beta = 1 / lambda, where lambda
         # is the mean arrival rate of the Poisson process.
         delta_time = self.random_state.exponential(scale=1.0 / self.lambda_a)
-        self.setWakeup(currentTime + pd.Timedelta('{}ns'.format(int(round(delta_time)))))
+        self.setWakeup(currentTime + pd.Timedelta(int(round(delta_time))))
 
         # If the market has closed and we haven't obtained the daily close price yet,
         # do that before we cease activity for the day.  Don't do any other behavior
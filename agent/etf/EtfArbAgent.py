@@ -97,7 +97,7 @@ class EtfArbAgent(TradingAgent):
     # is the mean arrival rate of the Poisson process.
     elif not self.inPrime:
       delta_time = self.random_state.exponential(scale = 1.0 / self.lambda_a)
-      self.setWakeup(currentTime + pd.Timedelta('{}ns'.format(int(round(delta_time)))))
+      self.setWakeup(currentTime + pd.Timedelta(int(round(delta_time))))
 
       # Issue cancel requests for any open orders.  Don't wait for confirmation, as presently
       # the only reason it could fail is that the order already executed.  (But requests won't
@@ -1,11 +1,9 @@
-import pickle
 import os.path
-from datetime import datetime
 import pandas as pd
-#from joblib import Memory
 
 from agent.TradingAgent import TradingAgent
 from util.order.LimitOrder import LimitOrder
+from util.ReplayStore import ReplayStore
 from util.util import log_print
 
 
@@ -24,18 +22,28 @@ class MarketReplayAgent(TradingAgent):
         self.historical_orders = L3OrdersProcessor(self.symbol,
                                                    self.date, start_time, end_time,
                                                    orders_file_path, processed_orders_folder_path)
-        self.wakeup_times = self.historical_orders.wakeup_times
 
     def wakeup(self, currentTime):
         super().wakeup(currentTime)
         if not self.mkt_open or not self.mkt_close:
             return
-        try:
-            self.setWakeup(self.wakeup_times[0])
-            self.wakeup_times.pop(0)
-            self.placeOrder(currentTime, self.historical_orders.orders_dict[currentTime])
-        except IndexError:
-            log_print(f"Market Replay Agent submitted all orders - last order @ {currentTime}")
+
+        # Take every batch of historical orders due by now (the wakeup may arrive late if the agent
+        # was busy), then schedule the wakeup for the next batch.
+        orders = []
+        next_wakeup = self.historical_orders.peek_time()
+        while next_wakeup is not None and next_wakeup <= currentTime:
+            _, batch = self.historical_orders.next_batch()
+            orders.extend(batch)
+            next_wakeup = self.historical_orders.peek_time()
+
+        if next_wakeup is None:
+            log_print("Market Replay Agent submitted all orders - last order @ {}", currentTime)
+        else:
+            self.setWakeup(next_wakeup)
+
+        if orders:
+            self.placeOrder(currentTime, orders)
 
     def receiveMessage(self, currentTime, msg):
         super().receiveMessage(currentTime, msg)
@@ -63,18 +71,18 @@ class MarketReplayAgent(TradingAgent):
                 self.placeOrder(currentTime, order=[ind_order])
 
     def getWakeFrequency(self):
-        log_print(f"Market Replay Agent first wake up: {self.historical_orders.first_wakeup}")
+        log_print("Market Replay Agent first wake up: {}", self.historical_orders.first_wakeup)
+        if self.historical_orders.first_wakeup is None:
+            return pd.Timedelta(0)
         return self.historical_orders.first_wakeup - self.mkt_open
 
 
-#mem = Memory(cachedir='./cache', verbose=0)
-
-
 class L3OrdersProcessor:
-    COLUMNS = ['TIMESTAMP', 'ORDER_ID', 'PRICE', 'SIZE', 'BUY_SELL_FLAG']
-    DIRECTION = {0: 'BUY', 1: 'SELL'}
+    """ Streams historical exchange orders between start_time and end_time, one timestamp at a time.  The orders file
+        is converted once into a memory-mapped ReplayStore in processed_orders_folder_path, which later runs (and
+        other time windows of the same day) reuse.
+    """
 
-    # Class for reading historical exchange orders stream
     def __init__(self, symbol, date, start_time, end_time, orders_file_path, processed_orders_folder_path):
         self.symbol = symbol
         self.date = date
@@ -83,43 +91,25 @@ class L3OrdersProcessor:
         self.orders_file_path = orders_file_path
         self.processed_orders_folder_path = processed_orders_folder_path
 
-        self.orders_dict = self.processOrders()
-        self.wakeup_times = [*self.orders_dict]
-        self.first_wakeup = self.wakeup_times[0]
+        self.cursor = self.processOrders().cursor(start_time, end_time)
+        log_print("Number of Orders: {}", len(self.cursor))
+
+        self.first_wakeup = self.cursor.peek_time()
 
     def processOrders(self):
-        def convertDate(date_str):
-            try:
-                return datetime.strptime(date_str, '%Y%m%d%H%M%S.%f')
-            except ValueError:
-                return convertDate(date_str[:-1])
-
-        #@mem.cache
-        def read_processed_orders_file(processed_orders_file):
-            with open(processed_orders_file, 'rb') as handle:
-                return pickle.load(handle)
-
-        processed_orders_file = f'{self.processed_orders_folder_path}marketreplay_{self.symbol}_{self.date.date()}.pkl'
-        if os.path.isfile(processed_orders_file):
-            print(f'Processed file exists for {self.symbol} and {self.date.date()}: {processed_orders_file}')
-            return read_processed_orders_file(processed_orders_file)
+        processed_orders_path = os.path.join(self.processed_orders_folder_path,
+                                             f'marketreplay_{self.symbol}_{self.date.date()}')
+        if os.path.isdir(processed_orders_path):
+            print(f'Processed orders exist for {self.symbol} and {self.date.date()}: {processed_orders_path}')
+            return ReplayStore(processed_orders_path)
         else:
-            print(f'Processed file does not exist for {self.symbol} and {self.date.date()}, processing...')
-            orders_df = pd.read_csv(self.orders_file_path).iloc[1:]
-            all_columns = orders_df.columns[0].split('|')
-            orders_df = orders_df[orders_df.columns[0]].str.split('|', 16, expand=True)
-            orders_df.columns = all_columns
-            orders_df = orders_df[L3OrdersProcessor.COLUMNS]
-            orders_df['BUY_SELL_FLAG'] = orders_df['BUY_SELL_FLAG'].astype(int).replace(L3OrdersProcessor.DIRECTION)
-            orders_df['TIMESTAMP'] = orders_df['TIMESTAMP'].astype(str).apply(convertDate)
-            orders_df['SIZE'] = orders_df['SIZE'].astype(int)
-            orders_df['PRICE'] = orders_df['PRICE'].astype(float) * 100
-            orders_df['PRICE'] = orders_df['PRICE'].astype(int)
-            orders_df = orders_df.loc[(orders_df.TIMESTAMP >= self.start_time) & (orders_df.TIMESTAMP < self.end_time)]
-            orders_df.set_index('TIMESTAMP', inplace=True)
-            log_print(f"Number of Orders: {len(orders_df)}")
-            orders_dict = {k: g.to_dict(orient='records') for k, g in orders_df.groupby(level=0)}
-            with open(processed_orders_file, 'wb') as handle:
-                pickle.dump(orders_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
-                print(f'processed file created as {processed_orders_file}')
-            return orders_dict
+            print(f'Processed orders do not exist for {self.symbol} and {self.date.date()}, processing...')
+            store = ReplayStore.convert(self.orders_file_path, processed_orders_path)
+            print(f'processed orders created in {processed_orders_path}')
+            return store
+
+    def peek_time(self):
+        return self.cursor.peek_time()
+
+    def next_batch(self):
+        return self.cursor.next_batch()
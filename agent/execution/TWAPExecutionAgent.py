@@ -31,8 +31,8 @@ class TWAPExecutionAgent(ExecutionAgent):
         child_quantity = int(self.quantity / len(self.execution_time_horizon))
         for b in bins:
             schedule[b] = child_quantity
-        log_print('[---- {} {} - Schedule ----]:'.format(self.name, self.currentTime))
-        log_print('[---- {} {} - Total Number of Orders ----]: {}'.format(self.name, self.currentTime, len(schedule)))
+        log_print('[---- {} {} - Schedule ----]:', self.name, self.currentTime)
+        log_print('[---- {} {} - Total Number of Orders ----]: {}', self.name, self.currentTime, len(schedule))
         for t, q in schedule.items():
-            log_print("From: {}, To: {}, Quantity: {}".format(t.left.time(), t.right.time(), q))
+            log_print("From: {}, To: {}, Quantity: {}", t.left.time(), t.right.time(), q)
         return schedule
\ No newline at end of file
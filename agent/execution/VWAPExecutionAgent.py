@@ -1,7 +1,7 @@
 import pandas as pd
 
 from agent.execution.ExecutionAgent import ExecutionAgent
-from util.util import log_print
+from util.util import log_print, shared_input
 
 
 class VWAPExecutionAgent(ExecutionAgent):
@@ -27,16 +27,17 @@ class VWAPExecutionAgent(ExecutionAgent):
         if self.volume_profile_path is None:
             volume_profile = VWAPExecutionAgent.synthetic_volume_profile(self.start_time, self.freq)
         else:
-            volume_profile = pd.read_pickle(self.volume_profile_path).to_dict()
+            volume_profile = shared_input(('read_pickle', self.volume_profile_path),
+                                          lambda: pd.read_pickle(self.volume_profile_path)).to_dict()
 
         schedule = {}
         bins = pd.interval_range(start=self.start_time, end=self.end_time, freq=self.freq)
         for b in bins:
             schedule[b] = round(volume_profile[b.left] * self.quantity)
-        log_print('[---- {} {} - Schedule ----]:'.format(self.name, self.currentTime))
-        log_print('[---- {} {} - Total Number of Orders ----]: {}'.format(self.name, self.currentTime, len(schedule)))
+        log_print('[---- {} {} - Schedule ----]:', self.name, self.currentTime)
+        log_print('[---- {} {} - Total Number of Orders ----]: {}', self.name, self.currentTime, len(schedule))
         for t, q in schedule.items():
-            log_print("From: {}, To: {}, Quantity: {}".format(t.left.time(), t.right.time(), q))
+            log_print("From: {}, To: {}, Quantity: {}", t.left.time(), t.right.time(), q)
         return schedule
 
     @staticmethod
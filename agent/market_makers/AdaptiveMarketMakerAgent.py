@@ -28,7 +28,7 @@ class AdaptiveMarketMakerAgent(TradingAgent):
 
     def __init__(self, id, name, type, symbol, starting_cash, pov=0.05, min_order_size=20, window_size=5, anchor=ANCHOR_MIDDLE_STR,
                  num_ticks=20, level_spacing=0.5, wake_up_freq='1s', subscribe=False, subscribe_freq=10e9, subscribe_num_levels=1, cancel_limit_delay=50,
-                 skew_beta=0, spread_alpha=0.85, backstop_quantity=None, log_orders=False, random_state=None):
+                 skew_beta=0, spread_alpha=0.85, backstop_quantity=None, batch_orders=False, log_orders=False, random_state=None):
 
         super().__init__(id, name, type, starting_cash=starting_cash, log_orders=log_orders, random_state=random_state)
         self.is_adaptive = False
@@ -50,6 +50,7 @@ class AdaptiveMarketMakerAgent(TradingAgent):
         self.skew_beta = skew_beta  # parameter for determining order placement imbalance
         self.spread_alpha = spread_alpha  # parameter for exponentially weighted moving average of spread. 1 corresponds to ignoring old values, 0 corresponds to no updates
         self.backstop_quantity = backstop_quantity  # how many orders to place at outside order level, to prevent liquidity dropouts. If None then place same as at other levels.
+        self.batch_orders = batch_orders  # if True, replace the whole ladder with one REPLACE_ORDERS message instead of a message per order
         self.log_orders = log_orders
 
         ## Internal variables
@@ -113,15 +114,17 @@ class AdaptiveMarketMakerAgent(TradingAgent):
         """ Agent wakeup is determined by self.wake_up_freq """
         can_trade = super().wakeup(currentTime)
         if self.subscribe and not self.subscription_requested:
-            super().requestDataSubscription(self.symbol, levels=self.subscribe_num_levels,
-                                            freq=pd.Timedelta(self.subscribe_freq, unit='ns'))
+            super().requestDataSubscription(self.symbol, levels=0, freq=pd.Timedelta(self.subscribe_freq, unit='ns'),
+                                            features=['bid', 'ask', 'spread'])
             self.subscription_requested = True
             self.get_transacted_volume(self.symbol, lookback_period=self.subscribe_freq)
             self.state = self.initialiseState()
 
         elif can_trade and not self.subscribe:
-            self.cancelAllOrders()
-            self.delay(self.cancel_limit_delay)
+            # In batch mode the old ladder is cancelled by the exchange when the new one is placed.
+            if not self.batch_orders:
+                self.cancelAllOrders()
+                self.delay(self.cancel_limit_delay)
             self.getCurrentSpread(self.symbol, depth=self.subscribe_num_levels)
             self.get_transacted_volume(self.symbol, lookback_period=self.wake_up_freq)
             self.initialiseState()
@@ -170,14 +173,14 @@ class AdaptiveMarketMakerAgent(TradingAgent):
                 self.setWakeup(currentTime + self.getWakeFrequency())
 
         else:  # subscription mode
-            if msg.body['msg'] == 'MARKET_DATA' and self.state['AWAITING_MARKET_DATA'] is True:
-                bid = self.known_bids[self.symbol][0][0] if self.known_bids[self.symbol] else None
-                ask = self.known_asks[self.symbol][0][0] if self.known_asks[self.symbol] else None
+            if msg.body['msg'] == 'MARKET_FEATURES' and self.state['AWAITING_MARKET_DATA'] is True:
+                features = self.known_features[self.symbol]
+                bid, ask = features['bid'], features['ask']
                 if bid and ask:
                     mid = int((ask + bid) / 2)
                     self.last_mid = mid
                     if self.is_adaptive:
-                        spread = int(ask - bid)
+                        spread = int(features['spread'])
                         self._adaptive_update_spread(spread)
 
                     self.state['AWAITING_MARKET_DATA'] = False
@@ -185,9 +188,10 @@ class AdaptiveMarketMakerAgent(TradingAgent):
                     log_print("SPREAD MISSING at time {}", currentTime)
                     self.state['AWAITING_MARKET_DATA'] = False
 
-            if self.state['MARKET_DATA'] is False and self.state['AWAITING_TRANSACTED_VOLUME'] is False:
-                self.placeOrders(mid)
+            if self.state['AWAITING_MARKET_DATA'] is False and self.state['AWAITING_TRANSACTED_VOLUME'] is False:
+                if self.last_mid is not None: self.placeOrders(self.last_mid)
                 self.state = self.initialiseState()
+                self.get_transacted_volume(self.symbol, lookback_period=self.subscribe_freq)
 
     def _adaptive_update_spread(self, spread):
         """ Update internal spread estimate with exponentially weighted moving average
@@ -261,6 +265,10 @@ class AdaptiveMarketMakerAgent(TradingAgent):
 
         bid_orders, ask_orders = self.computeOrdersToPlace(mid)
 
+        if self.batch_orders:
+            self.replaceOrders(bid_orders, ask_orders)
+            return
+
         if self.backstop_quantity is not None:
             bid_price = bid_orders[0]
             log_print('{}: Placing BUY limit order of size {} @ price {}', self.name, self.backstop_quantity, bid_price)
@@ -280,6 +288,23 @@ class AdaptiveMarketMakerAgent(TradingAgent):
             log_print('{}: Placing SELL limit order of size {} @ price {}', self.name, self.sell_order_size, ask_price)
             self.placeLimitOrder(self.symbol, self.sell_order_size, False, ask_price)
 
+    def replaceOrders(self, bid_orders, ask_orders):
+        """ Replaces the resting ladder with orders at the given bid and ask prices in one message to the Exchange.
+            Orders are sized as in placeOrders, including the backstop orders at the outermost levels.
+        """
+        ladder = []
+
+        if self.backstop_quantity is not None:
+            ladder.append((self.backstop_quantity, True, bid_orders[0]))
+            ladder.append((self.backstop_quantity, False, ask_orders[-1]))
+            bid_orders, ask_orders = bid_orders[1:], ask_orders[:-1]
+
+        ladder.extend((self.buy_order_size, True, bid_price) for bid_price in bid_orders)
+        ladder.extend((self.sell_order_size, False, ask_price) for ask_price in ask_orders)
+
+        log_print('{}: Replacing orders with ladder of {} limit orders', self.name, len(ladder))
+        self.replaceAllOrdersForSymbol(self.symbol, ladder)
+
     def getWakeFrequency(self):
         """ Get time increment corresponding to wakeup period. """
         return pd.Timedelta(self.wake_up_freq)
@@ -74,8 +74,8 @@ class POVMarketMakerAgent(TradingAgent):
         """ Agent wakeup is determined by self.wake_up_freq """
         can_trade = super().wakeup(currentTime)
         if self.subscribe and not self.subscription_requested:
-            super().requestDataSubscription(self.symbol, levels=self.subscribe_num_levels,
-                                            freq=pd.Timedelta(self.subscribe_freq, unit='ns'))
+            super().requestDataSubscription(self.symbol, levels=0, freq=pd.Timedelta(self.subscribe_freq, unit='ns'),
+                                            features=['bid', 'ask'])
             self.subscription_requested = True
             self.get_transacted_volume(self.symbol, lookback_period=self.subscribe_freq)
             self.state = self.initialiseState()
@@ -114,7 +114,7 @@ class POVMarketMakerAgent(TradingAgent):
                     self.last_mid = mid
                     self.state['AWAITING_SPREAD'] = False
                 else:
-                    log_print(f"SPREAD MISSING at time {currentTime}")
+                    log_print("SPREAD MISSING at time {}", currentTime)
 
             if self.state['AWAITING_SPREAD'] is False and self.state['AWAITING_TRANSACTED_VOLUME'] is False:
                 self.cancelAllOrders()
@@ -123,20 +123,20 @@ class POVMarketMakerAgent(TradingAgent):
                 self.setWakeup(currentTime + self.getWakeFrequency())
 
         else:  # subscription mode
-            if msg.body['msg'] == 'MARKET_DATA' and self.state['AWAITING_MARKET_DATA'] is True:
-                bid = self.known_bids[self.symbol][0][0] if self.known_bids[self.symbol] else None
-                ask = self.known_asks[self.symbol][0][0] if self.known_asks[self.symbol] else None
+            if msg.body['msg'] == 'MARKET_FEATURES' and self.state['AWAITING_MARKET_DATA'] is True:
+                bid, ask = self.known_features[self.symbol]['bid'], self.known_features[self.symbol]['ask']
                 if bid and ask:
                     mid = int((ask + bid) / 2)
                     self.last_mid = mid
                     self.state['AWAITING_MARKET_DATA'] = False
                 else:
-                    log_print(f"SPREAD MISSING at time {currentTime}")
+                    log_print("SPREAD MISSING at time {}", currentTime)
                     self.state['AWAITING_MARKET_DATA'] = False
 
-            if self.state['MARKET_DATA'] is False and self.state['AWAITING_TRANSACTED_VOLUME'] is False:
-                self.placeOrders(mid)
+            if self.state['AWAITING_MARKET_DATA'] is False and self.state['AWAITING_TRANSACTED_VOLUME'] is False:
+                if self.last_mid is not None: self.placeOrders(self.last_mid)
                 self.state = self.initialiseState()
+                self.get_transacted_volume(self.symbol, lookback_period=self.subscribe_freq)
 
     def updateOrderSize(self):
         """ Updates size of order to be placed. """
@@ -178,11 +178,11 @@ class POVMarketMakerAgent(TradingAgent):
 
         bid_orders, ask_orders = self.computeOrdersToPlace(mid)
         for bid_price in bid_orders:
-            log_print(f'{self.name}: Placing BUY limit order of size {self.order_size} @ price {bid_price}')
+            log_print('{}: Placing BUY limit order of size {} @ price {}', self.name, self.order_size, bid_price)
             self.placeLimitOrder(self.symbol, self.order_size, True, bid_price)
 
         for ask_price in ask_orders:
-            log_print(f'{self.name}: Placing SELL limit order of size {self.order_size} @ price {ask_price}')
+            log_print('{}: Placing SELL limit order of size {} @ price {}', self.name, self.order_size, ask_price)
             self.placeLimitOrder(self.symbol, self.order_size, False, ask_price)
 
     def getWakeFrequency(self):
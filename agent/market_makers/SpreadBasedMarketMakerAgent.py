@@ -61,7 +61,7 @@ class SpreadBasedMarketMakerAgent(TradingAgent):
         """ Agent wakeup is determined by self.wake_up_freq """
         can_trade = super().wakeup(currentTime)
         if self.subscribe and not self.subscription_requested:
-            super().requestDataSubscription(self.symbol, levels=self.subscribe_num_levels, freq=self.subscribe_freq)
+            super().requestDataSubscription(self.symbol, levels=0, freq=self.subscribe_freq, features=['bid', 'ask'])
             self.subscription_requested = True
             self.state = 'AWAITING_MARKET_DATA'
         elif can_trade and not self.subscribe:
@@ -91,7 +91,7 @@ class SpreadBasedMarketMakerAgent(TradingAgent):
             if bid and ask:
                 mid = int((ask + bid) / 2)
             else:
-                log_print(f"SPREAD MISSING at time {currentTime}")
+                log_print("SPREAD MISSING at time {}", currentTime)
 
             orders_to_cancel = self.computeOrdersToCancel(mid)
             self.cancelOrders(orders_to_cancel)
@@ -100,14 +100,13 @@ class SpreadBasedMarketMakerAgent(TradingAgent):
             self.state = 'AWAITING_WAKEUP'
             self.last_mid = mid
 
-        elif self.subscribe and self.state == 'AWAITING_MARKET_DATA' and msg.body['msg'] == 'MARKET_DATA':
+        elif self.subscribe and self.state == 'AWAITING_MARKET_DATA' and msg.body['msg'] == 'MARKET_FEATURES':
 
-            bid = self.known_bids[self.symbol][0][0] if self.known_bids[self.symbol] else None
-            ask = self.known_asks[self.symbol][0][0] if self.known_asks[self.symbol] else None
+            bid, ask = self.known_features[self.symbol]['bid'], self.known_features[self.symbol]['ask']
             if bid and ask:
                 mid = int((ask + bid) / 2)
             else:
-                log_print(f"SPREAD MISSING at time {currentTime}")
+                log_print("SPREAD MISSING at time {}", currentTime)
                 return
 
             orders_to_cancel = self.computeOrdersToCancel(mid)
@@ -232,11 +231,11 @@ class SpreadBasedMarketMakerAgent(TradingAgent):
 
         bid_orders, ask_orders = self.computeOrdersToPlace(mid)
         for bid_order in bid_orders:
-            log_print(f'{self.name}: Placing BUY limit order of size {self.order_size} @ price {bid_order.price}')
+            log_print('{}: Placing BUY limit order of size {} @ price {}', self.name, self.order_size, bid_order.price)
             self.placeLimitOrder(self.symbol, self.order_size, True, bid_order.price, order_id=bid_order.id)
 
         for ask_order in ask_orders:
-            log_print(f'{self.name}: Placing SELL limit order of size {self.order_size} @ price {ask_order.price}')
+            log_print('{}: Placing SELL limit order of size {} @ price {}', self.name, self.order_size, ask_order.price)
             self.placeLimitOrder(self.symbol, self.order_size, False, ask_order.price, order_id=ask_order.id)
 
     def initialiseBidsAsksDeques(self, mid):
@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+
+sys.path.append('.')
+from util.LogSink import LOG_SINKS, _agent_names, read_log
+
+# Compares every log of two simulation log directories, in whichever formats they were written,
+# e.g. a run resumed from a checkpoint against the same run made without interruption.  With
+# --ignore-order-ids, order ids (in logged orders and in order id columns) are left out of the
+# comparison, e.g. to compare a partitioned run (see Kernel.runPartitioned) against a sequential one.
+# Prints the logs that differ or exist in only one directory, and exits with status 1 if any do.
+
+
+def log_names(log_dir):
+  # The name of every log in log_dir, as its bz2 file would be named without the extension:
+  # per-type columnar files hold the logs of several agents.
+  names = set()
+  extensions = tuple(sink.extension for sink in LOG_SINKS.values())
+
+  for file in os.listdir(log_dir):
+    if not file.endswith(extensions): continue
+    path = os.path.join(log_dir, file)
+    agents = _agent_names(path) if not file.endswith('.bz2') else set()
+    names |= agents if agents else { os.path.splitext(file)[0] }
+
+  return names
+
+
+def without_order_ids(value):
+  if isinstance(value, dict):
+    return { k: without_order_ids(v) for k, v in value.items() if str(k).lower() != 'order_id' }
+  return value
+
+
+def ignore_order_ids(df):
+  df = df.drop(columns=[c for c in df.columns if str(c).lower() == 'order_id'])
+  for c in df.columns[df.dtypes == object]:
+    df[c] = df[c].map(without_order_ids)
+  return df
+
+
+def same_log(a, b):
+  if a.shape != b.shape or list(a.columns) != list(b.columns): return False
+  if not a.index.equals(b.index): return False
+
+  # Compare cell by cell through repr so that NaN inside logged dicts compares equal to itself.
+  return all(list(map(repr, a[c])) == list(map(repr, b[c])) for c in a.columns)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Compares the logs of two simulation log directories.')
+  parser.add_argument('log_dir', help='First log directory')
+  parser.add_argument('other_log_dir', help='Second log directory')
+  parser.add_argument('--ignore-order-ids', action='store_true', help='Leave order ids out of the comparison')
+  args = parser.parse_args()
+
+  names, other_names = log_names(args.log_dir), log_names(args.other_log_dir)
+  differ = sorted(names ^ other_names)
+  for name in differ: print ("Only in one directory: {}".format(name))
+
+  for name in sorted(names & other_names):
+    a = read_log(os.path.join(args.log_dir, name + '.bz2'))
+    b = read_log(os.path.join(args.other_log_dir, name + '.bz2'))
+    if args.ignore_order_ids:
+      a, b = [ignore_order_ids(df) for df in (a, b)]
+    if not same_log(a, b):
+      print ("Differs: {}".format(name))
+      differ.append(name)
+
+  print ("{} logs compared, {} differ.".format(len(names | other_names), len(differ)))
+  sys.exit(1 if differ else 0)
@@ -1,6 +1,9 @@
 import pandas as pd
 import sys
 
+sys.path.append('.')
+from util.LogSink import read_log
+
 # Auto-detect terminal width.
 pd.options.display.width = None
 pd.options.display.max_rows = 500000
@@ -12,7 +15,7 @@ if len(sys.argv) < 2:
 
 file = sys.argv[1]
 
-df = pd.read_pickle(file, compression='bz2')
+df = read_log(file)
 
 if len(sys.argv) > 2:
   events = sys.argv[2:]
@@ -2,6 +2,9 @@ import os
 import pandas as pd
 import sys
 
+sys.path.append('.')
+from util.LogSink import read_log
+
 # Auto-detect terminal width.
 pd.options.display.width = None
 pd.options.display.max_rows = 500000
@@ -28,31 +31,46 @@ for log_dir in log_dirs:
   if dir_count % 100 == 0: print ("Completed {} directories".format(dir_count))
   dir_count += 1
   for file in os.listdir(log_dir):
-    try:
-      df = pd.read_pickle(os.path.join(log_dir,file), compression='bz2')
-      # print(df)
-      events = [ 'AGENT_TYPE', 'STARTING_CASH', 'ENDING_CASH', 'FINAL_CASH_POSITION', 'MARKED_TO_MARKET' ]
-      event = "|".join(events)
-      df = df[df['EventType'].str.contains(event)]
-
-      at = df.loc[df['EventType'] == 'AGENT_TYPE', 'Event'][0]
-      if 'Exchange' in at:
-        # There may be different fields to look at later on.
-        continue
-
-      file_count += 1
+    if 'summary' in file: continue
 
-      sc = df.loc[df['EventType'] == 'STARTING_CASH', 'Event'][0]
-      ec = df.loc[df['EventType'] == 'ENDING_CASH', 'Event'][0]
-      fcp = df.loc[df['EventType'] == 'FINAL_CASH_POSITION', 'Event'][0]
-      fv = df.loc[df['EventType'] == 'MARKED_TO_MARKET', 'Event'][0]
-
-      ret = fcp - sc
-      surp = fv - sc
-      stats.append({ 'AgentType' : at, 'Return' : ret, 'Surplus' : surp })
-    except (IndexError, KeyError):
+    # Columnar logs hold every agent of one type, with an Agent column naming each;
+    # bz2 logs hold a single agent.
+    try:
+      df_file = read_log(os.path.join(log_dir,file), columns=[ 'EventType', 'Event' ])
+    except KeyError:
+      # Not an agent event log (e.g. the order book or fundamental series).
       continue
 
+    if 'Agent' in df_file.columns:
+      dfs = [ df for _, df in df_file.groupby('Agent', sort=False) ]
+    else:
+      dfs = [ df_file ]
+
+    for df in dfs:
+      try:
+        # print(df)
+        events = [ 'AGENT_TYPE', 'STARTING_CASH', 'ENDING_CASH', 'FINAL_CASH_POSITION', 'MARKED_TO_MARKET' ]
+        event = "|".join(events)
+        df = df[df['EventType'].str.contains(event)]
+
+        at = df.loc[df['EventType'] == 'AGENT_TYPE', 'Event'][0]
+        if 'Exchange' in at:
+          # There may be different fields to look at later on.
+          continue
+
+        file_count += 1
+
+        sc = df.loc[df['EventType'] == 'STARTING_CASH', 'Event'][0]
+        ec = df.loc[df['EventType'] == 'ENDING_CASH', 'Event'][0]
+        fcp = df.loc[df['EventType'] == 'FINAL_CASH_POSITION', 'Event'][0]
+        fv = df.loc[df['EventType'] == 'MARKED_TO_MARKET', 'Event'][0]
+
+        ret = fcp - sc
+        surp = fv - sc
+        stats.append({ 'AgentType' : at, 'Return' : ret, 'Surplus' : surp })
+      except (IndexError, KeyError):
+        continue
+
 df_stats = pd.DataFrame(stats)
 
 print (df_stats.groupby('AgentType').mean())
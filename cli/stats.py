@@ -2,6 +2,9 @@ import os
 import pandas as pd
 import sys
 
+sys.path.append('.')
+from util.LogSink import read_log
+
 # Auto-detect terminal width.
 pd.options.display.width = None
 pd.options.display.max_rows = 500000
@@ -31,7 +34,7 @@ for log_dir in log_dirs:
   for file in os.listdir(log_dir):
     if 'summary' not in file: continue
 
-    df = pd.read_pickle(os.path.join(log_dir,file), compression='bz2')
+    df = read_log(os.path.join(log_dir,file), columns=['AgentID', 'AgentStrategy', 'EventType', 'Event'])
   
     events = [ 'STARTING_CASH', 'ENDING_CASH', 'FINAL_CASH_POSITION', 'FINAL_VALUATION' ]
     event = "|".join(events)
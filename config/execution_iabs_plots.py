@@ -41,6 +41,9 @@ parser.add_argument('-f',
                     '--fundamental-file-path',
                     required=True,
                     help="Path to external fundamental file.")
+parser.add_argument('--fundamental-store',
+                    default=None,
+                    help="Directory of memory-mapped fundamental series shared between runs (built on first use).")
 parser.add_argument('-e',
                     '--execution_agents',
                     action='store_true',
@@ -106,9 +109,9 @@ symbols = {
         'random_state': np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32, dtype='uint64'))
     }
 }
-oracle = ExternalFileOracle(symbols)
+oracle = ExternalFileOracle(symbols, store=args.fundamental_store)
 
-r_bar = util.get_value_from_timestamp(oracle.fundamentals[symbol], mkt_open)
+r_bar = util.get_value_from_timestamp(oracle.getFundamentalSeries(symbol, mkt_open).to_series(), mkt_open)
 
 sigma_n = r_bar / 10
 kappa = 1.67e-15
@@ -5,7 +5,7 @@ import sys
 import datetime as dt
 
 from agent.ExchangeAgent import ExchangeAgent
-from agent.examples.MarketReplayAgent import MarketReplayAgent
+from agent.examples.MarketReplayAgent import MarketReplayAgent, L3OrdersProcessor
 
 from agent.execution.TWAPExecutionAgent import TWAPExecutionAgent
 from agent.execution.VWAPExecutionAgent import VWAPExecutionAgent
@@ -44,6 +44,9 @@ parser.add_argument('-l',
                     '--log_dir',
                     default=None,
                     help='Log directory name (default: unix timestamp at program start)')
+parser.add_argument('--fast-replay',
+                    action='store_true',
+                    help='Replay historical orders directly inside the exchange instead of through a replay agent')
 parser.add_argument('-v',
                     '--verbose',
                     action='store_true',
@@ -87,6 +90,16 @@ mkt_close = historical_date_pd + pd.to_timedelta('16:00:00')
 print("Market Open : {}".format(mkt_open))
 print("Market Close: {}".format(mkt_close))
 
+# Historical orders, replayed by the Market Replay Agent, or with --fast-replay directly by the exchange.
+file_name = f'DOW30/{symbol}/{symbol}.{historical_date}'
+orders_file_path = f'/efs/data/{file_name}'
+processed_orders_folder_path = '/efs/data/marketreplay/'
+
+replay = None
+if args.fast_replay:
+    replay = {symbol: L3OrdersProcessor(symbol, historical_date_pd, mkt_open, mkt_close,
+                                        orders_file_path, processed_orders_folder_path)}
+
 agents.extend([ExchangeAgent(id=0,
                              name="EXCHANGE_AGENT",
                              type="ExchangeAgent",
@@ -98,30 +111,31 @@ agents.extend([ExchangeAgent(id=0,
                              computation_delay=0,
                              stream_history=10,
                              book_freq=0,
+                             replay=replay,
                              random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32,
                                                                                        dtype='uint64')))])
 agent_types.extend("ExchangeAgent")
 agent_count += 1
 
 # 2) Market Replay Agent
-file_name = f'DOW30/{symbol}/{symbol}.{historical_date}'
-orders_file_path = f'/efs/data/{file_name}'
-
-agents.extend([MarketReplayAgent(id=1,
-                                 name="MARKET_REPLAY_AGENT",
-                                 type='MarketReplayAgent',
-                                 symbol=symbol,
-                                 log_orders=False,
-                                 date=historical_date_pd,
-                                 start_time=mkt_open,
-                                 end_time=mkt_close,
-                                 orders_file_path=orders_file_path,
-                                 processed_orders_folder_path='/efs/data/marketreplay/',
-                                 starting_cash=0,
-                                 random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32,
-                                                                                           dtype='uint64')))])
-agent_types.extend("MarketReplayAgent")
-agent_count += 1
+# (The random state is drawn either way, so the other agents are seeded the same in both replay modes.)
+replay_random_state = np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32, dtype='uint64'))
+
+if not args.fast_replay:
+    agents.extend([MarketReplayAgent(id=agent_count,
+                                     name="MARKET_REPLAY_AGENT",
+                                     type='MarketReplayAgent',
+                                     symbol=symbol,
+                                     log_orders=False,
+                                     date=historical_date_pd,
+                                     start_time=mkt_open,
+                                     end_time=mkt_close,
+                                     orders_file_path=orders_file_path,
+                                     processed_orders_folder_path=processed_orders_folder_path,
+                                     starting_cash=0,
+                                     random_state=replay_random_state)])
+    agent_types.extend("MarketReplayAgent")
+    agent_count += 1
 
 # 3) Execution Agent Config
 trade = True if args.execution_agents else False
@@ -38,6 +38,9 @@ parser.add_argument('-f',
                     '--fundamental-file-path',
                     required=True,
                     help="Path to external fundamental file.")
+parser.add_argument('--fundamental-store',
+                    default=None,
+                    help="Directory of memory-mapped fundamental series shared between runs (built on first use).")
 parser.add_argument('-l',
                     '--log_dir',
                     default=None,
@@ -95,9 +98,9 @@ symbols = {
         'random_state': np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32, dtype='uint64'))
     }
 }
-oracle = ExternalFileOracle(symbols)
+oracle = ExternalFileOracle(symbols, store=args.fundamental_store)
 
-r_bar = oracle.fundamentals[symbol].values[0]
+r_bar = oracle.getFundamentalSeries(symbol, mkt_open).prices[0]
 sigma_n = r_bar / 10
 kappa = 1.67e-15
 lambda_a = 1e-12
@@ -1,25 +1,60 @@
 import argparse
 import os
-from multiprocessing import Pool
+import sys
 import psutil
 import datetime as dt
 import numpy as np
+import pandas as pd
 
+# Simulations run in this process's children (see util.Sweep), which import from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def run_in_parallel(num_simulations, num_parallel, config, log_folder, verbose):
+from util.Sweep import Sweep
+from util.util import numeric
+
+
+def read_param_tuples(param_file):
+    """ Reads comma-separated parameter values, one tuple per line, as printed by util/grid_search.py and
+        util/random_search.py.  param_file '-' reads standard input.
+    """
+    f = sys.stdin if param_file == '-' else open(param_file)
+    try:
+        return [[numeric(s) for s in line.strip().split(',')] for line in f if line.strip()]
+    finally:
+        if f is not sys.stdin: f.close()
 
-    global_seeds = np.random.randint(0, 2 ** 32, num_simulations)
-    print(f'Global Seeds: {global_seeds}')
 
-    processes = [f'python -u abides.py -c {config} -l {log_folder}_seed_{seed} {"-v" if verbose else ""} -s {seed}'
-                 for seed in global_seeds]
+def make_runs(global_seeds, log_folder, verbose, config_args, params=None, param_tuples=None):
+    """ Returns the command line arguments of each run: every seed with every parameter tuple, if any.  params names
+        the config options (e.g. mm-pov) that each parameter tuple sets.
+    """
+    runs = []
+    for i, values in enumerate(param_tuples if param_tuples else [None]):
+        param_args, folder = [], log_folder
+        if values is not None:
+            if len(values) != len(params):
+                raise ValueError("Parameter tuple does not match --params", values, params)
+            for name, value in zip(params, values):
+                param_args.extend([f'--{name}', str(value)])
+            folder = f'{log_folder}_params_{i}'
 
-    pool = Pool(processes=num_parallel)
-    pool.map(run_process, processes)
+        for seed in global_seeds:
+            runs.append(config_args + param_args + ['-l', f'{folder}_seed_{seed}', '-s', str(seed)] +
+                        (['-v'] if verbose else []))
 
+    return runs
 
-def run_process(process):
-    os.system(process)
+
+def run_in_parallel(num_simulations, num_parallel, config, log_folder, verbose, config_args=[], params=None,
+                    param_tuples=None, start_method='fork'):
+
+    global_seeds = np.random.randint(0, 2 ** 32, num_simulations)
+    print(f'Global Seeds: {global_seeds}')
+
+    runs = make_runs(global_seeds, log_folder, verbose, config_args, params, param_tuples)
+
+    sweep = Sweep(config, num_parallel=num_parallel, start_method=start_method)
+    return sweep.run(runs)
 
 
 if __name__ == "__main__":
@@ -29,16 +64,25 @@ if __name__ == "__main__":
     parser.add_argument('--seed', type=int, default=None,
                         help='Seed controlling the generated global seeds')
     parser.add_argument('--num_simulations', type=int, default=1,
-                        help='Total number of simulations to run')
+                        help='Total number of simulations to run (per parameter tuple)')
     parser.add_argument('--num_parallel', type=int, default=None,
                         help='Number of simulations to run in parallel')
     parser.add_argument('--config', required=True,
                         help='Name of config file to execute')
     parser.add_argument('--log_folder', required=True,
                         help='Log directory name')
+    parser.add_argument('--params', nargs='+', default=None,
+                        help='Config options (without leading dashes) set by each parameter tuple')
+    parser.add_argument('--param_file', default=None,
+                        help='File of parameter tuples, e.g. the output of util/grid_search.py ("-" for stdin)')
+    parser.add_argument('--start_method', choices=['fork', 'forkserver'], default='fork',
+                        help='How worker processes are started')
+    parser.add_argument('--results', default=None,
+                        help='File to which the results of all runs are pickled')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Maximum verbosity!')
 
+    # Any other arguments are passed to every run of the config.
     args, remaining_args = parser.parse_known_args()
 
     seed = args.seed
@@ -48,17 +92,32 @@ if __name__ == "__main__":
     log_folder = args.log_folder
     verbose = args.verbose
 
-    print(f'Total number of simulation: {num_simulations}')
+    param_tuples = read_param_tuples(args.param_file) if args.param_file else None
+    if param_tuples and not args.params:
+        parser.error('--param_file requires --params')
+
+    print(f'Total number of simulation: {num_simulations * (len(param_tuples) if param_tuples else 1)}')
     print(f'Number of simulations to run in parallel: {num_parallel}')
     print(f'Configuration: {config}')
 
     np.random.seed(seed)
 
-    run_in_parallel(num_simulations=num_simulations,
-                    num_parallel=num_parallel,
-                    config=config,
-                    log_folder=log_folder,
-                    verbose=verbose)
+    results = run_in_parallel(num_simulations=num_simulations,
+                              num_parallel=num_parallel,
+                              config=config,
+                              log_folder=log_folder,
+                              verbose=verbose,
+                              config_args=remaining_args,
+                              params=args.params,
+                              param_tuples=param_tuples,
+                              start_method=args.start_method)
+
+    with pd.option_context('display.max_columns', None, 'display.width', None):
+        print(Sweep.summary_frame(results))
+
+    if args.results:
+        pd.to_pickle(results, args.results)
+        print(f'Results written to {args.results}')
 
     end_time = dt.datetime.now()
-    print(f'Total time taken to run in parallel: {end_time - start_time}')
\ No newline at end of file
+    print(f'Total time taken to run in parallel: {end_time - start_time}')
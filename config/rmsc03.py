@@ -9,6 +9,7 @@
 # - 10    wb Agents
 # - 20    Dynamic cppi Agents
 # - 1     (Optional) POV Execution agent
+# - 1     (Optional) Gym agent, driven by util.VectorEnv
 
 
 import argparse
@@ -28,6 +29,7 @@ from agent.ValueAgent import ValueAgent
 from agent.WbrAgent import WbrAgent
 from agent.DynamicCppiAgent import DynamicCppiAgent
 from agent.BHAgent import BHAgent
+from agent.GymAgent import GymAgent
 from agent.execution.POVExecutionAgent import POVExecutionAgent
 from agent.market_makers.AdaptiveMarketMakerAgent import AdaptiveMarketMakerAgent
 from model.LatencyModel import LatencyModel
@@ -88,6 +90,21 @@ parser.add_argument('-p',
                     type=float,
                     default=0.1,
                     help='Participation of Volume level for execution agent')
+parser.add_argument('--fork-at',
+                    type=parse,
+                    default=None,
+                    help='Time (no later than the execution agent start) at which to branch the simulation into '
+                         'one run per --fork-execution-pov, simulating the shared morning only once.')
+parser.add_argument('--fork-execution-pov',
+                    type=float,
+                    nargs='+',
+                    default=[],
+                    help='Participation of Volume levels for the execution agent in the runs branched at --fork-at. '
+                         'Each logs to <log_dir>_pov_<level>; the original run carries on as configured.')
+parser.add_argument('--save-checkpoint',
+                    default=None,
+                    help='File to which to save a checkpoint of the simulation at --fork-at (before any branching). '
+                         'Kernel.loadCheckpoint(file).resume() completes the simulation from there.')
 # market maker config
 parser.add_argument('--mm-pov',
                     type=float,
@@ -124,12 +141,46 @@ parser.add_argument('--mm-spread-alpha',
 parser.add_argument('--mm-backstop-quantity',
                     type=float,
                     default=50000)
+parser.add_argument('--mm-batch-orders',
+                    action='store_true',
+                    help='Market makers replace their ladder with one batched message per update')
+
+parser.add_argument('--gym-agent',
+                    action='store_true',
+                    help='Add a GymAgent, whose trades are decided by a learner (see util/VectorEnv.py)')
+parser.add_argument('--gym-wake-freq',
+                    default='1min',
+                    help='Time between the decisions of the GymAgent')
+
+parser.add_argument('--partitions',
+                    type=int,
+                    default=None,
+                    help='Run the simulation in parallel in this many processes (see Kernel.runPartitioned). '
+                         'Results and logs are those of the sequential run except for order ids, which each process '
+                         'draws from its own block: do not match orders across runs by id '
+                         '(scripts/check_partitions.sh compares the two runs).')
+
+parser.add_argument('--legacy-transacted-volume',
+                    action='store_true',
+                    default=False,
+                    help='Compute transacted volume as before the trade ledger (to reproduce earlier results)')
 
 parser.add_argument('--fund-vol',
                     type=float,
                     default=1e-8,
                     help='Volatility of fundamental time series.'
                     )
+parser.add_argument('--log-format',
+                    choices=['bz2', 'parquet', 'arrow'],
+                    default='bz2',
+                    help='Storage format for agent logs (parquet and arrow require pyarrow; '
+                         'read any format with util.LogSink.read_log).'
+                    )
+parser.add_argument('--log-writers',
+                    type=int,
+                    default=0,
+                    help='Number of background threads writing logs at shutdown (0 writes serially).'
+                    )
 
 args, remaining_args = parser.parse_known_args()
 
@@ -198,6 +249,7 @@ agents.extend([ExchangeAgent(id=0,
                              pipeline_delay=0,
                              computation_delay=0,
                              stream_history=stream_history_length,
+                             legacy_transacted_volume=args.legacy_transacted_volume,
                              book_freq=book_freq,
                              wide_book=True,
                              random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32, dtype='uint64')))])
@@ -272,6 +324,7 @@ agents.extend([AdaptiveMarketMakerAgent(id=j,
                                 level_spacing=args.mm_level_spacing,
                                 spread_alpha=args.mm_spread_alpha,
                                 backstop_quantity=args.mm_backstop_quantity,
+                                batch_orders=args.mm_batch_orders,
                                 log_orders=log_orders,
                                 random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32,
                                                                                           dtype='uint64')))
@@ -404,12 +457,29 @@ agents.extend(execution_agents)
 agent_types.extend("ExecutionAgent")
 agent_count += 1
 
+# 7) (Optional) Gym Agent
+
+if args.gym_agent:
+    agents.extend([GymAgent(id=agent_count,
+                            name='GYM_AGENT',
+                            type='GymAgent',
+                            symbol=symbol,
+                            starting_cash=starting_cash,
+                            wake_freq=args.gym_wake_freq,
+                            log_orders=log_orders,
+                            random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32,
+                                                                                        dtype='uint64')))])
+    agent_types.extend(['GymAgent'])
+    agent_count += 1
+
 
 ########################################################################################################################
 ########################################### KERNEL AND OTHER CONFIG ####################################################
 
 kernel = Kernel("RMSC03 Kernel", random_state=np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32,
-                                                                                                  dtype='uint64')))
+                                                                                                  dtype='uint64')),
+                log_format=args.log_format,
+                log_writers=args.log_writers)
 
 kernelStartTime = historical_date
 kernelStopTime = mkt_close + pd.to_timedelta('00:01:00')
@@ -438,13 +508,50 @@ latency_model = LatencyModel(latency_model='deterministic',
                              )
 # KERNEL
 
+# Optionally branch the simulation at --fork-at into runs in which the execution agent trades at each requested
+# participation level (e.g. for market impact studies against the original run as a baseline).
+
+
+def execution_variant(pov):
+    def switch_on(k):
+        agent = k.agents[pov_agent.id]
+        agent.trade = True
+        agent.pov = pov
+        k.log_dir = '{}_pov_{}'.format(k.log_dir, pov)
+    return switch_on
+
+
+def fork_executions(k):
+    if args.save_checkpoint: k.saveCheckpoint(args.save_checkpoint)
+    k.forkVariants([execution_variant(pov) for pov in args.fork_execution_pov])
+
+
+fork_time = historical_date + pd.to_timedelta(args.fork_at.strftime('%H:%M:%S')) if args.fork_at else None
+
+# Optionally run in parallel.  The exchange stays in the first partition with the agents that observe the oracle
+# (which draws its values on demand) or draw from numpy's global generator while trading, and the other agents are
+# dealt to the remaining partitions.
+# Only the exchange talks to the other agents, so the lookahead is the smallest latency to or from the exchange.
+partitions, lookahead = None, None
+if args.partitions:
+    partitions = np.zeros(agent_count, dtype=int)
+    others = [a.id for a in agents if a.id != 0 and not isinstance(a, (NoiseAgent, ValueAgent, DynamicCppiAgent))]
+    if args.partitions > 1:
+        partitions[others] = 1 + np.arange(len(others)) % (args.partitions - 1)
+        lookahead = int(min(latency_model.min_latency_between([0], others),
+                            latency_model.min_latency_between(others, [0])))
+
 kernel.runner(agents=agents,
               startTime=kernelStartTime,
               stopTime=kernelStopTime,
               agentLatencyModel=latency_model,
               defaultComputationDelay=defaultComputationDelay,
               oracle=oracle,
-              log_dir=args.log_dir)
+              log_dir=args.log_dir,
+              checkpoint_time=fork_time,
+              checkpoint=fork_executions if fork_time is not None else None,
+              partitions=partitions,
+              lookahead=lookahead)
 
 
 simulation_end_time = dt.datetime.now()
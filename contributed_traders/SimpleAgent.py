@@ -1,4 +1,5 @@
 from agent.TradingAgent import TradingAgent
+from util.Indicators import ExponentialMovingAverage
 import pandas as pd
 import numpy as np
 import os
@@ -21,7 +22,10 @@ class SimpleAgent(TradingAgent):
         self.max_size = max_size  # Maximum order size
         self.size = self.random_state.randint(self.min_size, self.max_size)
         self.wake_up_freq = wake_up_freq
-        self.mid_list, self.avg_win1_list, self.avg_win2_list = [], [], []
+        # Exponential moving averages of the mid price over the two windows (created once they are read in
+        # kernelStarting), and the latest of each rounded to the cent.
+        self.avg_win1, self.avg_win2 = None, None
+        self.last_avg_win1, self.last_avg_win2 = None, None
         self.log_orders = log_orders
         self.state = "AWAITING_WAKEUP"
         #self.window1 = 100 
@@ -32,6 +36,8 @@ class SimpleAgent(TradingAgent):
         # Read in the configuration through util
         with open(get_file('simple_agent.cfg'), 'r') as f:
             self.window1, self.window2 = [int(w) for w in f.readline().split()]
+        self.avg_win1 = ExponentialMovingAverage(span=self.window1)
+        self.avg_win2 = ExponentialMovingAverage(span=self.window2)
         #print(f"{self.window1} {self.window2}")
 
     def wakeup(self, currentTime):
@@ -59,11 +65,13 @@ class SimpleAgent(TradingAgent):
             else:
                 bid, _, ask, _ = self.getKnownBidAsk(self.symbol)
                 if bid and ask:
-                    self.mid_list.append((bid + ask) / 2)
-                    if len(self.mid_list) > self.window1: self.avg_win1_list.append(pd.Series(self.mid_list).ewm(span=self.window1).mean().values[-1].round(2))
-                    if len(self.mid_list) > self.window2: self.avg_win2_list.append(pd.Series(self.mid_list).ewm(span=self.window2).mean().values[-1].round(2))
-                    if len(self.avg_win1_list) > 0 and len(self.avg_win2_list) > 0 and len(self.orders) == 0:
-                        if self.avg_win1_list[-1] >= self.avg_win2_list[-1]:
+                    mid = (bid + ask) / 2
+                    self.avg_win1.update(mid)
+                    self.avg_win2.update(mid)
+                    if self.avg_win1.count > self.window1: self.last_avg_win1 = np.round(self.avg_win1.value, 2)
+                    if self.avg_win2.count > self.window2: self.last_avg_win2 = np.round(self.avg_win2.value, 2)
+                    if self.last_avg_win1 is not None and self.last_avg_win2 is not None and len(self.orders) == 0:
+                        if self.last_avg_win1 >= self.last_avg_win2:
                             # Check that we have enough cash to place the order
                             if self.holdings['CASH'] >= (self.size * ask):
                                 self.placeLimitOrder(self.symbol, quantity=self.size, is_buy_order=True, limit_price=ask)
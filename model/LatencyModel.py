@@ -145,6 +145,41 @@ class LatencyModel:
     return latency
 
 
+  def min_latency_between(self, sender_ids, recipient_ids):
+    """
+    LatencyModel.min_latency_between() returns the smallest latency any message from one of the sender_ids
+    to one of the recipient_ids can have (its min_latency, as jitter is never negative), e.g. the lookahead
+    between two partitions of a parallel simulation.  Pairs that are not connected are ignored.
+
+    Required parameters:
+      'sender_ids'    : sequence of simulation agent_ids of senders
+      'recipient_ids' : sequence of simulation agent_ids of recipients
+    """
+    kw = self.kwargs
+    min_latency = np.broadcast_to(self._pairwise(kw['min_latency'], sender_ids, recipient_ids),
+                                  (len(sender_ids), len(recipient_ids)))
+
+    if self.latency_model == 'cubic':
+      connected = np.broadcast_to(self._pairwise(kw['connected'], sender_ids, recipient_ids), min_latency.shape)
+      min_latency = min_latency[connected.astype(bool)]
+
+    return min_latency.min() if min_latency.size else np.inf
+
+
+  def _pairwise(self, param, sids, rids):
+    """
+    Internal function to extract the values of a parameter (as for _extract) for every pair of the
+    given senders and recipients, as an array broadcastable to (senders, recipients).
+    """
+    if np.isscalar(param): return np.array(param)
+    if type(param) is np.ndarray:
+      if param.ndim == 1: return param[np.asarray(sids)][:, None]
+      elif param.ndim == 2: return param[np.ix_(sids, rids)]
+
+    print("Config error: LatencyModel parameter is not scalar, 1-D ndarray, or 2-D ndarray.")
+    sys.exit()
+
+
   def _extract(self, param, sid, rid):
     """
     Internal function to extract correct values for a sender->recipient pair from parameters that can
@@ -1,8 +1,11 @@
 import sys
 import pandas as pd
 
+sys.path.append('..')
+from util.LogSink import read_log
+
 def read_simulated_quotes (file):
-    df = pd.read_pickle(file, compression='bz2')
+    df = read_log(file, columns=['EventType', 'Event'])
     df['Timestamp'] = df.index
 
     # Keep only the last bid and last ask event at each timestamp.
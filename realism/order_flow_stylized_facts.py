@@ -2,6 +2,7 @@ import argparse
 import sys
 sys.path.append("..")
 from util.formatting.convert_order_stream import dir_path
+from util.LogSink import read_log
 import glob
 import re
 import pandas as pd
@@ -68,7 +69,7 @@ def unpickle_stream_dfs_to_stream_list(dir_containing_pickles):
         match = re.search(symbol_regex, stream_pkl) 
         symbol = match.group(1)
         date_YYYYMMDD = match.group(2)
-        orders_df = pd.read_pickle(stream_pkl) 
+        orders_df = read_log(stream_pkl)
         bundled_streams.append({
             "symbol": symbol,
             "date": date_YYYYMMDD,
@@ -0,0 +1,25 @@
+#!/bin/bash
+
+# Checks that a simulation saved to a checkpoint and resumed from it logs exactly what the same
+# simulation logs without interruption, with logs in the given format (bz2, parquet or arrow).
+
+format=${1:-parquet}
+seed=1234
+end_time=09:40:00
+checkpoint_time=09:35:00
+checkpoint=log/check_checkpoint_${format}.pkl
+
+python -u abides.py -c rmsc03 -t ABM -d 20200603 -s ${seed} --end-time ${end_time} --log-format ${format} \
+       -l check_checkpoint_${format}_baseline > /dev/null || exit 1
+
+python -u abides.py -c rmsc03 -t ABM -d 20200603 -s ${seed} --end-time ${end_time} --log-format ${format} \
+       -l check_checkpoint_${format}_saved --fork-at ${checkpoint_time} --save-checkpoint ${checkpoint} > /dev/null || exit 1
+
+python -u -c "
+from Kernel import Kernel
+kernel = Kernel.loadCheckpoint('${checkpoint}')
+kernel.log_dir = 'check_checkpoint_${format}_resumed'
+kernel.resume()
+" > /dev/null || exit 1
+
+python cli/compare_logs.py log/check_checkpoint_${format}_baseline log/check_checkpoint_${format}_resumed
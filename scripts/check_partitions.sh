@@ -0,0 +1,20 @@
+#!/bin/bash
+
+# Checks that a simulation run in parallel (see Kernel.runPartitioned) gives the results of the same simulation
+# run sequentially: the same final holdings and summary, and the same logs except for order ids.
+
+partitions=${1:-2}
+seed=1234
+end_time=09:40:00
+
+python -u abides.py -c rmsc03 -t ABM -d 20200603 -s ${seed} --end-time ${end_time} \
+       -l check_partitions_sequential > log/check_partitions_sequential.txt || exit 1
+
+python -u abides.py -c rmsc03 -t ABM -d 20200603 -s ${seed} --end-time ${end_time} --partitions ${partitions} \
+       -l check_partitions_${partitions} > log/check_partitions_${partitions}.txt || exit 1
+
+holdings="^(Final holdings|[A-Za-z]+Agent: )"
+diff <(grep -E "${holdings}" log/check_partitions_sequential.txt) \
+     <(grep -E "${holdings}" log/check_partitions_${partitions}.txt) || { echo "Final holdings differ."; exit 1; }
+
+python cli/compare_logs.py --ignore-order-ids log/check_partitions_sequential log/check_partitions_${partitions}
@@ -13,4 +13,20 @@ python -u config/parallel.py \
        --num_simulations ${num_simulations} \
        --num_parallel ${num_parallel} \
        --config ${config} \
-       --log_folder ${log_folder}
\ No newline at end of file
+       --log_folder ${log_folder} \
+       --results ${log_folder}_results.pkl
+
+# A parameter sweep: every seed is run with every parameter tuple printed by util/grid_search.py (or
+# util/random_search.py), and any further arguments are passed to each run of the config.
+#
+# python -u util/grid_search.py -l 0.025 0.05 -l 5 10 | \
+#   python -u config/parallel.py \
+#          --seed ${seed} \
+#          --num_simulations ${num_simulations} \
+#          --num_parallel ${num_parallel} \
+#          --config rmsc03 \
+#          --log_folder rmsc03_mm \
+#          --params mm-pov mm-window-size \
+#          --param_file - \
+#          --results rmsc03_mm_results.pkl \
+#          -t ABM -d 20200603
@@ -0,0 +1,195 @@
+# Full-depth order book log, recorded as level deltas in growable NumPy arrays.
+#
+# When an exchange archives its order book (book_freq is not None), the OrderBook takes a
+# snapshot after every limit order.  Storing each snapshot as a dict of every price level costs
+# time and memory proportional to the book depth on every order, which roughly doubled run time
+# and could exhaust memory on full-day runs.  Instead, the BookSides report which prices changed
+# since the last snapshot, and only those levels are recorded: one (snapshot, price, volume) row
+# per changed level, where volume is negative for bids and positive for asks (0 once the level
+# is gone).  Snapshot times and deltas live in preallocated int64 arrays that double in size as
+# needed.
+#
+# At the end of the simulation the deltas are expanded into the archived formats with vectorized
+# NumPy operations: each delta holds its volume until the next delta at the same price, so the
+# non-zero entries of the (time x price) book matrix are generated interval by interval, with no
+# per-row Python loop.
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+
+
+class BookLog:
+
+    def __init__(self, capacity=1024):
+        # Snapshot times in integer nanoseconds.
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.n = 0
+
+        # Level deltas: snapshot number, price and new signed volume.
+        self.rows = np.empty(capacity, dtype=np.int64)
+        self.prices = np.empty(capacity, dtype=np.int64)
+        self.volumes = np.empty(capacity, dtype=np.int64)
+        self.m = 0
+
+        # Signed volume currently recorded at each non-empty price.
+        self.last = {}
+
+        # Every price that has held a level in some snapshot.  These become the archive columns.
+        self.quotes_seen = set()
+
+        # Time zone of the snapshot times, restored on output.
+        self.tz = None
+
+    def __len__(self):
+        return self.n
+
+    def record(self, time, bids, asks):
+        """ Records a snapshot of the book at time (pd.Timestamp or int ns), given its two BookSides.
+            Only the prices in bids.changed and asks.changed are examined, and both sets are cleared.
+        """
+        if self.n == len(self.times):
+            self.times = self._grow(self.times)
+        if self.n == 0: self.tz = getattr(time, 'tz', None)
+
+        row = self.n
+        self.times[row] = getattr(time, 'value', time)
+        self.n += 1
+
+        for price in bids.changed | asks.changed:
+            bid_volume = bids.volume(price)
+            ask_volume = asks.volume(price)
+
+            if ask_volume is not None:
+                if bid_volume is not None:
+                    print("WARNING: THIS IS A REAL PROBLEM: an order book contains bids and asks at the same quote price!")
+                volume = ask_volume
+            elif bid_volume is not None:
+                volume = -bid_volume
+            else:
+                volume = 0
+
+            if ask_volume is not None or bid_volume is not None:
+                self.quotes_seen.add(price)
+
+            if volume != self.last.get(price, 0):
+                self._append(row, price, volume)
+                if volume: self.last[price] = volume
+                else: del self.last[price]
+
+        bids.changed.clear()
+        asks.changed.clear()
+
+    def _append(self, row, price, volume):
+        if self.m == len(self.rows):
+            self.rows = self._grow(self.rows)
+            self.prices = self._grow(self.prices)
+            self.volumes = self._grow(self.volumes)
+
+        self.rows[self.m] = row
+        self.prices[self.m] = price
+        self.volumes[self.m] = volume
+        self.m += 1
+
+    @staticmethod
+    def _grow(a):
+        b = np.empty(2 * len(a), dtype=a.dtype)
+        b[:len(a)] = a
+        return b
+
+    def _index(self, ns):
+        idx = pd.DatetimeIndex(ns)
+        if self.tz is not None: idx = idx.tz_localize('UTC').tz_convert(self.tz)
+        return idx
+
+    def snapshot_times(self):
+        """ Returns the distinct snapshot times as a DatetimeIndex. """
+        t = self.times[:self.n]
+        last = np.ones(len(t), dtype=bool)
+        last[:-1] = t[1:] != t[:-1]
+        return self._index(t[last])
+
+    def _expand(self, times):
+        # Returns the output index, the sorted quote array, and the (row, column, volume) triples
+        # of every non-zero entry in the book matrix with one row per output time.
+        t = self.times[:self.n]
+
+        if times is None:
+            # One row for every snapshot.
+            index = self._index(t)
+            sel = np.arange(self.n)
+        else:
+            # One row for each requested time: the latest snapshot at or before it (-1 if none).
+            index = pd.DatetimeIndex(times)
+            sel = np.searchsorted(t, index.asi8 if index.tz is None else index.tz_convert('UTC').tz_localize(None).asi8,
+                                  side='right') - 1
+
+        quotes = np.array(sorted(self.quotes_seen), dtype=np.int64)
+
+        rows = self.rows[:self.m]
+        cols = np.searchsorted(quotes, self.prices[:self.m])
+        vols = self.volumes[:self.m]
+
+        # Order the deltas by column, then snapshot, so each delta's volume holds until the next
+        # delta in the same column (or the end of the log).
+        order = np.lexsort((rows, cols))
+        rows, cols, vols = rows[order], cols[order], vols[order]
+
+        ends = np.full_like(rows, self.n)
+        same = cols[1:] == cols[:-1]
+        ends[:-1][same] = rows[1:][same]
+
+        keep = vols != 0
+        rows, ends, cols, vols = rows[keep], ends[keep], cols[keep], vols[keep]
+
+        # Output rows whose snapshot falls within [row, end) of each delta.
+        first = np.searchsorted(sel, rows, side='left')
+        last = np.searchsorted(sel, ends, side='left')
+        lengths = last - first
+
+        total = int(lengths.sum())
+        starts = np.cumsum(lengths) - lengths
+        out_rows = np.repeat(first - starts, lengths) + np.arange(total)
+
+        return index, quotes, out_rows, np.repeat(cols, lengths), np.repeat(vols, lengths)
+
+    def to_wide(self, times=None):
+        """ Returns the book as a sparse DataFrame indexed by QuoteTime with one column per quoted price
+            (volume negative for bids, positive for asks, 0 where there is no level).
+
+            With times=None there is one row per snapshot.  Otherwise there is one row per given time,
+            holding the book as of the latest snapshot at or before that time.
+        """
+        index, quotes, rows, cols, vols = self._expand(times)
+
+        S = coo_matrix((vols, (rows, cols)), shape=(len(index), len(quotes)), dtype=np.int64).tocsc()
+        df = pd.DataFrame.sparse.from_spmatrix(S, index=index, columns=quotes)
+        df.index.name = 'QuoteTime'
+
+        return df
+
+    def to_narrow(self, times=None, exclude=()):
+        """ As to_wide, but stacked: a 'Volume' column indexed by (time, quote), for all quotes except those
+            in exclude.  Only the non-zero levels have rows, so the size of the log follows the number of
+            levels actually quoted rather than times x quotes.  The index levels still hold every time and
+            every quote, so unstacking and reindexing on index.levels[0] restores the full book matrix.
+        """
+        index, quotes, rows, cols, vols = self._expand(times)
+
+        kept = ~np.isin(quotes, list(exclude))
+        remap = np.cumsum(kept) - 1
+
+        mask = kept[cols]
+        rows, cols, vols = rows[mask], remap[cols[mask]], vols[mask]
+        quotes = quotes[kept]
+
+        # Rows in (time, quote) order.
+        order = np.lexsort((cols, rows))
+        rows, cols, vols = rows[order], cols[order], vols[order]
+
+        if index.is_unique:
+            narrow_index = pd.MultiIndex(levels=[index, quotes], codes=[rows, cols], names=['time', 'quote'])
+        else:
+            narrow_index = pd.MultiIndex.from_arrays([index[rows], quotes[cols]], names=['time', 'quote'])
+
+        return pd.DataFrame({'Volume': vols}, index=narrow_index)
@@ -0,0 +1,193 @@
+# One side (bids or asks) of an OrderBook, indexed by price and by order id.
+#
+# Price levels are kept in a sorted list of price keys with the best price at the END of the
+# list (bids are keyed by price, asks by negated price), so the best level is found in O(1),
+# a level is located by bisection in O(log n), and removing the best level is a list pop.
+# Each price level is an OrderedDict of order_id -> LimitOrder (oldest first), which gives
+# FIFO matching and O(1) removal of any order.  A separate order_id -> price index lets
+# cancellations and modifications find their level without scanning the book, and an
+# agent_id -> order ids index finds all of one agent's orders (e.g. to cancel them all).
+#
+# The total quantity at each price level is kept up to date as orders come and go, and version
+# counts the changes made to this side, so readers can tell whether it changed since they last
+# looked without comparing its contents.  inside() uses both: the (price, volume) levels it builds
+# are cached per depth until the side next changes, so repeated queries of an idle book are free.
+#
+# If `changed` is set to a set (the OrderBook does this when the full book is being archived),
+# every price whose level is created, altered or removed is added to it, so a book log can
+# record only the levels that changed since its last snapshot.
+
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from itertools import islice
+import sys
+
+
+class BookSide:
+
+    def __init__(self, is_buy_order):
+        self.is_buy_order = is_buy_order
+
+        # Sorted price keys, best price last.
+        self._keys = []
+
+        # price -> OrderedDict(order_id -> order), oldest order first.
+        self._levels = {}
+
+        # order_id -> price of the level holding that order.
+        self._index = {}
+
+        # agent_id -> {order_id: None} for the orders of that agent on this side, oldest first.
+        self._agents = {}
+
+        # price -> total quantity of the orders at that level.
+        self._volumes = {}
+
+        # depth -> (version, [(price, volume)]) built by inside().
+        self._inside = {}
+
+        # Number of changes made to this side so far.
+        self.version = 0
+
+        # Prices whose level changed since the set was last cleared, or None when not tracked.
+        self.changed = None
+
+    def _key(self, price):
+        return price if self.is_buy_order else -price
+
+    def __len__(self):
+        # Number of price levels on this side.
+        return len(self._keys)
+
+    def __contains__(self, order_id):
+        return order_id in self._index
+
+    def best_price(self):
+        """ Returns the best price on this side, or None if the side is empty. """
+        if not self._keys: return None
+        return self._key(self._keys[-1])
+
+    def best_level(self):
+        """ Returns the OrderedDict of orders at the best price, or None if the side is empty. """
+        if not self._keys: return None
+        return self._levels[self._key(self._keys[-1])]
+
+    def best_order(self):
+        """ Returns the oldest order at the best price (the next to execute), or None. """
+        level = self.best_level()
+        if level is None: return None
+        return next(iter(level.values()))
+
+    def get(self, order_id):
+        """ Returns the resting order with this id, or None. """
+        price = self._index.get(order_id)
+        if price is None: return None
+        return self._levels[price][order_id]
+
+    def agent_orders(self, agent_id):
+        """ Returns a list of the resting orders of this agent, oldest first. """
+        return [self.get(order_id) for order_id in self._agents.get(agent_id, ())]
+
+    def price_of(self, order_id):
+        """ Returns the price level at which this order id rests, or None. """
+        return self._index.get(order_id)
+
+    def volume(self, price):
+        """ Returns the total quantity resting at this price, or None if there is no such level. """
+        return self._volumes.get(price)
+
+    def add(self, order):
+        """ Appends an order to the back of the queue at its limit price. """
+        price = order.limit_price
+        level = self._levels.get(price)
+
+        if level is None:
+            level = OrderedDict()
+            self._levels[price] = level
+            insort(self._keys, self._key(price))
+
+        level[order.order_id] = order
+        self._index[order.order_id] = price
+        self._agents.setdefault(order.agent_id, {})[order.order_id] = None
+        self._volumes[price] = self._volumes.get(price, 0) + order.quantity
+
+        self.version += 1
+        if self.changed is not None: self.changed.add(price)
+
+    def remove(self, order_id):
+        """ Removes and returns the resting order with this id, or None if it is not on this side. """
+        price = self._index.pop(order_id, None)
+        if price is None: return None
+
+        level = self._levels[price]
+        order = level.pop(order_id)
+        self._volumes[price] -= order.quantity
+
+        agent_orders = self._agents[order.agent_id]
+        del agent_orders[order_id]
+        if not agent_orders: del self._agents[order.agent_id]
+
+        # If the price level is now empty, remove it completely.
+        if not level:
+            del self._levels[price]
+            del self._volumes[price]
+            key = self._key(price)
+            if self._keys[-1] == key:
+                self._keys.pop()
+            else:
+                del self._keys[bisect_left(self._keys, key)]
+
+        self.version += 1
+        if self.changed is not None: self.changed.add(price)
+
+        return order
+
+    def reduce(self, order_id, quantity):
+        """ Reduces the quantity of a resting order in place (a partial fill), keeping its queue position. """
+        price = self._index[order_id]
+        self._levels[price][order_id].quantity -= quantity
+        self._volumes[price] -= quantity
+
+        self.version += 1
+        if self.changed is not None: self.changed.add(price)
+
+    def replace(self, order_id, new_order):
+        """ Replaces a resting order in place, keeping its position in the queue. """
+        price = self._index.get(order_id)
+        if price is None: return None
+
+        level = self._levels[price]
+        old_order = level[order_id]
+        level[order_id] = new_order
+        self._volumes[price] += new_order.quantity - old_order.quantity
+
+        self.version += 1
+        if self.changed is not None: self.changed.add(price)
+
+        return old_order
+
+    def levels(self, depth=sys.maxsize):
+        """ Yields (price, OrderedDict of orders) from the best price outward, up to depth levels. """
+        for key in islice(reversed(self._keys), depth):
+            price = self._key(key)
+            yield price, self._levels[price]
+
+    def inside(self, depth=sys.maxsize):
+        """ Returns a list of (price, total quantity) from the best price outward, up to depth levels.  The list is
+            shared with later callers until this side changes, so it must not be modified.
+        """
+        cached = self._inside.get(depth)
+        if cached is not None and cached[0] == self.version: return cached[1]
+
+        levels = []
+        for key in islice(reversed(self._keys), depth):
+            price = self._key(key)
+            levels.append((price, self._volumes[price]))
+
+        self._inside[depth] = (self.version, levels)
+        return levels
+
+    def orders(self):
+        """ Yields every resting order on this side, best price first and oldest first within a price. """
+        for _, level in self.levels():
+            yield from level.values()
@@ -0,0 +1,69 @@
+# Columnar, append-only event log used by agents (and the Kernel summary log).
+#
+# Agents used to keep their log as a list of dictionaries, deep-copying every event so that
+# later changes to a mutable object (e.g. the holdings dictionary) could not rewrite history.
+# Most logged events are scalars, strings or flat dictionaries of scalars (Order.to_dict(),
+# holdings), so the log instead keeps one Python list per column and copies an event only as
+# deeply as its type requires.  The lists are turned into a DataFrame once, at termination.
+
+from copy import deepcopy
+
+import numpy as np
+import pandas as pd
+
+
+# Types whose values can be stored in the log without copying.
+IMMUTABLE_TYPES = frozenset((type(None), bool, int, float, complex, str, bytes, tuple,
+                             np.int32, np.int64, np.float32, np.float64, np.bool_,
+                             pd.Timestamp, pd.Timedelta))
+
+
+def snapshot(event):
+    """ Returns a copy of event that later changes to the original cannot affect.
+
+        Immutable values are returned as they are, flat dictionaries of immutable values are
+        copied shallowly, and anything else falls back to deepcopy.  (Tuples are treated as
+        immutable; a tuple holding mutable objects should not be logged.)
+    """
+    t = type(event)
+    if t in IMMUTABLE_TYPES: return event
+
+    if t is dict:
+        for v in event.values():
+            if type(v) not in IMMUTABLE_TYPES: return deepcopy(event)
+        return event.copy()
+
+    return deepcopy(event)
+
+
+class EventLog:
+
+    def __init__(self, columns=('EventTime', 'EventType', 'Event'), index='EventTime'):
+        # Column names, in output order, and the column (if any) that becomes the DataFrame index.
+        self.columns = tuple(columns)
+        self.index = index
+
+        self.data = {c: [] for c in self.columns}
+
+        # Bound append methods of each column list, in column order.
+        self._appends = tuple(self.data[c].append for c in self.columns)
+
+    def __len__(self):
+        return len(self.data[self.columns[0]])
+
+    def append(self, *values):
+        """ Appends one row.  Values must be given in column order and are stored as they are:
+            callers are responsible for snapshotting mutable values.
+        """
+        if len(values) != len(self._appends):
+            raise ValueError("EventLog.append expected {} values, got {}".format(len(self._appends), len(values)),
+                             values)
+
+        for append, value in zip(self._appends, values):
+            append(value)
+
+    def to_dataframe(self):
+        """ Builds the log DataFrame in one pass over the column buffers. """
+        df = pd.DataFrame({c: self.data[c] for c in self.columns}, columns=list(self.columns))
+        if self.index is not None: df.set_index(self.index, inplace=True)
+        return df
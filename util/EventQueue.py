@@ -0,0 +1,181 @@
+# Event queue backends for the simulation Kernel.  The Kernel only needs a
+# priority queue of (delivery time, event) pairs, where an event is the tuple
+# (recipient, MessageType, msg).  Because the Kernel is single-threaded, there
+# is no need to pay for the locking done by queue.PriorityQueue, and because
+# every comparison between pd.Timestamp objects (and then Message objects on
+# ties) goes through Python-level __lt__ methods, ordering on plain integers
+# is far cheaper.
+#
+# All backends deliver events in the same order as the original Kernel queue:
+# by delivery time, then recipient agent id, then MessageType, then insertion
+# order (which replaces the Message.uniq comparison as the final tiebreak).
+
+import heapq
+import queue
+
+
+class HeapEventQueue:
+    """ Lock-free event queue built on heapq.  Entries are keyed on int64 nanoseconds
+        since the epoch with an explicit sequence number as the final tiebreak, so the
+        heap never needs to compare pd.Timestamp or Message objects.  Delivery times may
+        be pd.Timestamp or integer nanoseconds (Kernel ns_clock mode), and are handed
+        back unchanged by get().
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def put(self, deliverAt, event):
+        recipient, msg_type, _ = event
+        self._seq += 1
+        ns = getattr(deliverAt, 'value', deliverAt)
+        heapq.heappush(self._heap, (ns, recipient, msg_type.value, self._seq, deliverAt, event))
+
+    def get(self):
+        entry = heapq.heappop(self._heap)
+        return entry[4], entry[5]
+
+    def next_time(self):
+        """ Returns the delivery time of the next event without removing it. """
+        return self._heap[0][4]
+
+    def empty(self):
+        return not self._heap
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class PriorityEventQueue:
+    """ The original thread-safe queue.PriorityQueue of (pd.Timestamp, event) tuples.  Retained
+        for comparison and for any driver that feeds the Kernel from another thread.
+    """
+
+    def __init__(self):
+        self._queue = queue.PriorityQueue()
+
+    def put(self, deliverAt, event):
+        self._queue.put((deliverAt, event))
+
+    def get(self):
+        return self._queue.get()
+
+    def next_time(self):
+        """ Returns the delivery time of the next event without removing it. """
+        return self._queue.queue[0][0]
+
+    def empty(self):
+        return self._queue.empty()
+
+    def __len__(self):
+        return len(self._queue.queue)
+
+
+class CausalEventQueue:
+    """ The event queue of one logical process in a partitioned run (see util.PartitionedRun), which holds only the
+        events of the agents it owns.  Events for other agents are set aside in outbox for the coordinator to forward.
+
+        The heap backend breaks ties on (delivery time, recipient, MessageType) by global insertion order, which no
+        single process of a partitioned run knows.  This queue instead keys each event on the event whose handling
+        queued it (its parent) and its index among the parent's children.  A parent is keyed on its delivery time,
+        the largest (recipient, MessageType) popped by its process at that time so far, and its pop count in that
+        process.  Because no message crosses processes at zero latency, the sequential Kernel pops the events of one
+        time in the order of that prefix maximum (ties, within a process, in pop order), so these keys order events
+        exactly as the heap backend's insertion order would.
+    """
+
+    # Parent key of the events converted from another queue, ahead of every event popped since.
+    ROOT = (-1, -1, -1)
+
+    def __init__(self, local):
+        # local[agent_id] is True for the agents whose events this queue holds.
+        self._heap = []
+        self._local = local
+        self.outbox = []
+
+        self._ns = None
+        self._prefix_max = None
+        self._pops = 0
+
+        # Key of the event being handled and the number of events it has queued so far.
+        self.parent = self.ROOT + (0,)
+        self._children = 0
+
+    @classmethod
+    def from_heap(cls, queue, local):
+        """ Returns a queue of the events in a HeapEventQueue for the agents in local, keyed on their insertion order. """
+        q = cls(local)
+        for ns, recipient, msg_type, seq, deliverAt, event in queue._heap:
+            if local[recipient]: q._heap.append((ns, recipient, msg_type, cls.ROOT + (seq, 0), deliverAt, event))
+        heapq.heapify(q._heap)
+        return q
+
+    def put(self, deliverAt, event):
+        recipient, msg_type, _ = event
+        ns = getattr(deliverAt, 'value', deliverAt)
+        entry = (ns, recipient, msg_type.value, self.parent + (self._children,), deliverAt, event)
+        self._children += 1
+
+        if self._local[recipient]:
+            heapq.heappush(self._heap, entry)
+        else:
+            self.outbox.append(entry)
+
+    def put_entry(self, entry):
+        """ Queues an entry forwarded from another process's outbox, with the key it was given there. """
+        heapq.heappush(self._heap, entry)
+
+    def get(self):
+        entry = heapq.heappop(self._heap)
+        ns, recipient, msg_type = entry[0], entry[1], entry[2]
+
+        if ns != self._ns:
+            self._ns, self._prefix_max = ns, (recipient, msg_type)
+        elif (recipient, msg_type) > self._prefix_max:
+            self._prefix_max = (recipient, msg_type)
+
+        self._pops += 1
+        self.parent = (ns,) + self._prefix_max + (self._pops,)
+        self._children = 0
+
+        return entry[4], entry[5]
+
+    def head(self):
+        """ Returns (time in ns, recipient, MessageType value) of the next event, or None. """
+        return self._heap[0][:3] if self._heap else None
+
+    def entries(self):
+        """ Returns the queued entries in delivery order. """
+        return sorted(self._heap)
+
+    def next_time(self):
+        """ Returns the delivery time of the next event without removing it. """
+        return self._heap[0][4]
+
+    def empty(self):
+        return not self._heap
+
+    def __len__(self):
+        return len(self._heap)
+
+
+# Available event queue backends, selected by name when the Kernel is created.
+EVENT_QUEUES = {
+    'heap': HeapEventQueue,
+    'priority': PriorityEventQueue,
+}
+
+
+def make_event_queue(event_queue='heap'):
+    """ Returns a new event queue given a backend name from EVENT_QUEUES, or passes through an
+        already-constructed queue object exposing put/get/next_time/empty/__len__.
+    """
+    if not isinstance(event_queue, str):
+        return event_queue
+
+    if event_queue.lower() not in EVENT_QUEUES:
+        raise ValueError("Unknown event queue backend requested", event_queue,
+                         "Available backends:", list(EVENT_QUEUES))
+
+    return EVENT_QUEUES[event_queue.lower()]()
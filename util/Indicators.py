@@ -0,0 +1,226 @@
+# Streaming technical indicators for trading agents.
+#
+# Agents such as MomentumAgent used to append every observed mid price to a list and recompute
+# their moving averages over the whole list (np.cumsum, pd.Series.ewm) at every wakeup, so each
+# wakeup cost time proportional to the number of wakeups so far, and the list grew all day.  The
+# indicators here are updated with one observation at a time in O(1) time and hold at most a
+# fixed-size window of observations:
+#
+#   SimpleMovingAverage       mean of the last n observations
+#   ExponentialMovingAverage  as pd.Series.ewm(span=...).mean(), adjusted or not
+#   RollingVariance           variance (and standard deviation) of the last n observations
+#   Crossover                 sign changes of the difference between two series
+#
+# Each indicator counts the observations it has seen, so agents can keep warm-up rules such as
+# "only trade once more than 50 prices have been observed".  value is None until the first one.
+
+import math
+
+import numpy as np
+
+
+class RingBuffer:
+    """ Fixed-size buffer of the last size floats appended to it. """
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError("RingBuffer size must be at least 1", size)
+
+        self.values = np.zeros(size, dtype=np.float64)
+        self.size = size
+        self.start = 0
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def full(self):
+        return self.n == self.size
+
+    def append(self, x):
+        """ Appends x and returns the value it evicted, or None while the buffer is not yet full. """
+        if self.n < self.size:
+            self.values[(self.start + self.n) % self.size] = x
+            self.n += 1
+            return None
+
+        evicted = self.values[self.start]
+        self.values[self.start] = x
+        self.start = (self.start + 1) % self.size
+        return float(evicted)
+
+    def last(self):
+        if self.n == 0: return None
+        return float(self.values[(self.start + self.n - 1) % self.size])
+
+    def to_array(self):
+        """ Returns the buffered values, oldest first. """
+        return np.roll(self.values, -self.start)[:self.n]
+
+
+class SimpleMovingAverage:
+    """ Mean of the last n observations (of all of them, until there are n). """
+
+    def __init__(self, n):
+        self.n = n
+        self.window = RingBuffer(n)
+        self.count = 0
+        self.sum = 0.0
+        self.value = None
+
+        # Updates since the running sum was last recomputed from the window.
+        self.stale = 0
+
+    def ready(self):
+        """ True once a full window of n observations has been seen. """
+        return self.count >= self.n
+
+    def update(self, x):
+        """ Adds observation x and returns the new average. """
+        evicted = self.window.append(x)
+        self.count += 1
+
+        if evicted is None:
+            self.sum += x
+        else:
+            self.sum += x - evicted
+            self.stale += 1
+
+            # Adding and subtracting accumulates rounding error, so refresh the sum exactly
+            # once per window: still O(1) per update on average.
+            if self.stale >= self.n:
+                self.sum = math.fsum(self.window.values)
+                self.stale = 0
+
+        self.value = self.sum / len(self.window)
+        return self.value
+
+
+class ExponentialMovingAverage:
+    """ Exponentially weighted mean, matching pd.Series.ewm(...).mean() on the same observations.
+
+        The decay is given as exactly one of span (alpha = 2 / (span + 1)) or alpha.  With adjust=True (the pandas
+        default), the mean is sum((1 - alpha)^i * x[t-i]) / sum((1 - alpha)^i) over every observation so far; with
+        adjust=False it is the recursive mean starting from the first observation.
+    """
+
+    def __init__(self, span=None, alpha=None, adjust=True):
+        if (span is None) == (alpha is None):
+            raise ValueError("ExponentialMovingAverage requires exactly one of span and alpha", span, alpha)
+        if span is not None:
+            if span < 1: raise ValueError("ExponentialMovingAverage span must be at least 1", span)
+            alpha = 2.0 / (span + 1.0)
+        elif not 0 < alpha <= 1:
+            raise ValueError("ExponentialMovingAverage alpha must be in (0, 1]", alpha)
+
+        self.alpha = alpha
+        self.adjust = adjust
+        self.count = 0
+        self.value = None
+
+        # Weighted sum of the observations and the sum of their weights, for adjust=True.
+        self.numerator = 0.0
+        self.denominator = 0.0
+
+    def update(self, x):
+        """ Adds observation x and returns the new average. """
+        self.count += 1
+        decay = 1.0 - self.alpha
+
+        if self.adjust:
+            self.numerator = x + decay * self.numerator
+            self.denominator = 1.0 + decay * self.denominator
+            self.value = self.numerator / self.denominator
+        elif self.value is None:
+            self.value = float(x)
+        else:
+            self.value = decay * self.value + self.alpha * x
+
+        return self.value
+
+
+class RollingVariance:
+    """ Variance of the last n observations (of all of them, until there are n), with ddof degrees of freedom
+        removed as in pd.Series.rolling(n).var(ddof=ddof).  value is None until there are more than ddof.
+    """
+
+    def __init__(self, n, ddof=1):
+        self.n = n
+        self.ddof = ddof
+        self.window = RingBuffer(n)
+        self.count = 0
+        self.value = None
+
+        # Welford's running mean and sum of squared deviations of the window.
+        self.mean = 0.0
+        self.m2 = 0.0
+
+        # Updates since the mean and m2 were last recomputed from the window.
+        self.stale = 0
+
+    def ready(self):
+        """ True once a full window of n observations has been seen. """
+        return self.count >= self.n
+
+    def update(self, x):
+        """ Adds observation x and returns the new variance. """
+        evicted = self.window.append(x)
+        self.count += 1
+        k = len(self.window)
+
+        if evicted is None:
+            delta = x - self.mean
+            self.mean += delta / k
+            self.m2 += delta * (x - self.mean)
+        else:
+            # Replace the evicted observation with x in one step.
+            old_mean = self.mean
+            self.mean += (x - evicted) / k
+            self.m2 += (x - evicted) * (x - self.mean + evicted - old_mean)
+            self.stale += 1
+
+            # As for SimpleMovingAverage, refresh both exactly once per window so that rounding
+            # error does not accumulate over a long run.
+            if self.stale >= self.n:
+                values = self.window.values
+                self.mean = math.fsum(values) / k
+                self.m2 = math.fsum((values - self.mean) ** 2)
+                self.stale = 0
+
+        # Rounding can leave a tiny negative sum for a constant window.
+        self.m2 = max(self.m2, 0.0)
+
+        self.value = self.m2 / (k - self.ddof) if k > self.ddof else None
+        return self.value
+
+    def std(self):
+        return None if self.value is None else math.sqrt(self.value)
+
+
+class Crossover:
+    """ Tracks the sign of fast - slow for two series, such as a short and a long moving average. """
+
+    def __init__(self):
+        self.sign = 0
+
+    def update(self, fast, slow):
+        """ Returns 1 when fast has crossed above slow since the last update, -1 when it has crossed below, and
+            0 otherwise (including the first update and while either value is None).
+        """
+        if fast is None or slow is None: return 0
+
+        sign = (fast > slow) - (fast < slow)
+        crossed = 0
+        if self.sign != 0 and sign != 0 and sign != self.sign:
+            crossed = sign
+
+        # Touching (sign 0) keeps the previous side, so a touch and bounce is not a cross.
+        if sign != 0: self.sign = sign
+        return crossed
+
+
+def moving_average(a, n=20):
+    """ Returns the n-observation simple moving averages of the whole array a (len(a) - n + 1 of them). """
+    ret = np.cumsum(a, dtype=float)
+    ret[n:] = ret[n:] - ret[:-n]
+    return ret[n - 1:] / n
@@ -0,0 +1,387 @@
+# Pluggable storage backends for the logs written by Kernel.writeLog and Kernel.writeSummaryLog.
+#
+# 'bz2' (the default) keeps the original format: one bz2-compressed pickled DataFrame per agent.
+# bz2 compression is slow to write and to read, and thousands of small per-agent files are slow
+# to list and open, so two columnar backends are also available:
+#
+#   'parquet'  Parquet files with a fast codec (zstd by default).
+#   'arrow'    Arrow IPC (Feather v2) files with lz4 by default; these can be memory-mapped.
+#
+# The columnar sinks batch the logs of all agents of the same type into one file per type
+# (e.g. ZeroIntelligenceAgent.parquet), with an extra 'Agent' column holding the agent name,
+# and write them when the sink is closed at the end of the simulation.  Logs written under an
+# explicit filename (the order book log, the oracle fundamental series, the summary log) get a
+# file of their own.  Use read_log() to load any of these formats, optionally restricted to
+# some columns, a time range and a set of agents.  read_log() also accepts the path a log has in
+# the bz2 format (e.g. log_dir/EXCHANGE_AGENT.bz2) and finds it in whatever format was written,
+# so analysis scripts need not know the format.
+#
+# Any sink can serialize and compress in a bounded pool of writer threads (writers > 0).  Agents
+# then only hand their finished DataFrames to the sink, and simulation teardown waits for the
+# pool to drain in close().  bz2, zstd and lz4 compression and Arrow file writes release the GIL,
+# so threads overlap the expensive part of each write without copying frames to other processes.
+# Files are identical to those written serially.
+#
+# The columnar backends require pyarrow, which is an optional dependency.
+
+import json
+import os
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+
+# Schema metadata keys used to round-trip DataFrames through Arrow.
+INDEX_KEY = b'abides.index'
+PICKLED_KEY = b'abides.pickled'
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The 'parquet' and 'arrow' log formats require pyarrow (pip install pyarrow).") from e
+    return pyarrow
+
+
+class LogSink:
+    """ Base class for log sinks.  Handles the optional pool of writer threads. """
+
+    extension = None
+
+    def __init__(self, writers=0):
+        # With writers == 0, every write happens immediately in the calling thread.
+        self.writers = writers
+        self.pool = None
+        self.futures = []
+
+        # At most this many writes may be queued or running at once.  A caller that gets
+        # ahead of the pool blocks, which bounds the memory held by pending DataFrames.
+        self.slots = threading.BoundedSemaphore(2 * writers) if writers > 0 else None
+
+    def write(self, path, name, df, group=None):
+        """ Writes df as path/name.  group (the agent type) may be used by sinks that batch logs. """
+        raise NotImplementedError
+
+    def __getstate__(self):
+        # A sink is pickled with its simulation (see Kernel.saveCheckpoint) once drained, without its
+        # writer threads, which are started again when next needed.
+        state = self.__dict__.copy()
+        state.update(pool=None, futures=[], slots=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.slots = threading.BoundedSemaphore(2 * self.writers) if self.writers > 0 else None
+
+    def close(self):
+        """ Finishes all pending writes, raising the first error any of them encountered. """
+        self.drain()
+
+    def submit(self, fn, *args):
+        # Runs fn(*args) in the writer pool, or immediately if there is none.
+        if self.slots is None:
+            fn(*args)
+            return
+
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.writers, thread_name_prefix='LogWriter')
+
+        self.slots.acquire()
+        future = self.pool.submit(fn, *args)
+        future.add_done_callback(lambda f: self.slots.release())
+        self.futures.append(future)
+
+    def drain(self):
+        # Waits for the writer pool to finish everything submitted so far.
+        futures, self.futures = self.futures, []
+        errors = [f.exception() for f in futures]
+
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+        for e in errors:
+            if e is not None: raise e
+
+
+class PickleLogSink(LogSink):
+    """ One bz2-compressed pickled DataFrame per log: the original ABIDES log format. """
+
+    extension = '.bz2'
+
+    def write(self, path, name, df, group=None):
+        os.makedirs(path, exist_ok=True)
+
+        self.submit(df.to_pickle, os.path.join(path, name + self.extension), 'bz2')
+
+
+class ColumnarLogSink(LogSink):
+    """ Base class for the Arrow-based sinks.  Subclasses implement _write_table. """
+
+    def __init__(self, compression, writers=0):
+        super().__init__(writers)
+
+        self.pa = _pyarrow()
+        self.compression = compression
+
+        # (path, group) -> list of DataFrames waiting to be written at close().  Batching
+        # happens in the calling thread so that rows keep the order in which agents wrote them.
+        self.groups = {}
+
+    def __getstate__(self):
+        # The pyarrow module cannot be pickled: it is imported again when the sink is unpickled.
+        state = super().__getstate__()
+        del state['pa']
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.pa = _pyarrow()
+
+    def write(self, path, name, df, group=None):
+        """ Writes df as path/name, or batches it into path/group if a group (agent type) is given. """
+        if group is None or not self._representable(df):
+            self.submit(self._write_frame, path, name, df)
+            return
+
+        self.groups.setdefault((path, group), []).append(df.assign(Agent=name))
+
+    def close(self):
+        """ Writes the batched per-group files and waits for all writes to finish. """
+        for (path, group), frames in self.groups.items():
+            self.submit(self._write_frame, path, group, pd.concat(frames) if len(frames) > 1 else frames[0])
+
+        self.groups = {}
+
+        super().close()
+
+    def _representable(self, df):
+        # Arrow requires string column names and has no sparse column type.
+        return all(isinstance(c, str) for c in df.columns) and \
+               not any(isinstance(dtype, pd.SparseDtype) for dtype in df.dtypes)
+
+    def _write_frame(self, path, name, df):
+        os.makedirs(path, exist_ok=True)
+
+        # Frames Arrow cannot represent are written in the original format instead.
+        if not self._representable(df):
+            df.to_pickle(os.path.join(path, name + PickleLogSink.extension), compression='bz2')
+            return
+
+        self._write_table(os.path.join(path, name + self.extension), self._to_table(df))
+
+    def _to_table(self, df):
+        pa = self.pa
+
+        # A named index (e.g. EventTime) is stored as an ordinary column, so readers can
+        # select and filter on it, and restored by read_log.
+        index = df.index.name
+        df = df.reset_index() if index is not None else df.reset_index(drop=True)
+
+        # Arbitrary Python objects (order dicts, depth lists, mixtures of strings and numbers in
+        # the Event column) have no Arrow type.  Such columns are stored as pickled bytes and
+        # decoded by read_log.
+        pickled = []
+        for c in df.columns:
+            if df[c].dtype != object: continue
+            values = df[c]
+            if all(v is None or isinstance(v, str) for v in values): continue
+            df[c] = [pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL) for v in values]
+            pickled.append(c)
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[INDEX_KEY] = json.dumps(index).encode()
+        metadata[PICKLED_KEY] = json.dumps(pickled).encode()
+
+        return table.replace_schema_metadata(metadata)
+
+    def _write_table(self, file, table):
+        raise NotImplementedError
+
+
+class ParquetLogSink(ColumnarLogSink):
+    """ Parquet files, zstd-compressed by default. """
+
+    extension = '.parquet'
+
+    def __init__(self, compression='zstd', writers=0):
+        super().__init__(compression, writers)
+
+    def _write_table(self, file, table):
+        self.pa.parquet.write_table(table, file, compression=self.compression)
+
+
+class ArrowLogSink(ColumnarLogSink):
+    """ Arrow IPC (Feather v2) files, lz4-compressed by default. """
+
+    extension = '.arrow'
+
+    def __init__(self, compression='lz4', writers=0):
+        super().__init__(compression, writers)
+
+    def _write_table(self, file, table):
+        options = self.pa.ipc.IpcWriteOptions(compression=self.compression)
+        with self.pa.OSFile(file, 'wb') as sink:
+            with self.pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+
+
+# Supported log formats by name.
+LOG_SINKS = {
+    'bz2': PickleLogSink,
+    'parquet': ParquetLogSink,
+    'arrow': ArrowLogSink,
+}
+
+
+def make_log_sink(log_format='bz2', writers=0):
+    """ Returns a log sink given either a format name from LOG_SINKS or an already constructed sink.
+        writers is the size of the writer thread pool for a named format (0 writes serially).
+    """
+    if not isinstance(log_format, str): return log_format
+
+    if log_format not in LOG_SINKS:
+        raise ValueError("Unknown log format. Supported formats: {}".format(", ".join(LOG_SINKS)), log_format)
+
+    return LOG_SINKS[log_format](writers=writers)
+
+
+def find_log(file):
+    """ Finds the log that file names in any format: file itself if it exists, else the file of the same
+        name with another format's extension, else the per-type columnar file holding the rows of the agent
+        so named.  Returns (path, agent), where agent is the agent whose rows to select from a per-type file,
+        or None.  Raises FileNotFoundError if there is no such log.
+    """
+    if os.path.exists(file): return file, None
+
+    base, extension = os.path.splitext(file)
+    if extension not in [sink.extension for sink in LOG_SINKS.values()]: base = file
+
+    for sink in LOG_SINKS.values():
+        if os.path.exists(base + sink.extension): return base + sink.extension, None
+
+    directory, name = os.path.split(base)
+    if os.path.isdir(directory or '.'):
+        for candidate in sorted(os.listdir(directory or '.')):
+            if not candidate.endswith((ParquetLogSink.extension, ArrowLogSink.extension)): continue
+            path = os.path.join(directory, candidate)
+            if name in _agent_names(path): return path, name
+
+    raise FileNotFoundError("No log found in any format", file)
+
+
+def _agent_names(file):
+    # The agents with rows in a per-type columnar file (none for a file of a single log).
+    pa = _pyarrow()
+
+    if file.endswith('.parquet'):
+        if 'Agent' not in pa.parquet.read_schema(file).names: return set()
+        column = pa.parquet.read_table(file, columns=['Agent'])['Agent']
+    else:
+        table = pa.ipc.open_file(pa.memory_map(file, 'r')).read_all()
+        if 'Agent' not in table.schema.names: return set()
+        column = table['Agent']
+
+    return set(pa.compute.unique(column).to_pylist())
+
+
+def read_log(file, columns=None, start=None, end=None, agents=None, time_column='EventTime'):
+    """ Reads a log written by any of the sinks above and returns a DataFrame.
+
+        columns limits the columns loaded (the EventTime index and the Agent column of a per-type
+        file are always included), start and end (inclusive) limit the rows to a range of
+        time_column, and agents limits the rows of a per-type file to the given agent names.
+        For Parquet and Arrow files only the requested columns are read from disk; bz2 pickles
+        must be loaded whole and are filtered afterwards.  Raises KeyError for unknown columns.
+
+        file may also be the path of a log in another format (see find_log), e.g. an agent's bz2
+        path when its rows were batched into a per-type file; its rows are then returned without
+        the Agent column, as the bz2 log would have them.
+    """
+    file, agent = find_log(file)
+    if agent is not None:
+        df = read_log(file, columns, start, end, [agent], time_column)
+        return df.drop(columns='Agent')
+
+    if file.endswith('.parquet') or file.endswith('.arrow'):
+        return _read_columnar(file, columns, start, end, agents, time_column)
+
+    df = pd.read_pickle(file, compression='bz2' if file.endswith('.bz2') else 'infer')
+
+    if agents is not None and 'Agent' in df.columns:
+        df = df[df['Agent'].isin(agents)]
+
+    if start is not None or end is not None:
+        times = df.index if df.index.name == time_column else df[time_column]
+        mask = pd.Series(True, index=df.index)
+        if start is not None: mask &= (times >= pd.Timestamp(start))
+        if end is not None: mask &= (times <= pd.Timestamp(end))
+        df = df[mask.values]
+
+    if columns is not None:
+        columns = [c for c in columns if c != df.index.name]
+        if 'Agent' in df.columns and 'Agent' not in columns: columns.append('Agent')
+        df = df[columns]
+
+    return df
+
+
+def _read_columnar(file, columns, start, end, agents, time_column):
+    pa = _pyarrow()
+    pc = pa.compute
+
+    if file.endswith('.parquet'):
+        schema = pa.parquet.read_schema(file)
+    else:
+        reader = pa.ipc.open_file(pa.memory_map(file, 'r'))
+        schema = reader.schema
+
+    metadata = schema.metadata or {}
+    index = json.loads(metadata.get(INDEX_KEY, b'null'))
+    pickled = json.loads(metadata.get(PICKLED_KEY, b'[]'))
+
+    # Columns to load: those requested, plus the index and any column filtered on.
+    load = None
+    if columns is not None:
+        load = [c for c in columns if c != index]
+        missing = [c for c in load if c not in schema.names]
+        if missing: raise KeyError("Columns not found in log", file, missing)
+
+        for c in (index, time_column if start is not None or end is not None else None, 'Agent'):
+            if c is not None and c in schema.names and c not in load: load.append(c)
+
+    filters = []
+    if start is not None: filters.append((time_column, '>=', pd.Timestamp(start)))
+    if end is not None: filters.append((time_column, '<=', pd.Timestamp(end)))
+    if agents is not None: filters.append(('Agent', 'in', list(agents)))
+
+    if file.endswith('.parquet'):
+        table = pa.parquet.read_table(file, columns=load, filters=filters or None)
+    else:
+        table = reader.read_all()
+        if load is not None: table = table.select(load)
+        for column, op, value in filters:
+            if op == 'in': mask = pc.is_in(table[column], value_set=pa.array(value))
+            else: mask = {'>=': pc.greater_equal, '<=': pc.less_equal}[op](table[column], pa.scalar(value, table[column].type))
+            table = table.filter(mask)
+
+    df = table.to_pandas()
+
+    for c in pickled:
+        if c in df.columns: df[c] = [pickle.loads(v) for v in df[c]]
+
+    if index is not None and index in df.columns: df.set_index(index, inplace=True)
+
+    if columns is not None:
+        columns = [c for c in columns if c != index]
+        if 'Agent' in df.columns and 'Agent' not in columns: columns.append('Agent')
+        df = df[columns]
+
+    return df
@@ -0,0 +1,112 @@
+# Microstructure features of one order book, maintained by the exchange for subscribing agents.
+#
+# Many agents derive the same few numbers from their own copies of the order book: the mid
+# price, the spread, the imbalance of liquidity near the inside, and so on.  Each of them had
+# to subscribe to (and the exchange had to build and send) L2 depth after every order just to
+# compute these.  Instead, agents may subscribe to a feature stream (see
+# TradingAgent.requestDataSubscription), and the exchange keeps one MarketFeatures per symbol:
+#
+#   bid, ask     best bid and ask prices (int cents)
+#   mid          mean of the best bid and ask
+#   spread       ask - bid
+#   imbalance    bid share of the liquidity in the first `depth` levels of both sides, in [0, 1]
+#   microprice   mid weighted by the size at the inside: bid * ask_size + ask * bid_size over the total size
+#   vwap         volume-weighted average trade price over the trailing `vwap_window`
+#   volatility   realized volatility: root sum of squared log mid returns over the last `volatility_window`
+#                changes of the mid price
+#
+# update() is called once after every book update and costs O(1).  Other features are computed
+# only when some subscriber is sent them, at most once per update however many subscribers
+# receive them.  A feature that cannot be computed (e.g. the mid of a one-sided book) is None.
+
+import math
+
+import pandas as pd
+
+from util.Indicators import SimpleMovingAverage
+
+
+class MarketFeatures:
+
+    FEATURES = ('bid', 'ask', 'mid', 'spread', 'imbalance', 'microprice', 'vwap', 'volatility')
+
+    def __init__(self, book, depth=10, vwap_window='1min', volatility_window=100):
+        self.book = book
+        self.depth = depth
+        self.vwap_window = pd.to_timedelta(vwap_window)
+
+        # Squared log returns of the mid price, over its last volatility_window changes.
+        self.squared_returns = SimpleMovingAverage(volatility_window)
+        self.last_mid = None
+
+        # Incremented by every update.  Computed features are cached for the current version only.
+        self.version = 0
+        self.time = None
+        self.cache = {}
+
+    @staticmethod
+    def check(names):
+        """ Raises ValueError if any of names is not a known feature. """
+        unknown = [name for name in names if name not in MarketFeatures.FEATURES]
+        if unknown:
+            raise ValueError("Unknown market features. Supported features: {}".format(", ".join(MarketFeatures.FEATURES)),
+                             unknown)
+
+    def update(self, time):
+        """ Notes that the book may have changed at time. """
+        self.version += 1
+        self.time = time
+        self.cache = {}
+
+        mid = self._mid()
+        if mid is not None and self.last_mid is not None and mid != self.last_mid:
+            self.squared_returns.update(math.log(mid / self.last_mid) ** 2)
+        if mid is not None:
+            self.last_mid = mid
+
+    def values(self, names):
+        """ Returns a dictionary of the current value of each feature in names. """
+        values = {}
+        for name in names:
+            if name not in self.cache:
+                self.cache[name] = getattr(self, '_' + name)()
+            values[name] = self.cache[name]
+
+        return values
+
+    def _bid(self):
+        return self.book.bids.best_price()
+
+    def _ask(self):
+        return self.book.asks.best_price()
+
+    def _mid(self):
+        bid, ask = self._bid(), self._ask()
+        if bid is None or ask is None: return None
+        return (bid + ask) / 2
+
+    def _spread(self):
+        bid, ask = self._bid(), self._ask()
+        if bid is None or ask is None: return None
+        return ask - bid
+
+    def _imbalance(self):
+        bid_liq = sum([size for _, size in self.book.getInsideBids(self.depth)])
+        ask_liq = sum([size for _, size in self.book.getInsideAsks(self.depth)])
+        if bid_liq + ask_liq == 0: return None
+        return bid_liq / (bid_liq + ask_liq)
+
+    def _microprice(self):
+        bid, ask = self._bid(), self._ask()
+        if bid is None or ask is None: return None
+        bid_size = self.book.bids.volume(bid)
+        ask_size = self.book.asks.volume(ask)
+        return (bid * ask_size + ask * bid_size) / (bid_size + ask_size)
+
+    def _vwap(self):
+        if self.time is None: return None
+        return self.book.ledger.vwap_since(self.time - self.vwap_window)
+
+    def _volatility(self):
+        if self.squared_returns.count == 0: return None
+        return math.sqrt(max(self.squared_returns.sum, 0.0))
@@ -1,18 +1,17 @@
 # Basic class for an order book for one symbol, in the style of the major US Stock Exchanges.
-# List of bid prices (index zero is best bid), each with a list of LimitOrders.
-# List of ask prices (index zero is best ask), each with a list of LimitOrders.
+# Bids and asks are each a BookSide: price levels sorted best-first, each holding its
+# LimitOrders oldest-first, plus an order_id index for O(1) cancel and modify.
 import sys
 
 from message.Message import Message
+from util.BookLog import BookLog
+from util.BookSide import BookSide
+from util.OrderHistory import OrderHistory
+from util.TradeLedger import TradeLedger
 from util.order.LimitOrder import LimitOrder
 from util.util import log_print, be_silent
 
-from copy import deepcopy
 import pandas as pd
-from pandas.io.json import json_normalize
-from functools import reduce
-from scipy.sparse import dok_matrix
-from tqdm import tqdm
 
 
 class OrderBook:
@@ -23,21 +22,28 @@ class OrderBook:
     def __init__(self, owner, symbol):
         self.owner = owner
         self.symbol = symbol
-        self.bids = []
-        self.asks = []
+        self.bids = BookSide(is_buy_order=True)
+        self.asks = BookSide(is_buy_order=False)
         self.last_trade = None
 
-        # Create an empty list of dictionaries to log the full order book depth (price and volume) each time it changes.
-        self.book_log = []
-        self.quotes_seen = set()
+        # Log the full order book depth (price and volume) each time it changes, as level deltas.  The
+        # book sides track which price levels changed between snapshots only when the log is needed.
+        self.book_log = BookLog()
+        if self.owner.book_freq is not None:
+            self.bids.changed = set()
+            self.asks.changed = set()
 
-        # Create an order history for the exchange to report to certain agent types.
-        self.history = [{}]
+        # Create an order history for the exchange to report to certain agent types.  It retains
+        # all orders leading to the last owner.stream_history trades.
+        self.history = OrderHistory(self.owner.stream_history)
 
         # Last timestamp the orderbook for that symbol was updated
         self.last_update_ts = None
 
-        # Internal variable used for computing transacted volumes
+        # Time-ordered ledger of every execution, used to answer transacted volume queries.
+        self.ledger = TradeLedger()
+
+        # Internal variable used for computing transacted volumes the legacy way (see get_transacted_volume).
         self._transacted_volume = {
             "unrolled_transactions": None,
             "self.history_previous_length": 0
@@ -48,6 +54,10 @@ class OrderBook:
         # consuming all possible shares at the best price before moving on, without regard to
         # order size "fit" or minimizing number of transactions.  Sends one notification per
         # match.
+
+        # The order passed in belongs to the book from here on: it is mutated as it fills and,
+        # if not fully executed, rests in the book itself.  Notifications therefore carry
+        # lightweight clones (Order.clone) that later book activity cannot alter.
         if order.symbol != self.symbol:
             log_print("{} order discarded.  Does not match OrderBook symbol: {}", order.symbol, self.symbol)
             return
@@ -57,11 +67,11 @@ class OrderBook:
             return
 
         # Add the order under index 0 of history: orders since the most recent trade.
-        self.history[0][order.order_id] = {'entry_time': self.owner.currentTime,
-                                           'quantity': order.quantity, 'is_buy_order': order.is_buy_order,
-                                           'limit_price': order.limit_price, 'transactions': [],
-                                           'modifications': [],
-                                           'cancellations': []}
+        self.history.add(order.order_id, {'entry_time': self.owner.currentTime,
+                                          'quantity': order.quantity, 'is_buy_order': order.is_buy_order,
+                                          'limit_price': order.limit_price, 'transactions': [],
+                                          'modifications': [],
+                                          'cancellations': []})
 
         matching = True
 
@@ -70,13 +80,12 @@ class OrderBook:
         executed = []
 
         while matching:
-            matched_order = deepcopy(self.executeOrder(order))
+            # The matched order is no longer referenced by the book, so it needs no copy.
+            matched_order = self.executeOrder(order)
 
             if matched_order:
                 # Decrement quantity on new order and notify traders of execution.
-                filled_order = deepcopy(order)
-                filled_order.quantity = matched_order.quantity
-                filled_order.fill_price = matched_order.fill_price
+                filled_order = order.clone(quantity=matched_order.quantity, fill_price=matched_order.fill_price)
 
                 order.quantity -= filled_order.quantity
 
@@ -90,19 +99,20 @@ class OrderBook:
 
                 # Accumulate the volume and average share price of the currently executing inbound trade.
                 executed.append((filled_order.quantity, filled_order.fill_price))
+                self.ledger.record(self.owner.currentTime, filled_order.quantity, filled_order.fill_price)
 
                 if order.quantity <= 0:
                     matching = False
 
             else:
                 # No matching order was found, so the new order enters the order book.  Notify the agent.
-                self.enterOrder(deepcopy(order))
+                self.enterOrder(order)
 
                 log_print("ACCEPTED: new order {}", order)
                 log_print("SENT: notifications of order acceptance to agent {} for order {}",
                           order.agent_id, order.order_id)
 
-                self.owner.sendMessage(order.agent_id, Message({"msg": "ORDER_ACCEPTED", "order": order}))
+                self.owner.sendMessage(order.agent_id, Message({"msg": "ORDER_ACCEPTED", "order": order.clone()}))
 
                 matching = False
 
@@ -110,13 +120,13 @@ class OrderBook:
             # Now that we are done executing or accepting this order, log the new best bid and ask.
             if self.bids:
                 self.owner.logEvent('BEST_BID', "{},{},{}".format(self.symbol,
-                                                                  self.bids[0][0].limit_price,
-                                                                  sum([o.quantity for o in self.bids[0]])))
+                                                                  self.bids.best_price(),
+                                                                  self.bids.volume(self.bids.best_price())))
 
             if self.asks:
                 self.owner.logEvent('BEST_ASK', "{},{},{}".format(self.symbol,
-                                                                  self.asks[0][0].limit_price,
-                                                                  sum([o.quantity for o in self.asks[0]])))
+                                                                  self.asks.best_price(),
+                                                                  self.asks.volume(self.asks.best_price())))
 
             # Also log the last trade (total share quantity, average share price).
             if executed:
@@ -133,27 +143,14 @@ class OrderBook:
 
                 self.last_trade = avg_price
 
-                # Transaction occurred, so advance indices.
-                self.history.insert(0, {})
-
-                # Truncate history to required length.
-                self.history = self.history[:self.owner.stream_history + 1]
+                # Transaction occurred, so advance indices.  The oldest entry falls off the end
+                # of the bounded history.
+                self.history.advance()
 
             # Finally, log the full depth of the order book, ONLY if we have been requested to store the order book
             # for later visualization.  (This is slow.)
             if self.owner.book_freq is not None:
-                row = {'QuoteTime': self.owner.currentTime}
-                for quote, volume in self.getInsideBids():
-                    row[quote] = -volume
-                    self.quotes_seen.add(quote)
-                for quote, volume in self.getInsideAsks():
-                    if quote in row:
-                        if row[quote] is not None:
-                            print(
-                                "WARNING: THIS IS A REAL PROBLEM: an order book contains bids and asks at the same quote price!")
-                    row[quote] = volume
-                    self.quotes_seen.add(quote)
-                self.book_log.append(row)
+                self.book_log.record(self.owner.currentTime, self.bids, self.asks)
         self.last_update_ts = self.owner.currentTime
         self.prettyPrint()
 
@@ -191,7 +188,8 @@ class OrderBook:
         # Finds a single best match for this order, without regard for quantity.
         # Returns the matched order or None if no match found.  DOES remove,
         # or decrement quantity from, the matched order from the order book
-        # (i.e. executes at least a partial trade, if possible).
+        # (i.e. executes at least a partial trade, if possible).  The returned
+        # order is never an object still resting in the book.
 
         # Track which (if any) existing order was matched with the current order.
         if order.is_buy_order:
@@ -203,10 +201,12 @@ class OrderBook:
         # other than the best bid or best ask?  We may not need these execute loops.
 
         # First, examine the correct side of the order book for a match.
-        if not book:
+        best_order = book.best_order()
+
+        if best_order is None:
             # No orders on this side.
             return None
-        elif not self.isMatch(order, book[0][0]):
+        elif not self.isMatch(order, best_order):
             # There were orders on the right side, but the prices do not overlap.
             # Or: bid could not match with best ask, or vice versa.
             # Or: bid offer is below the lowest asking price, or vice versa.
@@ -216,23 +216,16 @@ class OrderBook:
             # somewhere within them.  We can/will only match against the oldest order
             # among those with the best price.  (i.e. best price, then FIFO)
 
-            # Note that book[i] is a LIST of all orders (oldest at index book[i][0]) at the same price.
-
             # The matched order might be only partially filled. (i.e. new order is smaller)
-            if order.quantity >= book[0][0].quantity:
-                # Consumed entire matched order.
-                matched_order = book[0].pop(0)
-
-                # If the matched price now has no orders, remove it completely.
-                if not book[0]:
-                    del book[0]
+            if order.quantity >= best_order.quantity:
+                # Consumed entire matched order.  BookSide removes the price level if it is now empty.
+                matched_order = book.remove(best_order.order_id)
 
             else:
                 # Consumed only part of matched order.
-                matched_order = deepcopy(book[0][0])
-                matched_order.quantity = order.quantity
+                matched_order = best_order.clone(quantity=order.quantity)
 
-                book[0][0].quantity -= matched_order.quantity
+                book.reduce(best_order.order_id, matched_order.quantity)
 
             # When two limit orders are matched, they execute at the price that
             # was being "advertised" in the order book.
@@ -245,12 +238,10 @@ class OrderBook:
             self.history[0][order.order_id]['transactions'].append((self.owner.currentTime, order.quantity))
 
             # The pre-existing order may or may not still be in the recent history.
-            for idx, orders in enumerate(self.history):
-                if matched_order.order_id not in orders: continue
-
+            matched_history = self.history.get(matched_order.order_id)
+            if matched_history is not None:
                 # Found the matched order in history.  Update it with this transaction.
-                self.history[idx][matched_order.order_id]['transactions'].append(
-                    (self.owner.currentTime, matched_order.quantity))
+                matched_history['transactions'].append((self.owner.currentTime, matched_order.quantity))
 
             # Return (only the executed portion of) the matched order.
             return matched_order
@@ -279,23 +270,9 @@ class OrderBook:
         else:
             book = self.asks
 
-        if not book:
-            # There were no orders on this side of the book.
-            book.append([order])
-        elif not self.isBetterPrice(order, book[-1][0]) and not self.isEqualPrice(order, book[-1][0]):
-            # There were orders on this side, but this order is worse than all of them.
-            # (New lowest bid or highest ask.)
-            book.append([order])
-        else:
-            # There are orders on this side.  Insert this order in the correct position in the list.
-            # Note that o is a LIST of all orders (oldest at index 0) at this same price.
-            for i, o in enumerate(book):
-                if self.isBetterPrice(order, o[0]):
-                    book.insert(i, [order])
-                    break
-                elif self.isEqualPrice(order, o[0]):
-                    book[i].append(order)
-                    break
+        # The BookSide locates (or creates) the price level by bisection and appends the
+        # order to the back of that level's queue.
+        book.add(order)
 
     def cancelOrder(self, order):
         # Attempts to cancel (the remaining, unexecuted portion of) a trade in the order book.
@@ -311,92 +288,98 @@ class OrderBook:
         else:
             book = self.asks
 
-        # If there are no orders on this side of the book, there is nothing to do.
-        if not book: return
-
-        # There are orders on this side.  Find the price level of the order to cancel,
-        # then find the exact order and cancel it.
-        # Note that o is a LIST of all orders (oldest at index 0) at this same price.
-        for i, o in enumerate(book):
-            if self.isEqualPrice(order, o[0]):
-                # This is the correct price level.
-                for ci, co in enumerate(book[i]):
-                    if order.order_id == co.order_id:
-                        # Cancel this order.
-                        cancelled_order = book[i].pop(ci)
-
-                        # Record cancellation of the order if it is still present in the recent history structure.
-                        for idx, orders in enumerate(self.history):
-                            if cancelled_order.order_id not in orders: continue
-
-                            # Found the cancelled order in history.  Update it with the cancelation.
-                            self.history[idx][cancelled_order.order_id]['cancellations'].append(
-                                (self.owner.currentTime, cancelled_order.quantity))
-
-                        # If the cancelled price now has no orders, remove it completely.
-                        if not book[i]:
-                            del book[i]
-
-                        log_print("CANCELLED: order {}", order)
-                        log_print("SENT: notifications of order cancellation to agent {} for order {}",
-                                  cancelled_order.agent_id, cancelled_order.order_id)
-
-                        self.owner.sendMessage(order.agent_id,
-                                               Message({"msg": "ORDER_CANCELLED", "order": cancelled_order}))
-                        # We found the order and cancelled it, so stop looking.
-                        self.last_update_ts = self.owner.currentTime
-                        return
+        # Find the order to cancel through the order id index.  It must still be resting at the
+        # same price level as the cancellation request.
+        if book.price_of(order.order_id) != order.limit_price: return
+
+        # Cancel this order.  BookSide removes the price level if it is now empty.
+        cancelled_order = book.remove(order.order_id)
+
+        # Record cancellation of the order if it is still present in the recent history structure.
+        cancelled_history = self.history.get(cancelled_order.order_id)
+        if cancelled_history is not None:
+            cancelled_history['cancellations'].append((self.owner.currentTime, cancelled_order.quantity))
+
+        log_print("CANCELLED: order {}", order)
+        log_print("SENT: notifications of order cancellation to agent {} for order {}",
+                  cancelled_order.agent_id, cancelled_order.order_id)
+
+        self.owner.sendMessage(order.agent_id,
+                               Message({"msg": "ORDER_CANCELLED", "order": cancelled_order}))
+        self.last_update_ts = self.owner.currentTime
+
+    def cancelAgentOrders(self, agent_id):
+        # Cancels every order the agent has resting in the book (bids, then asks, oldest first), with
+        # the usual notification for each.  Returns the number of orders cancelled.
+        orders = self.bids.agent_orders(agent_id) + self.asks.agent_orders(agent_id)
+        for order in orders:
+            self.cancelOrder(order)
+
+        return len(orders)
 
     def modifyOrder(self, order, new_order):
         # Modifies the quantity of an existing limit order in the order book
         if not self.isSameOrder(order, new_order): return
         book = self.bids if order.is_buy_order else self.asks
-        if not book: return
-        for i, o in enumerate(book):
-            if self.isEqualPrice(order, o[0]):
-                for mi, mo in enumerate(book[i]):
-                    if order.order_id == mo.order_id:
-                        book[i][0] = new_order
-                        for idx, orders in enumerate(self.history):
-                            if new_order.order_id not in orders: continue
-                            self.history[idx][new_order.order_id]['modifications'].append(
-                                (self.owner.currentTime, new_order.quantity))
-                            log_print("MODIFIED: order {}", order)
-                            log_print("SENT: notifications of order modification to agent {} for order {}",
-                                      new_order.agent_id, new_order.order_id)
-                            self.owner.sendMessage(order.agent_id,
-                                                   Message({"msg": "ORDER_MODIFIED", "new_order": new_order}))
-        if order.is_buy_order:
-            self.bids = book
-        else:
-            self.asks = book
+        if book.price_of(order.order_id) == order.limit_price:
+            # Replace the resting order in place, so it keeps its time priority at this price level.
+            book.replace(order.order_id, new_order)
+            modified_history = self.history.get(new_order.order_id)
+            if modified_history is not None:
+                modified_history['modifications'].append((self.owner.currentTime, new_order.quantity))
+                log_print("MODIFIED: order {}", order)
+                log_print("SENT: notifications of order modification to agent {} for order {}",
+                          new_order.agent_id, new_order.order_id)
+                self.owner.sendMessage(order.agent_id,
+                                       Message({"msg": "ORDER_MODIFIED", "new_order": new_order.clone()}))
         self.last_update_ts = self.owner.currentTime
 
+    @property
+    def version(self):
+        # Increases whenever either side of the book changes.
+        return self.bids.version + self.asks.version
+
     # Get the inside bid price(s) and share volume available at each price, to a limit
     # of "depth".  (i.e. inside price, inside 2 prices)  Returns a list of tuples:
     # list index is best bids (0 is best); each tuple is (price, total shares).
+    # The list is cached by the BookSide until the bids next change, so queries of an
+    # unchanged book cost nothing; callers must not modify it.
     def getInsideBids(self, depth=sys.maxsize):
-        book = []
-        for i in range(min(depth, len(self.bids))):
-            qty = 0
-            price = self.bids[i][0].limit_price
-            for o in self.bids[i]:
-                qty += o.quantity
-            book.append((price, qty))
-
-        return book
+        return self.bids.inside(depth)
 
     # As above, except for ask price(s).
     def getInsideAsks(self, depth=sys.maxsize):
-        book = []
-        for i in range(min(depth, len(self.asks))):
-            qty = 0
-            price = self.asks[i][0].limit_price
-            for o in self.asks[i]:
-                qty += o.quantity
-            book.append((price, qty))
+        return self.asks.inside(depth)
 
-        return book
+    def get_transacted_volume(self, lookback_period='10min'):
+        """ Method retrieves the total transacted volume for a symbol over a lookback period finishing at the current
+            simulation time.  lookback_period may be anything accepted by pd.to_timedelta, or a list of such values,
+            in which case a dictionary of lookback_period -> volume is returned for all windows at once.
+        """
+        if isinstance(lookback_period, (list, tuple)):
+            return {period: self.get_transacted_volume(period) for period in lookback_period}
+
+        window_start = self.owner.currentTime - pd.to_timedelta(lookback_period)
+        if getattr(self.owner, 'legacy_transacted_volume', False):
+            return self._legacy_transacted_volume(window_start)
+
+        return self.ledger.volume_since(window_start)
+
+    def _legacy_transacted_volume(self, window_start):
+        """ The transacted volume since window_start as computed before the trade ledger, from the order history.
+            That counts most executions twice (once per side, and the incoming side with its remaining quantity
+            rather than the fill), so it is kept only to reproduce the results of earlier versions.
+        """
+        # Update unrolled transactions DataFrame
+        recent_history = self._get_recent_history()
+        self._update_unrolled_transactions(recent_history)
+        unrolled_transactions = self._transacted_volume["unrolled_transactions"]
+
+        #  Get transacted volume in time window
+        executed_within_lookback_period = unrolled_transactions[unrolled_transactions['execution_time'] >= window_start]
+        transacted_volume = executed_within_lookback_period['quantity'].sum()
+
+        return transacted_volume
 
     def _get_recent_history(self):
         """ Gets portion of self.history that has arrived since last call of self.get_transacted_volume.
@@ -452,24 +435,6 @@ class OrderBook:
 
         return unrolled_transactions
 
-    def get_transacted_volume(self, lookback_period='10min'):
-        """ Method retrieves the total transacted volume for a symbol over a lookback period finishing at the current
-            simulation time.
-        """
-
-        # Update unrolled transactions DataFrame
-        recent_history = self._get_recent_history()
-        self._update_unrolled_transactions(recent_history)
-        unrolled_transactions = self._transacted_volume["unrolled_transactions"]
-
-        #  Get transacted volume in time window
-        lookback_pd = pd.to_timedelta(lookback_period)
-        window_start = self.owner.currentTime - lookback_pd
-        executed_within_lookback_period = unrolled_transactions[unrolled_transactions['execution_time'] >= window_start]
-        transacted_volume = executed_within_lookback_period['quantity'].sum()
-
-        return transacted_volume
-
     # These could be moved to the LimitOrder class.  We could even operator overload them
     # into >, <, ==, etc.
     def isBetterPrice(self, order, o):
@@ -494,40 +459,21 @@ class OrderBook:
         return order.order_id == new_order.order_id
 
     def book_log_to_df(self):
-        """ Returns a pandas DataFrame constructed from the order book log, to be consumed by
-            agent.ExchangeAgent.logOrderbookSnapshots.
+        """ Returns a pandas DataFrame constructed from the order book log.
 
             The first column of the DataFrame is `QuoteTime`. The succeeding columns are prices quoted during the
-            simulation (as taken from self.quotes_seen).
+            simulation (as taken from self.book_log.quotes_seen).
 
             Each row is a snapshot at a specific time instance. If there is volume at a certain price level (negative
             for bids, positive for asks) this volume is written in the column corresponding to the price level. If there
             is no volume at a given price level, the corresponding column has a `0`.
 
-            The data is stored in a sparse format, such that a value of `0` takes up no space.
+            The data is stored in a sparse format, such that a value of `0` takes up no space.  See util.BookLog for
+            the archive formats used by agent.ExchangeAgent.logOrderBookSnapshots.
 
         :return:
         """
-        quotes = sorted(list(self.quotes_seen))
-        log_len = len(self.book_log)
-        quote_idx_dict = {quote: idx for idx, quote in enumerate(quotes)}
-        quotes_times = []
-
-
-        # Construct sparse matrix, where rows are timesteps, columns are quotes and elements are volume.
-        S = dok_matrix((log_len, len(quotes)), dtype=int)  # Dictionary Of Keys based sparse matrix.
-
-        for i, row in enumerate(tqdm(self.book_log, desc="Processing orderbook log")):
-            quotes_times.append(row['QuoteTime'])
-            for quote, vol in row.items():
-                if quote == "QuoteTime":
-                    continue
-                S[i, quote_idx_dict[quote]] = vol
-
-        S = S.tocsc()  # Convert this matrix to Compressed Sparse Column format for pandas to consume.
-        df = pd.DataFrame.sparse.from_spmatrix(S, columns=quotes)
-        df.insert(0, 'QuoteTime', quotes_times, allow_duplicates=True)
-        return df
+        return self.book_log.to_wide().reset_index()
 
     # Print a nicely-formatted view of the current order book.
     def prettyPrint(self, silent=False):
@@ -0,0 +1,82 @@
+# Bounded order history for an OrderBook, used to serve QUERY_ORDER_STREAM.
+#
+# The history is a sequence of dictionaries keyed by order_id.  Index 0 holds orders entered
+# since the most recent trade, index 1 the orders that led up to the most recent trade, and
+# so on, up to the last `length` trades.  Each value is the order's history record
+# (entry_time, quantity, is_buy_order, limit_price, transactions, modifications, cancellations).
+#
+# Internally the dictionaries live in a fixed-capacity ring buffer indexed by trade number, so
+# recording a trade is O(1) amortized (only the evicted slot's orders are touched) instead of
+# copying the whole list, and an order_id -> trade number index finds an order's record
+# without walking every slot.
+
+
+class OrderHistory:
+
+    def __init__(self, length=0):
+        # Number of completed trades to retain, in addition to the orders since the last trade.
+        self.length = length
+
+        # A very large length (e.g. sys.maxsize, as recommended for POV execution) cannot be
+        # preallocated, so the buffer grows on demand until it reaches capacity.
+        self._capacity = length + 1
+        self._slots = [{}]
+
+        # Number of trades recorded so far.  The current slot (index 0) is trade % capacity.
+        self._trade = 0
+
+        # order_id -> trade number during which the order was entered.
+        self._index = {}
+
+    def _slot(self, trade):
+        return self._slots[trade % self._capacity]
+
+    def __len__(self):
+        return min(self._trade + 1, self._capacity)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._slot(self._trade - i) for i in range(*item.indices(len(self)))]
+
+        if item < 0: item += len(self)
+        if not 0 <= item < len(self): raise IndexError("OrderHistory index out of range")
+
+        return self._slot(self._trade - item)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._slot(self._trade - i)
+
+    def __contains__(self, order_id):
+        return order_id in self._index
+
+    def add(self, order_id, record):
+        """ Records a newly entered order under index 0 (orders since the most recent trade). """
+        self._slot(self._trade)[order_id] = record
+        self._index[order_id] = self._trade
+
+    def get(self, order_id):
+        """ Returns the history record for an order, or None if it has aged out of the history. """
+        trade = self._index.get(order_id)
+        if trade is None: return None
+        return self._slot(trade)[order_id]
+
+    def advance(self):
+        """ Records that a trade occurred: index 0 becomes index 1, and so on.  The slot falling
+            off the end of the history is reused for the new index 0.
+        """
+        self._trade += 1
+
+        if len(self._slots) < self._capacity:
+            self._slots.append({})
+            return
+
+        slot = self._trade % self._capacity
+        evicted = self._slots[slot]
+        evicted_trade = self._trade - self._capacity
+
+        for order_id in evicted:
+            if self._index.get(order_id) == evicted_trade:
+                del self._index[order_id]
+
+        self._slots[slot] = {}
@@ -0,0 +1,380 @@
+# Conservative parallel execution of one simulation across several OS processes.
+#
+# The agents are split into partitions (logical processes), e.g. one per exchange and its clients or per symbol
+# cluster, and each partition's events are processed by its own process, forked from the Kernel once the
+# simulation has started.  Messages between partitions are forwarded by this (the coordinating) process.  The
+# processes advance together in windows: with T the earliest pending event anywhere and the lookahead L the
+# smallest latency of any message between partitions, no message sent at or after T can reach another partition
+# before T + L, so every partition may process its events before T + L without waiting for the others.
+#
+# Events are processed in exactly the order the sequential Kernel would process them (see
+# util.EventQueue.CausalEventQueue), and when every partition is done, the agents and the Kernel are brought back
+# into this process, which then stops the simulation as usual.  So the results (trades, holdings, logs, summary)
+# are those of the sequential Kernel, with one exception: order ids, which are labels drawn from a global counter,
+# come from a separate block in each partition.
+#
+# This holds provided that:
+#   - latencies are deterministic (LatencyModel 'deterministic', or an agentLatency matrix without latency noise),
+#     as random latency draws come from a single generator in sequential order;
+#   - agents in different partitions share nothing but the Kernel and read-only objects, apart from the oracle
+#     and the global random generators (numpy's and Python's), which only agents in the first partition may use
+#     during the simulation if using them changes their state (as drawing does, and as using the mean-reverting
+#     oracles does, whose values are drawn on demand; this is checked);
+#   - messages are not modified by their sender after sending (the usual convention), as a message to another
+#     partition is copied when the window it was sent in ends.
+#
+# A message between partitions that arrives within the lookahead (possible only with an explicit lookahead larger
+# than the true minimum latency) stops the run with an error rather than giving different results.
+
+import hashlib
+import io
+import pickle
+import random
+import sys
+import traceback
+import multiprocessing as mp
+
+import numpy as np
+
+from message.Message import Message
+from util.EventQueue import CausalEventQueue, HeapEventQueue
+from util.order.Order import Order
+
+
+# Each partition draws order ids from its own block of this size.
+ORDER_ID_BLOCK = 10 ** 12
+
+
+class PartitionedRun:
+
+    def __init__(self, kernel, partitions, lookahead=None):
+        """ Prepares to run a started simulation to its end with the agents split into partitions: either a number of
+            partitions, to which the agents are dealt round-robin by id, or a sequence giving the partition of each
+            agent (any labels; the first partition is the one with the smallest label).  The lookahead (ns)
+            defaults to the smallest latency between agents in different partitions.
+        """
+        num_agents = len(kernel.agents)
+        if isinstance(partitions, (int, np.integer)):
+            if partitions < 1:
+                raise ValueError("PartitionedRun requires at least one partition", partitions)
+            labels = np.arange(num_agents) % partitions
+        else:
+            labels = np.asarray(partitions)
+            if labels.shape != (num_agents,):
+                raise ValueError("PartitionedRun requires the partition of every agent", labels.shape, num_agents)
+
+        # Partitions are numbered from 0 in label order.
+        self.partition_of = np.unique(labels, return_inverse=True)[1]
+        self.num_partitions = int(self.partition_of.max()) + 1 if num_agents else 0
+
+        if not isinstance(kernel.messages, HeapEventQueue):
+            raise ValueError("PartitionedRun requires the Kernel's 'heap' event queue", type(kernel.messages).__name__)
+
+        if kernel.agentLatencyModel is not None:
+            if kernel.agentLatencyModel.latency_model != 'deterministic':
+                raise ValueError("PartitionedRun requires a deterministic latency model",
+                                 kernel.agentLatencyModel.latency_model)
+        elif len(kernel.latencyNoise) != 1:
+            raise ValueError("PartitionedRun requires latencies without noise", kernel.latencyNoise)
+
+        self.kernel = kernel
+        self.lookahead = self.min_latency() if lookahead is None else lookahead
+
+        if self.lookahead < 1:
+            raise ValueError("PartitionedRun requires a lookahead (latency between partitions) of at least 1 ns",
+                             self.lookahead)
+
+    def min_latency(self):
+        """ Returns the smallest latency (whole ns) of any message between agents in different partitions, or
+            np.inf with a single partition.
+        """
+        kernel = self.kernel
+        groups = [np.flatnonzero(self.partition_of == p) for p in range(self.num_partitions)]
+
+        latency = np.inf
+        for a, senders in enumerate(groups):
+            for b, recipients in enumerate(groups):
+                if a == b: continue
+                if kernel.agentLatencyModel is not None:
+                    latency = min(latency, kernel.agentLatencyModel.min_latency_between(senders, recipients))
+                else:
+                    matrix = np.asarray(kernel.agentLatency)
+                    latency = min(latency, matrix[np.ix_(senders, recipients)].min())
+
+        return latency if latency == np.inf else int(np.floor(latency))
+
+    def run(self):
+        """ Processes the simulation's events to its end, as Kernel.runToEnd would. """
+        kernel = self.kernel
+        stop = _ns(kernel._clock(kernel.stopTime))
+        partition_of = self.partition_of
+
+        # The children are forked from this process: flush anything that they would otherwise write again.
+        kernel.log_sink.drain()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        ctx = mp.get_context('fork')
+        self.pipes, self.processes = [], []
+        for p in range(self.num_partitions):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_logical_process, args=(kernel, p, partition_of, child), daemon=True)
+            process.start()
+            child.close()
+            self.pipes.append(parent)
+            self.processes.append(process)
+
+        try:
+            # The next event of each partition, as (time in ns, recipient, MessageType), and the entries sent to
+            # each partition that it has yet to receive.
+            heads = self._gather(range(self.num_partitions))
+            inflight = [[] for _ in range(self.num_partitions)]
+
+            while True:
+                pending = [h for h in heads if h is not None] + [e[:3] for entries in inflight for e in entries]
+                if not pending: break
+
+                head = min(pending)
+                if head[0] > stop:
+                    # The sequential Kernel handles one event past its stop time, the first, then stops.
+                    p = partition_of[head[1]]
+                    self._send(p, ('last', inflight[p]))
+                    inflight[p] = []
+                    self._route(self._gather([p]), [p], heads, inflight)
+                    break
+
+                bound = stop if self.lookahead == np.inf else min(head[0] + self.lookahead - 1, stop)
+
+                # Only partitions with an event before the end of the window have work to do.
+                active = [p for p in range(self.num_partitions)
+                          if inflight[p] or (heads[p] is not None and heads[p][0] <= bound)]
+                for p in active:
+                    self._send(p, ('run', bound, inflight[p]))
+                    inflight[p] = []
+
+                self._route(self._gather(active), active, heads, inflight)
+
+            for p in range(self.num_partitions):
+                self._send(p, ('finish', inflight[p]))
+            states = self._gather(range(self.num_partitions))
+
+        finally:
+            for process in self.processes:
+                process.join(timeout=5)
+                if process.is_alive(): process.terminate()
+
+        self._merge(states)
+
+    def _send(self, p, command):
+        self.pipes[p].send(command)
+
+    def _gather(self, partitions):
+        replies = []
+        for p in partitions:
+            status, reply = self.pipes[p].recv()
+            if status == 'error':
+                for process in self.processes:
+                    if process.is_alive(): process.terminate()
+                raise RuntimeError("Partition of simulation failed", p, reply)
+            replies.append(reply)
+        return replies
+
+    def _route(self, replies, partitions, heads, inflight):
+        # Records each partition's next event and forwards the entries it sent to other partitions.
+        for p, (outbox, head) in zip(partitions, replies):
+            heads[p] = head
+            for entry in outbox:
+                inflight[self.partition_of[entry[1]]].append(entry)
+
+    def _merge(self, states):
+        # Brings the agents and the Kernel state of every partition back into this process, in the state the
+        # sequential Kernel would have left them.
+        kernel = self.kernel
+        states = [_Unpickler(io.BytesIO(state), kernel).load() for state in states]
+
+        changed_shared = [(p, state['shared_changed']) for p, state in enumerate(states) if state['shared_changed']]
+        if changed_shared:
+            raise ValueError("Agents outside the first partition changed the oracle or the global random generators, "
+                             "so results could differ from a sequential run: place the agents that use them in the "
+                             "first partition", changed_shared)
+
+        changed = {}
+        for p, state in enumerate(states):
+            for key in state['custom_state']:
+                changed.setdefault(key, []).append(p)
+        conflicts = {key: ps for key, ps in changed.items() if len(ps) > 1}
+        if conflicts:
+            raise ValueError("Agents in several partitions changed the same custom state", conflicts)
+
+        rows, entries = [], []
+        for state in states:
+            for i, attributes in state['agents'].items():
+                agent = kernel.agents[i]
+                agent.__dict__.clear()
+                agent.__dict__.update(attributes)
+                kernel.agentCurrentTimes[i] = state['current_times'][i]
+                kernel.agentComputationDelays[i] = state['computation_delays'][i]
+
+            if state['agent_state']:
+                kernel.custom_state.setdefault('agent_state', {}).update(state['agent_state'])
+            kernel.custom_state.update(state['custom_state'])
+
+            if state['oracle'] is not None:
+                kernel.oracle.__dict__.clear()
+                kernel.oracle.__dict__.update(state['oracle'])
+
+            if state['random_states'] is not None:
+                np.random.set_state(state['random_states'][0])
+                random.setstate(state['random_states'][1])
+
+            rows.extend(state['summary'])
+            entries.extend(state['entries'])
+
+        # Summary log rows are appended, and leftover events queued, in sequential order.
+        for _, sender, eventType, event in sorted(rows, key=lambda row: row[0]):
+            kernel.appendSummaryLog(sender, eventType, event)
+
+        kernel.messages = HeapEventQueue()
+        for entry in sorted(entries, key=lambda entry: entry[:4]):
+            kernel.messages.put(entry[4], entry[5])
+
+        kernel.currentTime = max((state['current_time'] for state in states), key=_ns)
+        kernel.ttl_messages = sum(state['ttl_messages'] for state in states)
+
+        Message.uniq = max(state['message_uniq'] for state in states)
+        Order.order_id = max(state['order_id'] for state in states)
+
+
+def _logical_process(kernel, p, partition_of, conn):
+    # Runs in a child forked from the coordinator: processes the events of the agents in partition p as the
+    # coordinator directs, then sends back their state.
+    try:
+        local = (partition_of == p).tolist()
+        queue = CausalEventQueue.from_heap(kernel.messages, local)
+        kernel.messages = queue
+
+        Order.order_id = max(Order.order_id, p * ORDER_ID_BLOCK)
+
+        # Summary log rows are merged in sequential order later, keyed on the event being handled.
+        rows = []
+        kernel.appendSummaryLog = lambda sender, eventType, event: \
+            rows.append((queue.parent + (len(rows),), sender, eventType, event))
+
+        # The shared state that only the first partition may change.
+        def shared():
+            return {'oracle': _fingerprint(kernel.oracle.__dict__, kernel) if kernel.oracle is not None else None,
+                    'numpy.random': _fingerprint(np.random.get_state(), kernel),
+                    'random': _fingerprint(random.getstate(), kernel)}
+
+        shared_state = shared()
+        custom_state = {key: _fingerprint(value, kernel) for key, value in kernel.custom_state.items()}
+
+        conn.send(('ok', queue.head()))
+
+        while True:
+            command = conn.recv()
+
+            for entry in command[-1]:
+                queue.put_entry(entry)
+
+            if command[0] == 'run':
+                bound = command[1]
+                kernel.processEvents(bound, pause=True)
+
+                outbox, queue.outbox = queue.outbox, []
+                early = [entry[:3] for entry in outbox if entry[0] <= bound]
+                if early:
+                    raise ValueError("Messages between partitions arrived within the lookahead", early[:5])
+
+                conn.send(('ok', (outbox, queue.head())))
+
+            elif command[0] == 'last':
+                kernel.processEvents(kernel.stopTime)
+
+                outbox, queue.outbox = queue.outbox, []
+                conn.send(('ok', (outbox, queue.head())))
+
+            elif command[0] == 'finish':
+                kernel.log_sink.drain()
+                owned = [i for i, is_local in enumerate(local) if is_local]
+
+                state = {
+                    'agents': {i: kernel.agents[i].__dict__ for i in owned},
+                    'current_times': {i: kernel.agentCurrentTimes[i] for i in owned},
+                    'computation_delays': {i: kernel.agentComputationDelays[i] for i in owned},
+                    'entries': queue.entries(),
+                    'summary': rows,
+                    'agent_state': {i: s for i, s in kernel.custom_state.get('agent_state', {}).items()
+                                    if i < len(local) and local[i]},
+                    'custom_state': {key: value for key, value in kernel.custom_state.items()
+                                     if key != 'agent_state' and _fingerprint(value, kernel) != custom_state.get(key)},
+                    'oracle': kernel.oracle.__dict__ if p == 0 and kernel.oracle is not None else None,
+                    'random_states': (np.random.get_state(), random.getstate()) if p == 0 else None,
+                    'shared_changed': [] if p == 0 else
+                                      [key for key, value in shared().items() if value != shared_state[key]],
+                    'current_time': kernel.currentTime,
+                    'ttl_messages': kernel.ttl_messages,
+                    'message_uniq': Message.uniq,
+                    'order_id': Order.order_id,
+                }
+
+                buffer = io.BytesIO()
+                _Pickler(buffer, kernel).dump(state)
+                conn.send(('ok', buffer.getvalue()))
+                break
+
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+
+def _shared(kernel):
+    # Objects that every process holds its own copy of, and which the state sent back refers to by name: the
+    # Kernel, its oracle and latency model, and the agents themselves.
+    shared = {id(kernel): ('kernel',)}
+    if kernel.oracle is not None: shared[id(kernel.oracle)] = ('oracle',)
+    if kernel.agentLatencyModel is not None: shared[id(kernel.agentLatencyModel)] = ('latency_model',)
+    for i, agent in enumerate(kernel.agents):
+        shared[id(agent)] = ('agent', i)
+    return shared
+
+
+class _Pickler(pickle.Pickler):
+
+    def __init__(self, file, kernel):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.shared = _shared(kernel)
+
+    def persistent_id(self, obj):
+        return self.shared.get(id(obj))
+
+
+class _Unpickler(pickle.Unpickler):
+
+    def __init__(self, file, kernel):
+        super().__init__(file)
+        self.kernel = kernel
+
+    def persistent_load(self, pid):
+        if pid[0] == 'kernel': return self.kernel
+        if pid[0] == 'oracle': return self.kernel.oracle
+        if pid[0] == 'latency_model': return self.kernel.agentLatencyModel
+        if pid[0] == 'agent': return self.kernel.agents[pid[1]]
+        raise pickle.UnpicklingError("Unknown shared object", pid)
+
+
+def _fingerprint(value, kernel):
+    # A digest of value's state, to tell whether it changed.
+    buffer = io.BytesIO()
+    try:
+        _Pickler(buffer, kernel).dump(value)
+    except Exception:
+        return repr(value)
+    return hashlib.sha1(buffer.getvalue()).hexdigest()
+
+
+def _ns(t):
+    # Integer nanoseconds for a simulation time in either clock representation.
+    return getattr(t, 'value', t)
@@ -0,0 +1,133 @@
+# Columnar, memory-mapped store of historical L3 order messages for market replay.
+#
+# A day of L3 messages for a liquid name runs to millions of rows.  Parsing the pipe-delimited
+# source file row by row and holding every message as a dictionary took minutes and several GB.
+# Instead, the source file is converted once, with vectorized pandas/NumPy operations, into a
+# directory holding one .npy file per column, sorted by time:
+#
+#   TIMESTAMP      int64   ns since the epoch
+#   ORDER_ID       int64   (or fixed-width bytes when the source ids are not all numeric)
+#   PRICE          int64   cents
+#   SIZE           int64   shares
+#   BUY_SELL_FLAG  int8    0 for buy, 1 for sell
+#
+# ReplayStore opens the columns memory-mapped, and a ReplayCursor walks a time window of them
+# one timestamp at a time, so replay touches each page once and holds only the current batch.
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+class ReplayStore:
+
+    COLUMNS = ['TIMESTAMP', 'ORDER_ID', 'PRICE', 'SIZE', 'BUY_SELL_FLAG']
+    DIRECTION = {0: 'BUY', 1: 'SELL'}
+
+    def __init__(self, path):
+        """ Opens the converted store in directory path.  Raises FileNotFoundError if it does not exist. """
+        self.path = path
+        # Plain ndarray views of the mapped files: same pages, without np.memmap's per-slice overhead.
+        self.columns = {c: np.load(os.path.join(path, c + '.npy'), mmap_mode='r').view(np.ndarray)
+                        for c in ReplayStore.COLUMNS}
+        self.times = self.columns['TIMESTAMP']
+
+    def __len__(self):
+        return len(self.times)
+
+    def cursor(self, start_time=None, end_time=None):
+        """ Returns a ReplayCursor over the messages with start_time <= TIMESTAMP < end_time. """
+        return ReplayCursor(self, start_time, end_time)
+
+    @staticmethod
+    def convert(orders_file_path, path):
+        """ Converts a pipe-delimited L3 orders file into a store in directory path and returns it.
+
+            The source has a header row naming its columns (it may have others besides ReplayStore.COLUMNS)
+            and the first row after it is skipped.  Timestamps are formatted as %Y%m%d%H%M%S.%f and are
+            truncated to microseconds; prices are in dollars.
+        """
+        df = pd.read_csv(orders_file_path, sep='|', usecols=ReplayStore.COLUMNS, dtype=str, skiprows=[1])
+
+        # Timestamps: whole seconds, plus the first six fractional digits.
+        stamp = df['TIMESTAMP'].str.strip().str.partition('.')
+        seconds = pd.to_datetime(stamp[0], format='%Y%m%d%H%M%S').values.astype(np.int64)
+        micros = stamp[2].str[:6].str.ljust(6, '0').astype(np.int64).to_numpy()
+        times = seconds + micros * 1000
+
+        ids = df['ORDER_ID'].str.strip()
+        if ids.str.fullmatch(r'\d+').all():
+            ids = ids.astype(np.int64).to_numpy()
+        else:
+            ids = ids.to_numpy(dtype=str).astype(bytes)
+
+        columns = {
+            'TIMESTAMP': times,
+            'ORDER_ID': ids,
+            'PRICE': np.round(df['PRICE'].astype(np.float64).to_numpy() * 100).astype(np.int64),
+            'SIZE': df['SIZE'].astype(np.int64).to_numpy(),
+            'BUY_SELL_FLAG': df['BUY_SELL_FLAG'].astype(np.int8).to_numpy(),
+        }
+
+        # Sort by time, keeping the file order of messages with the same timestamp.
+        order = np.argsort(times, kind='stable')
+
+        # Write into a temporary directory and rename it, so a reader never sees a partial store.
+        tmp = '{}.{}.tmp'.format(path.rstrip(os.sep), os.getpid())
+        os.makedirs(tmp, exist_ok=True)
+        for c, values in columns.items():
+            np.save(os.path.join(tmp, c + '.npy'), values[order])
+
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another process finished converting the same file first.
+            if not os.path.isdir(path): raise
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        return ReplayStore(path)
+
+
+class ReplayCursor:
+
+    def __init__(self, store, start_time=None, end_time=None):
+        self.store = store
+        times = store.times
+
+        self.pos = 0 if start_time is None else int(np.searchsorted(times, pd.Timestamp(start_time).value, side='left'))
+        self.stop = len(times) if end_time is None else int(np.searchsorted(times, pd.Timestamp(end_time).value, side='left'))
+
+    def __len__(self):
+        # Messages remaining.
+        return max(0, self.stop - self.pos)
+
+    def __iter__(self):
+        while self.pos < self.stop:
+            yield self.next_batch()
+
+    def peek_time(self):
+        """ Returns the time of the next batch as a pd.Timestamp, or None once the window is exhausted. """
+        if self.pos >= self.stop: return None
+        return pd.Timestamp(int(self.store.times[self.pos]))
+
+    def next_batch(self):
+        """ Returns (time, orders) for the next timestamp and advances past it.  orders is a list of dictionaries
+            with keys ORDER_ID (str), PRICE, SIZE and BUY_SELL_FLAG ('BUY' or 'SELL'), in file order.
+        """
+        if self.pos >= self.stop: return None
+
+        columns = self.store.columns
+        t = self.store.times[self.pos]
+        end = min(self.stop, int(np.searchsorted(self.store.times, t, side='right')))
+
+        ids = columns['ORDER_ID'][self.pos:end].astype(str).tolist()
+        prices = columns['PRICE'][self.pos:end].tolist()
+        sizes = columns['SIZE'][self.pos:end].tolist()
+        sides = columns['BUY_SELL_FLAG'][self.pos:end].tolist()
+
+        self.pos = end
+
+        return pd.Timestamp(int(t)), [{'ORDER_ID': i, 'PRICE': p, 'SIZE': s, 'BUY_SELL_FLAG': ReplayStore.DIRECTION[b]}
+                                      for i, p, s, b in zip(ids, prices, sizes, sides)]
@@ -0,0 +1,165 @@
+# Runs many simulations of one config in parallel, in worker processes, and collects their results.
+#
+# config/parallel.py used to start each run with os.system('python -u abides.py ...'), so every run paid
+# for a fresh interpreter, the pandas/scipy imports and the loading of any historical data, and its
+# results came back only as files on disk.  A Sweep instead:
+#
+#   1. executes the config once in this process, stopping just before it calls Kernel.runner, so the
+#      modules the config imports and the inputs it loads through util.util.shared_input (historical
+#      trades, fundamental series, volume profiles) are already in memory;
+#   2. runs each simulation in a child process forked from this one, which executes the config with the
+#      run's command line arguments (and so calls Kernel.runner itself), sharing the parent's setup;
+#   3. returns a result dictionary per run to the parent, holding the kernel's custom_state and a summary
+#      of the run (mean ending value and return by agent type, messages processed, wallclock time).
+#
+# Every run gets a new child, which is never reused, so module-level state such as the global order id
+# counter starts from the same place as in a separate abides.py process and each run behaves the same.
+#
+# With start_method='forkserver', for programs in which fork is unsafe (e.g. ones running threads), the
+# children are forked from a server process that imports the config's modules but not its inputs.
+
+import datetime as dt
+import runpy
+import sys
+import traceback
+import multiprocessing as mp
+
+import pandas as pd
+
+from Kernel import Kernel
+from util.util import picklable
+
+
+class SetupComplete(Exception):
+    """ Raised in place of Kernel.runner while a Sweep executes a config for setup only. """
+    pass
+
+
+class Sweep:
+
+    def __init__(self, config, num_parallel=None, start_method='fork', setup=True):
+        """ A sweep of simulations of config (the name of a module in config/, as for abides.py -c).
+
+            :param num_parallel: number of simulations to run at a time (default: the number of CPUs)
+            :param start_method: 'fork' or 'forkserver'
+            :param setup: whether to execute the config in this process first, to share its imports and inputs
+        """
+        if start_method not in ['fork', 'forkserver']:
+            raise ValueError("Sweep start_method must be 'fork' or 'forkserver'", start_method)
+
+        self.config = config
+        self.num_parallel = num_parallel if num_parallel else mp.cpu_count()
+        self.start_method = start_method
+        self.setup = setup
+
+    def run(self, runs):
+        """ Runs the simulations and returns their results, in the order of runs.
+
+            Each run is a list of command line arguments for the config (everything abides.py would be given
+            besides -c config), e.g. ['-t', 'ABM', '-d', '20200603', '-s', '1234', '-l', 'rmsc03_seed_1234'].
+            Each result is a dictionary with keys:
+
+              args          the run's arguments
+              custom_state  the custom_state returned by Kernel.runner (entries that cannot be sent back
+                            to the parent are replaced by their repr)
+              summary       dictionary of mean_ending_value and mean_return (each by agent type, as printed
+                            by the Kernel), messages and event_queue_elapsed
+              wallclock     time taken by the run, as a pd.Timedelta
+              error         None, or the traceback of an exception raised by the run
+        """
+        runs = [list(args) for args in runs]
+        if not runs: return []
+
+        ctx = mp.get_context(self.start_method)
+
+        if self.setup:
+            modules = set(sys.modules)
+            self.prepare(runs[0])
+            if self.start_method == 'forkserver':
+                # The server imports everything the config did, apart from the config itself.
+                ctx.set_forkserver_preload(sorted(m for m in set(sys.modules) - modules
+                                                  if m.split('.')[0] not in ['config', '__main__']))
+
+        with ctx.Pool(processes=min(self.num_parallel, len(runs)), maxtasksperchild=1) as pool:
+            return pool.map(_run, [(self.config, args) for args in runs], chunksize=1)
+
+    def prepare(self, args):
+        """ Executes the config with args in this process up to the point at which it would start the Kernel. """
+        runner = Kernel.runner
+
+        def setup_only(kernel, *a, **kw):
+            raise SetupComplete()
+
+        Kernel.runner = setup_only
+        try:
+            _execute(self.config, args)
+        except SetupComplete:
+            pass
+        finally:
+            Kernel.runner = runner
+
+    @staticmethod
+    def summary_frame(results):
+        """ Returns a pd.DataFrame with a row per result: its arguments, error (if any), messages, wallclock time,
+            and a mean_ending_value and mean_return column per agent type.
+        """
+        rows = []
+        for result in results:
+            summary = result['summary'] or {}
+            row = {'args': ' '.join(str(a) for a in result['args']), 'error': result['error'] is not None,
+                   'messages': summary.get('messages'), 'wallclock': result['wallclock']}
+            for key in ['mean_ending_value', 'mean_return']:
+                for agent_type, value in summary.get(key, {}).items():
+                    row['{} {}'.format(key, agent_type)] = value
+            rows.append(row)
+
+        return pd.DataFrame(rows)
+
+
+def _execute(config, args):
+    # Executes config/<config>.py as abides.py would, with a fresh copy of its module every time.
+    argv = sys.argv
+    sys.argv = ['abides.py', '-c', config] + args
+    try:
+        runpy.run_module('config.{}'.format(config), run_name='config.{}'.format(config))
+    finally:
+        sys.argv = argv
+
+
+def _run(task):
+    # Runs one simulation in a worker process.  The Kernel that the config creates is captured as it runs.
+    config, args = task
+    kernels = []
+    runner = Kernel.runner
+
+    def capture(kernel, *a, **kw):
+        kernels.append(kernel)
+        return runner(kernel, *a, **kw)
+
+    Kernel.runner = capture
+
+    start = dt.datetime.now()
+    error = None
+    try:
+        _execute(config, args)
+    except (Exception, SystemExit):
+        error = traceback.format_exc()
+        print(error, file=sys.stderr)
+    finally:
+        Kernel.runner = runner
+
+    # A config that runs several kernels reports the last one.
+    kernel = kernels[-1] if kernels else None
+    custom_state, summary = None, None
+    if kernel is not None and hasattr(kernel, 'custom_state'):
+        custom_state = {key: picklable(value) for key, value in kernel.custom_state.items()}
+        summary = {
+            'mean_ending_value': {t: kernel.meanResultByAgentType[t] / kernel.agentCountByType[t]
+                                  for t in kernel.meanResultByAgentType},
+            'mean_return': dict(kernel.meanReturnByAgentType),
+            'messages': kernel.custom_state.get('kernel_messages'),
+            'event_queue_elapsed': kernel.custom_state.get('kernel_event_queue_elapsed_wallclock'),
+        }
+
+    return {'args': args, 'custom_state': custom_state, 'summary': summary,
+            'wallclock': pd.Timedelta(dt.datetime.now() - start), 'error': error}
@@ -0,0 +1,55 @@
+# Append-only, time-ordered ledger of executed trades for one symbol.
+#
+# The exchange records each fill as it happens.  Fills arrive in non-decreasing simulation
+# time, so the ledger keeps parallel lists of integer-nanosecond times and running (prefix)
+# sums of volume and notional value, with fills at the same instant folded into one entry.
+# Any trailing window can then be answered with one bisection and a subtraction, in
+# O(log n), instead of rebuilding a DataFrame of the order history on every query.
+
+from bisect import bisect_left
+
+
+class TradeLedger:
+
+    def __init__(self):
+        # Distinct execution times, in integer nanoseconds since the epoch.
+        self.times = []
+
+        # Running totals of shares and of price * shares, up to and including each time.
+        self.cum_volume = []
+        self.cum_notional = []
+
+    def __len__(self):
+        return len(self.times)
+
+    def record(self, time, quantity, price):
+        """ Appends a fill of quantity shares at price (int cents) executed at time (pd.Timestamp or int ns). """
+        t = getattr(time, 'value', time)
+        notional = price * quantity
+
+        if self.times and self.times[-1] == t:
+            self.cum_volume[-1] += quantity
+            self.cum_notional[-1] += notional
+        else:
+            self.times.append(t)
+            self.cum_volume.append((self.cum_volume[-1] if self.cum_volume else 0) + quantity)
+            self.cum_notional.append((self.cum_notional[-1] if self.cum_notional else 0) + notional)
+
+    def _totals_before(self, start):
+        # Running totals strictly before start (pd.Timestamp or int ns).
+        idx = bisect_left(self.times, getattr(start, 'value', start))
+        if idx == 0: return 0, 0
+        return self.cum_volume[idx - 1], self.cum_notional[idx - 1]
+
+    def volume_since(self, start):
+        """ Total shares executed at or after start. """
+        if not self.times: return 0
+        return self.cum_volume[-1] - self._totals_before(start)[0]
+
+    def vwap_since(self, start):
+        """ Volume-weighted average price (float cents) of trades at or after start, or None if there were none. """
+        if not self.times: return None
+        volume, notional = self._totals_before(start)
+        volume = self.cum_volume[-1] - volume
+        if volume == 0: return None
+        return (self.cum_notional[-1] - notional) / volume
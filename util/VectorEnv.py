@@ -0,0 +1,347 @@
+# A batch of ABIDES simulations stepped in lockstep for reinforcement learning, with a Gym-like interface.
+#
+# Training a policy needs many thousands of episodes, and starting each one as its own abides.py
+# process (interpreter start, imports, config, log files) costs more than a short episode itself.
+# A VectorEnv instead holds num_envs simulations in a pool of persistent worker processes, each
+# running its share of the simulations through the step-wise Kernel API:
+#
+#   env = VectorEnv('rmsc03', ['-t', 'ABM', '-d', '20200603', '--gym-agent'], num_envs=8, num_workers=4)
+#   obs = env.reset()                                   # (num_envs, observation_size)
+#   while training:
+#     obs, rewards, dones, infos = env.step(policy(obs))  # actions: (num_envs, action_size)
+#   env.close()
+#
+# Each simulation is a run of a config (as given to abides.py -c), which must include one GymAgent
+# (agent/GymAgent.py), the designated agent, and call kernel.runner once.  Every episode of env i
+# gets its own seed, drawn from seeds[i].  A step hands each GymAgent its action, then runs its
+# simulation until the agent's next decision point or the end of the simulation.  At the end of an
+# episode the env is reset automatically (as in Gym's vectorized environments): its row of the
+# returned observations starts the new episode, and infos[i] holds the last observation of the old
+# one as 'terminal_observation'.
+#
+# Observations, actions, rewards and done flags are exchanged through shared-memory NumPy buffers,
+# so only short control messages pass through the pipes to the workers.  Everything runs on the
+# local machine.
+
+import contextlib
+import os
+import runpy
+import sys
+import traceback
+import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from Kernel import Kernel, _globalState, _setGlobalState
+from agent.GymAgent import GymAgent
+
+
+class VectorEnv:
+
+    def __init__(self, config, config_args=[], num_envs=1, num_workers=None, seeds=None, start_method='fork',
+                 agent_name=None, write_logs=False, quiet=True):
+        """ num_envs simulations of config, each run with config_args (or config_args[i], given a list of argument
+            lists, one per env) plus -s <seed> and -l <log dir>, in num_workers processes (default: one per env, at
+            most one per CPU).
+
+            :param seeds: a base seed per env (default 0..num_envs-1), from which the seed of each episode is drawn
+            :param agent_name: name of the designated GymAgent, if the config has more than one
+            :param write_logs: whether the simulations write their logs (each episode to its own log dir)
+            :param quiet: whether to discard what the simulations print
+        """
+        if num_envs < 1:
+            raise ValueError("VectorEnv requires at least one env", num_envs)
+        if start_method not in ['fork', 'forkserver', 'spawn']:
+            raise ValueError("VectorEnv start_method must be 'fork', 'forkserver' or 'spawn'", start_method)
+
+        args = config_args if config_args and isinstance(config_args[0], (list, tuple)) else [config_args] * num_envs
+        if len(args) != num_envs:
+            raise ValueError("VectorEnv needs one argument list per env", len(args), num_envs)
+
+        seeds = list(seeds) if seeds is not None else list(range(num_envs))
+        if len(seeds) != num_envs:
+            raise ValueError("VectorEnv needs one seed per env", len(seeds), num_envs)
+
+        self.num_envs = num_envs
+        num_workers = min(num_workers or os.cpu_count(), num_envs)
+
+        # Envs are dealt to workers in contiguous blocks.
+        blocks = np.array_split(np.arange(num_envs), num_workers)
+        ctx = mp.get_context(start_method)
+
+        self.pipes, self.workers, self.shm = [], [], {}
+        self.closed = False
+        for block in blocks:
+            parent, child = ctx.Pipe()
+            specs = [(int(i), config, list(args[i]), seeds[i]) for i in block]
+            worker = ctx.Process(target=_worker, args=(child, specs, agent_name, write_logs, quiet), daemon=True)
+            worker.start()
+            child.close()
+            self.pipes.append(parent)
+            self.workers.append(worker)
+
+        # Each worker builds its envs and reports the sizes of the designated agents' observations and actions.
+        sizes = set(self._gather())
+        if len(sizes) != 1:
+            raise ValueError("VectorEnv envs have different observation or action sizes", sizes)
+        self.observation_size, self.action_size = sizes.pop()
+
+        # The shared buffers, which the workers attach to by name.
+        shapes = {'obs': ((num_envs, self.observation_size), np.float64),
+                  'actions': ((num_envs, self.action_size), np.float64),
+                  'rewards': ((num_envs,), np.float64),
+                  'dones': ((num_envs,), np.bool_)}
+        self.buffers = {}
+        for key, (shape, dtype) in shapes.items():
+            self.shm[key] = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            self.buffers[key] = np.ndarray(shape, dtype=dtype, buffer=self.shm[key].buf)
+
+        self._send('attach', {key: (self.shm[key].name, shape, dtype) for key, (shape, dtype) in shapes.items()})
+        self._gather()
+
+    def reset(self):
+        """ Starts a new episode in every env and returns the first observations, (num_envs, observation_size). """
+        self._send('reset')
+        self._gather()
+        return self.buffers['obs'].copy()
+
+    def step(self, actions):
+        """ Applies actions (num_envs, action_size) and runs every env to its next decision point.  Returns
+            observations, rewards, dones and a list of info dictionaries, one per env.
+        """
+        actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, self.action_size)
+        self.buffers['actions'][:] = actions
+
+        self._send('step')
+        infos = [None] * self.num_envs
+        for worker_infos in self._gather():
+            for i, info in worker_infos:
+                infos[i] = info
+
+        return self.buffers['obs'].copy(), self.buffers['rewards'].copy(), self.buffers['dones'].copy(), infos
+
+    def close(self):
+        """ Stops the workers (ending any running simulations without writing their logs) and frees the buffers. """
+        if getattr(self, 'closed', True): return
+        self.closed = True
+
+        for pipe in self.pipes:
+            try:
+                pipe.send(('close', None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for worker in self.workers:
+            worker.join()
+
+        self.buffers.clear()
+
+        for shm in self.shm.values():
+            shm.close()
+            shm.unlink()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _send(self, command, data=None):
+        for pipe in self.pipes:
+            pipe.send((command, data))
+
+    def _gather(self):
+        # Waits for a reply from every worker, raising any error one of them reports.
+        replies = []
+        for pipe in self.pipes:
+            status, reply = pipe.recv()
+            if status == 'error':
+                raise RuntimeError("VectorEnv worker failed", reply)
+            replies.append(reply)
+        return replies
+
+
+class _Env:
+    # One simulation of a config in a worker, driven up to its GymAgent's decision points.
+
+    def __init__(self, index, config, args, seed, agent_name, write_logs):
+        self.index = index
+        self.config = config
+        self.args = args
+        self.random_state = np.random.RandomState(seed)
+        self.agent_name = agent_name
+        self.write_logs = write_logs
+        self.episode = 0
+        self.kernel = None
+        self.agent = None
+        self.started = False
+
+        # Envs in one worker share the simulator's process-wide state (message and order counters, the global random
+        # generators), so each env swaps its own in while it runs.  Every episode starts from the worker's state at
+        # creation, which keeps the results of an env independent of how envs are dealt to workers.
+        self.initial_state = _globalState()
+        self.global_state = None
+
+    @contextlib.contextmanager
+    def swapped(self):
+        other = _globalState()
+        _setGlobalState(self.global_state)
+        try:
+            yield
+        finally:
+            self.global_state = _globalState()
+            _setGlobalState(other)
+
+    def build(self):
+        # Runs the config for a new episode up to the start of its simulation.
+        self.global_state = self.initial_state
+        with self.swapped():
+            self._build()
+
+    def _build(self):
+        self.episode += 1
+        seed = self.random_state.randint(low=0, high=2 ** 32 - 1)
+        log_dir = 'env_{}_episode_{}_seed_{}'.format(self.index, self.episode, seed)
+
+        kernels = []
+
+        def initialize(kernel, *a, num_simulations=1, checkpoint_time=None, checkpoint=None, partitions=None,
+                       lookahead=None, **kw):
+            kernel.initialize(*a, **kw)
+            kernels.append(kernel)
+            return {}
+
+        runner = Kernel.runner
+        Kernel.runner = initialize
+        argv = sys.argv
+        sys.argv = ['abides.py', '-c', self.config] + self.args + ['-s', str(seed), '-l', log_dir]
+        try:
+            runpy.run_module('config.{}'.format(self.config), run_name='config.{}'.format(self.config))
+        finally:
+            Kernel.runner = runner
+            sys.argv = argv
+
+        if len(kernels) != 1:
+            raise ValueError("VectorEnv config must call kernel.runner exactly once", self.config, len(kernels))
+
+        self.kernel = kernels[0]
+        self.kernel.skip_log = not self.write_logs
+        self.started = False
+
+        agents = [a for a in self.kernel.agents if isinstance(a, GymAgent) and
+                  (self.agent_name is None or a.name == self.agent_name)]
+        if len(agents) != 1:
+            raise ValueError("VectorEnv config must have exactly one designated GymAgent", self.config, len(agents))
+
+        self.agent = agents[0]
+        self.agent.driven = True
+
+    def advance(self):
+        # Runs the simulation until the agent's next decision point or the end, and returns whether it ended.
+        while not self.agent.awaiting_action and not self.kernel.done():
+            self.kernel.step(None)
+
+        return not self.agent.awaiting_action
+
+    def reset(self):
+        # Starts a new episode, unless the current one has not yet begun (as after build), and returns its first
+        # observation.  An unfinished episode is simply dropped: its agents may never have seen the market, and it
+        # has no logs worth writing.
+        if self.kernel is None or self.started:
+            self.kernel = None
+            self.build()
+        self.started = True
+
+        with self.swapped():
+            self.advance()
+            self.agent.reward()
+            return self.agent.observe()
+
+    def step(self, action):
+        # Returns (observation, reward, done, info), starting a new episode if this one ended.
+        with self.swapped():
+            self.agent.act(action)
+            done = self.advance()
+
+            obs, reward = self.agent.observe(), self.agent.reward()
+            if not done: return obs, reward, False, {}
+
+            # A finished episode is shut down normally, without the Kernel's summary log unless logs are asked for.
+            if self.write_logs:
+                self.kernel.terminate()
+            else:
+                self.kernel.stopSimulation()
+
+        info = {'terminal_observation': obs, 'episode': self.episode, 'messages': self.kernel.ttl_messages}
+        self.kernel = None
+        return self.reset(), reward, True, info
+
+
+def _attach(name):
+    # Attaches to the parent's shared memory.  The parent owns (and unlinks) it, so the worker must not register it
+    # with a resource tracker, which would unlink it when the worker exits.
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _worker(pipe, specs, agent_name, write_logs, quiet):
+    # Serves one VectorEnv's commands for the envs in specs.
+    sink = open(os.devnull, 'w') if quiet else None
+    buffers, shms = {}, []
+
+    def run(fn):
+        if sink is None: return fn()
+        with contextlib.redirect_stdout(sink):
+            return fn()
+
+    try:
+        envs = [_Env(i, config, args, seed, agent_name, write_logs) for i, config, args, seed in specs]
+        for env in envs: run(env.build)
+        pipe.send(('ok', (envs[0].agent.observation_size, envs[0].agent.action_size)))
+    except Exception:
+        pipe.send(('error', traceback.format_exc()))
+        return
+
+    while True:
+        try:
+            command, data = pipe.recv()
+
+            if command == 'attach':
+                for key, (name, shape, dtype) in data.items():
+                    shm = _attach(name)
+                    shms.append(shm)
+                    buffers[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                pipe.send(('ok', None))
+
+            elif command == 'reset':
+                for env in envs:
+                    buffers['obs'][env.index] = run(env.reset)
+                    buffers['rewards'][env.index] = 0.0
+                    buffers['dones'][env.index] = False
+                pipe.send(('ok', None))
+
+            elif command == 'step':
+                infos = []
+                for env in envs:
+                    obs, reward, done, info = run(lambda: env.step(buffers['actions'][env.index]))
+                    buffers['obs'][env.index] = obs
+                    buffers['rewards'][env.index] = reward
+                    buffers['dones'][env.index] = done
+                    infos.append((env.index, info))
+                pipe.send(('ok', infos))
+
+            elif command == 'close':
+                break
+
+        except (EOFError, KeyboardInterrupt):
+            break
+        except Exception:
+            pipe.send(('error', traceback.format_exc()))
+
+    buffers.clear()
+    for shm in shms:
+        shm.close()
@@ -5,13 +5,19 @@ import os
 from random import sample
 from dateutil.parser import parse
 
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[2])  # directory two levels up from this file
+sys.path.append(p)
+
+from util.LogSink import read_log
+
 """ Clean OHLC WRDS data series into historical fundamental format."""
 
 directory = sys.argv[1]
 files = os.listdir(directory)
 filename = os.path.join(directory, sample(files, 1)[0])
 
-df = pd.read_pickle(filename, compression="bz2")
+df = read_log(filename)
 df.reset_index(level=-1, inplace=True)
 df.level_1 = pd.to_datetime(df.level_1)
 
@@ -9,6 +9,7 @@ p = str(Path(__file__).resolve().parents[2])  # directory two levels up from thi
 sys.path.append(p)
 
 from util.formatting.convert_order_stream import get_year_month_day, get_start_end_time, dir_path, check_positive
+from util.LogSink import read_log
 from tqdm import tqdm
 
 
@@ -111,7 +112,7 @@ def finalise_processing(orderbook_df, level):
 
 def is_wide_book(df):
     """ Checks if orderbook dataframe is in wide or skinny format. """
-    if isinstance(df.index, pd.core.index.MultiIndex):
+    if isinstance(df.index, pd.MultiIndex):
         return False
     else:
         return True
@@ -126,8 +127,9 @@ def process_orderbook(df, level):
     """
 
     if not is_wide_book(df):  # orderbook skinny format
-        unstacked = df.unstack(level=-1)
-        quote_levels = unstacked.columns.levels[1]
+        # The skinny log has rows only for non-zero levels: restore the times with an empty book.
+        unstacked = df.unstack(level=-1).reindex(df.index.levels[0]).fillna(0)
+        quote_levels = unstacked.columns.get_level_values(-1)
     else:  # orderbook wide format
         unstacked = df
         quote_levels = df.columns
@@ -184,7 +186,7 @@ def save_formatted_order_book(orderbook_bz2, ticker, level, out_dir='.'):
 
     """
 
-    orderbook_df = pd.read_pickle(orderbook_bz2)
+    orderbook_df = read_log(orderbook_bz2)
 
     if not is_wide_book(orderbook_df):  # skinny format
         trading_day = get_year_month_day(pd.Series(orderbook_df.index.levels[0]))
@@ -4,6 +4,13 @@ from pandas.io.json import json_normalize
 import json
 import os
 
+import sys
+from pathlib import Path
+p = str(Path(__file__).resolve().parents[2])  # directory two levels up from this file
+sys.path.append(p)
+
+from util.LogSink import read_log
+
 
 def extract_events_from_stream(stream_df, event_type):
     """ Extracts specific event from stream.
@@ -206,7 +213,7 @@ def save_formatted_order_stream(stream_bz2, ticker, level, fmt, suffix, out_dir=
 
     """
 
-    stream_df = pd.read_pickle(stream_bz2).reset_index()
+    stream_df = read_log(stream_bz2).reset_index()
     write_df = convert_stream_to_format(stream_df, fmt=fmt)
 
     # Save to file
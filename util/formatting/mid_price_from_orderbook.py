@@ -6,6 +6,7 @@ sys.path.append(p)
 
 from util.formatting.convert_order_book import process_orderbook, is_wide_book
 from util.formatting.convert_order_stream import dir_path
+from util.LogSink import read_log
 import pandas as pd
 import os
 import argparse
@@ -14,7 +15,7 @@ import argparse
 def save_mid_price(orderbook_file_path, output_dir):
     """ Save order book mid price, computed from ABIDES orderbook log. """
 
-    orderbook_df = pd.read_pickle(orderbook_file_path)
+    orderbook_df = read_log(orderbook_file_path)
     processed_df = process_orderbook(orderbook_df, 1)
 
     # Compute mid price and associate to timestamp
@@ -3,12 +3,13 @@ import os
 import argparse
 from dateutil.parser import parse
 from util.formatting.convert_order_stream import dir_path
+from util.LogSink import read_log
 import pandas as pd
 
 
 def process_abides_order_stream(stream_bz2, symbol, out_dir, date):
     """ Writes ABIDES stream data into pandas DataFrame required by plotting programs. """
-    stream_df = pd.read_pickle(stream_bz2, compression='bz2').reset_index()
+    stream_df = read_log(stream_bz2).reset_index()
     write_df = convert_stream_to_format(stream_df, fmt="plot-scripts")
     write_df = write_df.set_index('TIMESTAMP')
     date_str = date.strftime('%Y%m%d')
@@ -1,3 +1,8 @@
+# Prints one comma-separated parameter tuple per line, which config/parallel.py can run as a sweep, e.g.
+#
+#   python util/grid_search.py -l 0.025 0.05 -l 5 10 | \
+#     python -u config/parallel.py --config rmsc03 --log_folder pov_window --params mm-pov mm-window-size \
+#       --param_file - -t ABM -d 20200603
 import argparse
 import itertools
 from util import numeric
@@ -7,20 +7,25 @@
 ### market behave something like historical reality in the absence of whatever
 ### experiment we are running with more active agent types.
 
+### If a store directory (or FundamentalStore) is given, each symbol's trades for
+### the historical date are read from a memory-mapped file in the store, which is
+### built from the trade file the first time that date is simulated.
+
 import datetime as dt
 import numpy as np
 import pandas as pd
 import os, sys
 
 from math import sqrt
-from util.util import print, log_print
-
-from joblib import Memory
-mem = Memory(cachedir='./cache', verbose=0)
+from util.util import log_print, shared_input
+from util.oracle.FundamentalStore import FundamentalStore, PriceSeries
 
 
-#@mem.cache
 def read_trades(trade_file, symbols):
+  # The same trades are shared by every simulation of the date in this process.
+  return shared_input(('read_trades', trade_file, tuple(symbols)), lambda: _read_trades(trade_file, symbols))
+
+def _read_trades(trade_file, symbols):
   log_print ("Data not cached.  This will take a minute...")
 
   df = pd.read_pickle(trade_file, compression='bz2')
@@ -39,9 +44,10 @@ def read_trades(trade_file, symbols):
 
 class DataOracle:
 
-  def __init__(self, historical_date = None, symbols = None, data_dir = None):
+  def __init__(self, historical_date = None, symbols = None, data_dir = None, store = None):
     self.historical_date = historical_date
     self.symbols = symbols
+    self.store = FundamentalStore(store) if isinstance(store, str) else store
 
     self.mkt_open = None
 
@@ -58,7 +64,7 @@ class DataOracle:
     log_print ("DataOracle initializing 1m bars from file {}", bars_1m_file)
 
     then = dt.datetime.now()
-    self.df_trades = read_trades(trade_file, symbols)
+    self.trades = self.load_trades(trade_file)
     self.df_bars_1m = read_trades(bars_1m_file, symbols)
     now = dt.datetime.now()
 
@@ -67,6 +73,25 @@ class DataOracle:
 
 
 
+  # Return a dictionary of PriceSeries (trade prices in cents) by symbol, from the store
+  # if it already holds every symbol for the historical date.
+  def load_trades (self, trade_file):
+    h = self.historical_date
+
+    if self.store is not None and all(self.store.exists(symbol, h) for symbol in self.symbols):
+      return { symbol : self.store.load(symbol, h) for symbol in self.symbols }
+
+    df = read_trades(trade_file, self.symbols)
+    trades = { symbol : PriceSeries.from_series(df.loc[symbol, 'PRICE'], scale=100) for symbol in self.symbols }
+
+    if self.store is None: return trades
+
+    for symbol in self.symbols:
+      self.store.write(symbol, h, trades[symbol])
+
+    return { symbol : self.store.load(symbol, h) for symbol in self.symbols }
+
+
   # Return the daily open price for the symbol given.  The processing to create the 1m OHLC
   # files does propagate the earliest trade backwards, which helps.  The exchange should
   # pass its opening time.
@@ -90,17 +115,16 @@ class DataOracle:
     log_print ("Oracle: client requested {} as of {}", symbol, currentTime)
 
     # See when the last historical trade was, prior to simulated currentTime.
-    dt_last_trade = self.df_trades.loc[symbol].index.asof(currentTime)
-    if pd.notnull(dt_last_trade):
-      last_trade = self.df_trades.loc[(symbol,dt_last_trade)]
-
-      price = last_trade['PRICE']
-      time = dt_last_trade
+    trades = self.trades[symbol]
+    i = trades.asof(currentTime)
+    if i >= 0:
+      price = trades.prices[i] / 100
+      time = pd.Timestamp(trades.times[i], tz=currentTime.tz)
 
     # If we know the market open time, and the last historical trade was before it, use
     # the market open price instead.  If there were no trades before the requested time,
     # also use the market open price.
-    if pd.isnull(dt_last_trade) or (self.mkt_open and time < self.mkt_open):
+    if i < 0 or (self.mkt_open and time < self.mkt_open):
       price = self.getDailyOpenPrice(symbol, self.mkt_open, cents=False)
       time = self.mkt_open
 
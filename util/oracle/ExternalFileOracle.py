@@ -1,6 +1,6 @@
 import pandas as pd
-from util.util import log_print
-from bisect import bisect_left
+from util.util import log_print, shared_input
+from util.oracle.FundamentalStore import FundamentalStore, PriceSeries
 from math import sqrt
 
 
@@ -8,15 +8,19 @@ class ExternalFileOracle:
     """ Oracle using an external price series as the fundamental. The external series are specified files in the ABIDES
         config. If an agent requests the fundamental value in between two timestamps the returned fundamental value is
         linearly interpolated.
+
+        If store is given (a directory or a FundamentalStore), each symbol's series for the simulated day is read from
+        a memory-mapped file in the store, which is built from the external file the first time it is needed.
     """
-    def __init__(self, symbols):
+    def __init__(self, symbols, store=None):
         self.mkt_open = None
         self.symbols = symbols
-        self.fundamentals = self.load_fundamentals()
+        self.store = FundamentalStore(store) if isinstance(store, str) else store
+        self.fundamentals = self.load_fundamentals() if self.store is None else {}
         self.f_log = {symbol: [] for symbol in symbols}
 
     def load_fundamentals(self):
-        """ Method extracts fundamentals for each symbol into DataFrames. Note that input files must be of the form
+        """ Method extracts fundamentals for each symbol into PriceSeries. Note that input files must be of the form
             generated by util/formatting/mid_price_from_orderbook.py.
         """
         fundamentals = dict()
@@ -24,12 +28,28 @@ class ExternalFileOracle:
         for symbol, params_dict in self.symbols.items():
             fundamental_file_path = params_dict['fundamental_file_path']
             log_print("Oracle: loading {}", fundamental_file_path)
-            fundamental_df = pd.read_pickle(fundamental_file_path)
-            fundamentals.update({symbol: fundamental_df})
+            fundamental_df = shared_input(('read_pickle', fundamental_file_path),
+                                          lambda: pd.read_pickle(fundamental_file_path))
+            fundamentals.update({symbol: PriceSeries.from_series(fundamental_df)})
 
         log_print("Oracle: loading fundamental price series complete!")
         return fundamentals
 
+    def getFundamentalSeries(self, symbol, query_time):
+        """ Returns the PriceSeries for symbol, opening it from the store on the first query. """
+        if symbol in self.fundamentals: return self.fundamentals[symbol]
+
+        if not self.store.exists(symbol, query_time):
+            fundamental_file_path = self.symbols[symbol]['fundamental_file_path']
+            log_print("Oracle: storing {} in {}", fundamental_file_path, self.store.root)
+            self.store.write_series(symbol, pd.read_pickle(fundamental_file_path))
+
+        if not self.store.exists(symbol, query_time):
+            raise ValueError("No fundamental price series for symbol on this day", symbol, query_time)
+
+        self.fundamentals[symbol] = self.store.load(symbol, query_time)
+        return self.fundamentals[symbol]
+
     def getDailyOpenPrice(self, symbol, mkt_open):
 
         # Remember market open time.
@@ -53,36 +73,18 @@ class ExternalFileOracle:
 
         log_print("Oracle: client requested {} as of {}", symbol, query_time)
 
-        fundamental_series = self.fundamentals[symbol]
+        fundamental_series = self.getFundamentalSeries(symbol, query_time)
         time_of_query = pd.Timestamp(query_time)
 
-        series_open_time = fundamental_series.index[0]
-        series_close_time = fundamental_series.index[-1]
-
-        if time_of_query < series_open_time:  # time queried before open
-            return fundamental_series[0]
-        elif time_of_query > series_close_time:  # time queried after close
-            return fundamental_series[-1]
-        else:  # time queried during trading
-
-            # find indices either side of requested time
-            lower_idx = bisect_left(fundamental_series.index, time_of_query) - 1
-            upper_idx = lower_idx + 1 if lower_idx < len(fundamental_series.index) - 1 else lower_idx
-
-            # interpolate between values
-            lower_val = fundamental_series[lower_idx]
-            upper_val = fundamental_series[upper_idx]
-
-            log_print(f"DEBUG: lower_idx: {lower_idx}, lower_val: {lower_val}, upper_idx: {upper_idx}, upper_val: {upper_val}")
-
-            interpolated_price = self.getInterpolatedPrice(query_time, fundamental_series.index[lower_idx],
-                                                           fundamental_series.index[upper_idx], lower_val, upper_val)
-            log_print("Oracle: latest historical trade was {} at {}. Next historical trade is {}. "
-                      "Interpolated price is {}", lower_val, query_time, upper_val, interpolated_price)
+        interpolated_price = fundamental_series.interpolate(time_of_query)
 
+        # Queries outside the series get its first or last price and are not logged.
+        times = fundamental_series.times
+        if times[0] <= time_of_query.value <= times[-1]:
+            log_print("Oracle: interpolated price at {} is {}", query_time, interpolated_price)
             self.f_log[symbol].append({'FundamentalTime': query_time, 'FundamentalValue': interpolated_price})
 
-            return interpolated_price
+        return interpolated_price
 
     def observePrice(self, symbol, currentTime, sigma_n=0.0001, random_state=None):
         """ Make observation of price at a given time.
@@ -119,7 +121,8 @@ class ExternalFileOracle:
             :type price_high: float
             :return float of interpolated price:
         """
-        log_print(f'DEBUG: current_time: {current_time} time_low {time_low} time_high: {time_high} price_low:  {price_low} price_high: {price_high}' )
+        log_print('DEBUG: current_time: {} time_low {} time_high: {} price_low:  {} price_high: {}',
+                  current_time, time_low, time_high, price_low, price_high)
         delta_y = price_high - price_low
         delta_x = (time_high - time_low).total_seconds()
 
@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class PriceSeries:
+    """ A time-sorted price series held as two int64 arrays: times in nanoseconds since the epoch and prices in
+        integer cents.  The arrays may be memory-mapped from a FundamentalStore file.  Lookups are binary searches
+        over the times and accept a single pd.Timestamp or an array of them.
+    """
+
+    def __init__(self, times, prices):
+        if len(times) != len(prices):
+            raise ValueError("PriceSeries times and prices must have the same length", len(times), len(prices))
+        if len(times) == 0:
+            raise ValueError("PriceSeries must hold at least one price")
+
+        self.times = times
+        self.prices = prices
+
+    @classmethod
+    def from_series(cls, series, scale=1):
+        """ Builds a PriceSeries from a pd.Series of prices indexed by time.  Prices are multiplied by scale (e.g. 100
+            for prices in dollars) and rounded to integer cents.
+            :param series: prices indexed by time
+            :type series: pd.Series
+            :param scale: multiplier converting the series prices to cents
+            :type scale: int
+        """
+        series = series.sort_index(kind='stable')
+        times = np.ascontiguousarray(series.index.asi8, dtype=np.int64)
+        prices = np.round(series.to_numpy(dtype=np.float64) * scale).astype(np.int64)
+
+        return cls(times, prices)
+
+    def __len__(self):
+        return len(self.times)
+
+    def to_series(self):
+        """ Returns the prices as a pd.Series indexed by (tz-naive) time. """
+        return pd.Series(np.asarray(self.prices), index=pd.DatetimeIndex(np.asarray(self.times)))
+
+    @staticmethod
+    def _ns(t):
+        # Integer nanoseconds for a pd.Timestamp, or an array of them for anything list-like.
+        if np.ndim(t) == 0: return pd.Timestamp(t).value
+        return pd.DatetimeIndex(t).asi8
+
+    def asof(self, t):
+        """ Returns the position of the latest price at or before t, or -1 where there is none. """
+        return np.searchsorted(self.times, self._ns(t), side='right') - 1
+
+    def interpolate(self, t):
+        """ Returns the price at t, linearly interpolated between the prices either side of it.  Times before the
+            first price or after the last one get the first or last price.
+            :return: float (or array of floats) of interpolated price in cents
+        """
+        times, prices = self.times, self.prices
+        t = self._ns(t)
+
+        if len(times) == 1: return np.full(np.shape(t), prices[0], dtype=np.float64)[()]
+
+        # The prices either side of t: hi is the first time at or after t.
+        hi = np.clip(np.searchsorted(times, t, side='left'), 1, len(times) - 1)
+        lo = hi - 1
+
+        t_lo, t_hi = times[lo], times[hi]
+        p_lo, p_hi = prices[lo], prices[hi]
+
+        # Fraction of the interval elapsed at t, clamped so times outside the series get its end prices.
+        span = t_hi - t_lo
+        frac = np.clip(np.divide(t - t_lo, span, out=np.zeros(np.shape(span)), where=span > 0), 0, 1)
+
+        return (p_lo + (p_hi - p_lo) * frac)[()]
+
+
+class FundamentalStore:
+    """ On-disk store of fundamental or trade price series shared by the oracles.
+
+        Each symbol-day is one .npy file under root holding a 2 x n int64 array: the row of times (ns since the
+        epoch) and the row of prices (integer cents), sorted by time.  Files are opened memory-mapped, so lookups
+        only touch the pages they need, and simulations running in parallel on one machine share a single copy of
+        each day in the page cache instead of each loading its own.
+
+        Files are written once (atomically, so concurrent workers may race to build the same day) and never
+        modified.  Delete a file to rebuild it from its source data.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+        # (symbol, date) -> memory-mapped PriceSeries opened so far.
+        self.series = {}
+
+    def path(self, symbol, date):
+        return os.path.join(self.root, '{}_{}.npy'.format(symbol, pd.Timestamp(date).strftime('%Y%m%d')))
+
+    def exists(self, symbol, date):
+        return os.path.exists(self.path(symbol, date))
+
+    def write(self, symbol, date, series):
+        """ Writes the PriceSeries for symbol on date. """
+        os.makedirs(self.root, exist_ok=True)
+
+        path = self.path(symbol, date)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+
+        with open(tmp, 'wb') as f:
+            np.save(f, np.vstack((series.times, series.prices)).astype(np.int64))
+        os.replace(tmp, path)
+
+        self.series.pop((symbol, pd.Timestamp(date).normalize()), None)
+
+    def write_series(self, symbol, series, scale=1):
+        """ Writes a pd.Series of prices indexed by time, one file per day it covers.  See PriceSeries.from_series. """
+        for date, day in series.groupby(series.index.normalize()):
+            self.write(symbol, date, PriceSeries.from_series(day, scale=scale))
+
+    def load(self, symbol, date):
+        """ Returns the memory-mapped PriceSeries for symbol on date.  Raises FileNotFoundError if it is not stored. """
+        key = (symbol, pd.Timestamp(date).normalize())
+
+        if key not in self.series:
+            a = np.load(self.path(symbol, date), mmap_mode='r')
+            self.series[key] = PriceSeries(a[0], a[1])
+
+        return self.series[key]
@@ -9,16 +9,22 @@
 ### Historical dates are effectively meaningless to this oracle.  It is driven by
 ### the numpy random number seed contained within the experimental config file.
 ### This oracle uses the nanoseconds portion of the current simulation time as
-### discrete "time steps".  A suggestion: to keep wallclock runtime reasonable,
-### have the agents operate for only ~1000 nanoseconds, but interpret nanoseconds
-### as seconds or minutes.
+### discrete "time steps".
+
+### The series is never materialized.  The discrete mean-reverting process
+### r[t] = kappa * r_bar + (1 - kappa) * r[t-1] + shock[t] has a closed form over
+### any number of steps d: r[t+d] is normal with mean r_bar + (1-kappa)^d (r[t] - r_bar)
+### and variance sigma_s * (1 - (1-kappa)^2d) / (1 - (1-kappa)^2).  The oracle
+### samples the value only at the timestamps agents actually query, conditioned on
+### the neighbouring values it has already revealed, and caches that path so any
+### timestamp always returns the same value.  The floor at zero is applied at the
+### queried points only.
 
-import datetime as dt
 import numpy as np
 import pandas as pd
-import os, random, sys
 
-from math import sqrt
+from bisect import bisect_left
+from math import exp, expm1, log, sqrt
 from util.util import log_print
 
 
@@ -26,60 +32,97 @@ class MeanRevertingOracle:
 
   def __init__(self, mkt_open, mkt_close, symbols):
     # Symbols must be a dictionary of dictionaries with outer keys as symbol names and
-    # inner keys: r_bar, kappa, sigma_s.
+    # inner keys: r_bar, kappa, sigma_s.  An optional inner key random_state supplies
+    # the np.random.RandomState used to generate that symbol's fundamental series.
     self.mkt_open = mkt_open
     self.mkt_close = mkt_close
     self.symbols = symbols
 
-    # The dictionary r holds the fundamenal value series for each symbol.
+    # The dictionary r holds, for each symbol, the revealed path of the fundamental
+    # value series: parallel sorted lists of times (integer ns) and values (unrounded).
     self.r = {}
 
-    then = dt.datetime.now()
+    # Per-symbol random state for the fundamental series.  When the config does not
+    # supply one, it is seeded from the global np.random PRNG, so it is important to
+    # create the oracle BEFORE the agents.  In this way the addition of a new agent
+    # will not affect the sequence created.  (Observations using the oracle will use
+    # an agent's PRNG and thus not cause a problem.)
+    self.random_state = {}
 
     for symbol in symbols:
       s = symbols[symbol]
-      log_print ("MeanRevertingOracle computing fundamental value series for {}", symbol)
-      self.r[symbol] = self.generate_fundamental_value_series(symbol=symbol, **s)
-    
-    now = dt.datetime.now()
+      log_print ("MeanRevertingOracle initializing fundamental value series for {}", symbol)
+
+      if 'random_state' in s:
+        self.random_state[symbol] = s['random_state']
+      else:
+        self.random_state[symbol] = np.random.RandomState(seed=np.random.randint(low=0, high=2 ** 32, dtype='uint64'))
+
+      self.r[symbol] = ([self._ns(mkt_open)], [float(s['r_bar'])])
 
     log_print ("MeanRevertingOracle initialized for symbols {}", symbols)
-    log_print ("MeanRevertingOracle initialization took {}", now - then)
 
-  def generate_fundamental_value_series(self, symbol, r_bar, kappa, sigma_s):
-    # Generates the fundamental value series for a single stock symbol.  r_bar is the
-    # mean fundamental value, kappa is the mean reversion coefficient, and sigma_s
-    # is the shock variance.  (Note: NOT STANDARD DEVIATION.)
+  @staticmethod
+  def _ns(t):
+    # Integer nanoseconds for a pd.Timestamp (or an integer already in ns).
+    return getattr(t, 'value', t)
+
+  def _step(self, symbol, d):
+    # Returns ((1-kappa)^d, variance of the accumulated shocks) over d time steps.
+    s = self.symbols[symbol]
+    a = 1 - s['kappa']
+    var = s['sigma_s']
+
+    if a == 1: return 1.0, var * d
+
+    if 0 < a < 1:
+      la = log(a)
+      return exp(d * la), var * expm1(2 * d * la) / expm1(2 * la)
 
-    # Because the oracle uses the global np.random PRNG to create the fundamental value
-    # series, it is important to create the oracle BEFORE the agents.  In this way the
-    # addition of a new agent will not affect the sequence created.  (Observations using
-    # the oracle will use an agent's PRNG and thus not cause a problem.)
+    return a ** d, var * (1 - a ** (2 * d)) / (1 - a * a)
 
-    # Turn variance into std.
-    sigma_s = sqrt(sigma_s)
+  def fundamental_at(self, symbol, t):
+    """ Returns the (unrounded) fundamental value of symbol at time t, sampling it if it
+        has not been revealed yet.
+    """
+    times, values = self.r[symbol]
+    t = self._ns(t)
 
-    # Create the time series into which values will be projected and initialize the first value.
-    date_range = pd.date_range(self.mkt_open, self.mkt_close, closed='left', freq='N')
+    i = bisect_left(times, t)
+    if i < len(times) and times[i] == t: return values[i]
 
-    s = pd.Series(index=date_range)
-    r = np.zeros(len(s.index))
-    r[0] = r_bar #+ r_bar * 0.15
+    # Before the first revealed time (market open), the series has not started.
+    if i == 0: return values[0]
 
-    # Predetermine the random shocks for all time steps (at once, for computation speed).
-    shock = np.random.normal(scale=sigma_s, size=(r.shape[0]))
+    r_bar = self.symbols[symbol]['r_bar']
+    y1 = values[i - 1] - r_bar
+    a1, v1 = self._step(symbol, t - times[i - 1])
 
-    # Compute the mean reverting fundamental value series.
-    for t in range(1, r.shape[0]):
-      r[t] = max(0, (kappa * r_bar) + ( (1 - kappa) * r[t-1] ) + shock[t])
+    if i == len(times):
+      # Beyond the revealed path: sample forward from the latest revealed value.
+      mean, var = a1 * y1, v1
+    else:
+      # Between two revealed values: sample from the distribution conditioned on both.
+      y2 = values[i] - r_bar
+      a2, v2 = self._step(symbol, times[i] - t)
+
+      if v1 == 0 or v2 == 0:
+        mean, var = (a1 * y1, 0.0) if v1 == 0 else (y2 / a2 if a2 else 0.0, 0.0)
+      else:
+        precision = 1 / v1 + a2 * a2 / v2
+        mean = (a1 * y1 / v1 + a2 * y2 / v2) / precision
+        var = 1 / precision
+
+    v = r_bar + mean
+    if var > 0: v = self.random_state[symbol].normal(loc=v, scale=sqrt(var))
 
-    # Replace the series values with the fundamental value series.  Round and convert to
-    # integer cents.
-    s[:] = np.round(r)
-    s = s.astype(int)
-    
-    return (s)
+    # The process is not permitted to become negative.
+    v = max(0.0, v)
 
+    times.insert(i, t)
+    values.insert(i, v)
+
+    return v
 
   # Return the daily open price for the symbol given.  In the case of the MeanRevertingOracle,
   # this will simply be the first fundamental value, which is also the fundamental mean.
@@ -92,7 +135,7 @@ class MeanRevertingOracle:
   
     log_print ("Oracle: client requested {} at market open: {}", symbol, self.mkt_open)
   
-    open = self.r[symbol].loc[self.mkt_open]
+    open = int(round(self.fundamental_at(symbol, self.mkt_open)))
     log_print ("Oracle: market open price was was {}", open)
   
     return open
@@ -112,9 +155,12 @@ class MeanRevertingOracle:
   def observePrice(self, symbol, currentTime, sigma_n = 1000, random_state = None):
     # If the request is made after market close, return the close price.
     if currentTime >= self.mkt_close:
-      r_t = self.r[symbol].loc[self.mkt_close - pd.Timedelta('1ns')]
+      r_t = self.fundamental_at(symbol, self.mkt_close - pd.Timedelta('1ns'))
     else:
-      r_t = self.r[symbol].loc[currentTime]
+      r_t = self.fundamental_at(symbol, currentTime)
+
+    # Reminder: all simulator prices are specified in integer cents.
+    r_t = int(round(r_t))
  
     # Generate a noisy observation of fundamental value at the current time.
     if sigma_n == 0:
@@ -43,13 +43,21 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     # The dictionary r holds the most recent fundamental values for each symbol.
     self.r = {}
 
-    # The dictionary megashocks holds the time series of megashocks for each symbol.
-    # The last one will always be in the future (relative to the current simulation time).
+    # The dictionary megashocks holds the schedule of megashocks for each symbol: a
+    # DatetimeIndex of arrival times and an array of values, drawn for the whole trading
+    # day at initialization.  next_megashock holds the index of the first megashock not
+    # yet applied to the fundamental value series.
     #
     # Without these, the OU process just makes a noisy return to the mean and then stays there
     # with relatively minor noise.  Here we want them to follow a Poisson process, so we sample
     # from an exponential distribution for the separation intervals.
     self.megashocks = {}
+    self.next_megashock = {}
+
+    # The dictionary fundamentals memoizes the true fundamental value of each symbol at each
+    # timestamp computed so far, so that many agents observing at the same instant only
+    # draw their own observation noise.
+    self.fundamentals = {}
 
     then = dt.datetime.now()
 
@@ -60,17 +68,10 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
       log_print ("SparseMeanRevertingOracle computing initial fundamental value for {}", symbol)
       self.r[symbol] = (mkt_open, s['r_bar'])
       self.f_log[symbol] = [{ 'FundamentalTime' : mkt_open, 'FundamentalValue' : s['r_bar'] }]
+      self.fundamentals[symbol] = { mkt_open : s['r_bar'] }
 
-      # Compute the time and value of the first megashock.  Note that while the values are
-      # mean-zero, they are intentionally bimodal (i.e. we always want to push the stock
-      # some, but we will tend to cancel out via pushes in opposite directions).
-      ms_time_delta = np.random.exponential(scale=1.0 / s['megashock_lambda_a'])
-      mst = self.mkt_open + pd.Timedelta(ms_time_delta, unit='ns')
-      msv = s['random_state'].normal(loc = s['megashock_mean'], scale = sqrt(s['megashock_var']))
-      msv = msv if s['random_state'].randint(2) == 0 else -msv
-
-      self.megashocks[symbol] = [{ 'MegashockTime' : mst, 'MegashockValue' : msv }]
-
+      self.megashocks[symbol] = self.generate_megashocks(symbol)
+      self.next_megashock[symbol] = 0
 
     now = dt.datetime.now()
 
@@ -78,6 +79,38 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     log_print ("SparseMeanRevertingOracle initialization took {}", now - then)
 
 
+  # This method draws the megashock schedule for a single stock symbol: every megashock that
+  # arrives before market close, plus the first one after it.  Arrival times follow a Poisson
+  # process (exponential separation intervals, drawn from the global np.random PRNG like the
+  # rest of the oracle's setup).  Values are drawn from the symbol's random state.  Note that
+  # while the values are mean-zero, they are intentionally bimodal (i.e. we always want to push
+  # the stock some, but we will tend to cancel out via pushes in opposite directions).
+  def generate_megashocks(self, symbol):
+    s = self.symbols[symbol]
+
+    scale = 1.0 / s['megashock_lambda_a']
+    duration = (self.mkt_close - self.mkt_open) / np.timedelta64(1, 'ns')
+
+    # Draw separation intervals until an arrival falls after market close.  The first is drawn
+    # alone, so that a day without megashocks consumes the same random numbers as before.
+    offsets = np.random.exponential(scale=scale, size=1)
+    while offsets[-1] < duration:
+      gaps = np.random.exponential(scale=scale, size=int(duration / scale) + 16)
+      offsets = np.concatenate((offsets, offsets[-1] + np.cumsum(gaps)))
+
+    offsets = offsets[:np.searchsorted(offsets, duration, side='left') + 1]
+
+    # The arrival after close is never applied; keep it representable as a timestamp.
+    offsets = np.minimum(offsets, pd.Timestamp.max.value - self.mkt_open.value)
+    times = self.mkt_open + pd.to_timedelta(offsets.astype(np.int64), unit='ns')
+
+    n = len(offsets)
+    values = s['random_state'].normal(loc = s['megashock_mean'], scale = sqrt(s['megashock_var']), size = n)
+    values = np.where(s['random_state'].randint(2, size = n) == 0, values, -values)
+
+    return { 'MegashockTime' : times, 'MegashockValue' : values }
+
+
   # This method takes a requested timestamp to which we should advance the fundamental,
   # a value adjustment to apply after advancing time (must pass zero if none),
   # a symbol for which to advance time, a previous timestamp, and a previous fundamental
@@ -135,6 +168,10 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     # Agent observations using the oracle will use an agent's random state object.
     s = self.symbols[symbol]
 
+    # If the fundamental at this time has already been computed, just use it.
+    fundamentals = self.fundamentals[symbol]
+    if currentTime in fundamentals: return fundamentals[currentTime]
+
     # This is the previous fundamental time and value.
     pt, pv = self.r[symbol]
 
@@ -146,37 +183,30 @@ class SparseMeanRevertingOracle(MeanRevertingOracle):
     # We may not jump straight to the requested time, because we periodically apply
     # megashocks to push the series around (not always away from the mean) and we need
     # to compute OU at each of those times, so the aftereffects of the megashocks
-    # properly affect the remaining OU interval.
+    # properly affect the remaining OU interval.  Every scheduled megashock before the
+    # new time is handled in order.
 
-    mst = self.megashocks[symbol][-1]['MegashockTime']
-    msv = self.megashocks[symbol][-1]['MegashockValue']
+    times = self.megashocks[symbol]['MegashockTime']
+    values = self.megashocks[symbol]['MegashockValue']
 
-    while mst < currentTime:
-      # A megashock is scheduled to occur before the new time to which we are advancing.  Handle it.
+    first = self.next_megashock[symbol]
+    last = times.searchsorted(currentTime, side='left')
 
+    for i in range(first, last):
       # Advance time from the previous time to the time of the megashock using the OU process and
-      # then applying the next megashock value.
-      v = self.compute_fundamental_at_timestamp(mst, msv, symbol, pt, pv)
+      # then applying the megashock value.
+      mst = times[i]
+      v = self.compute_fundamental_at_timestamp(mst, values[i], symbol, pt, pv)
 
       # Update our "previous" values for the next computation.
       pt, pv = mst, v
 
-      # Since we just surpassed the last megashock time, compute the next one, which we might or
-      # might not immediately consume.  This works just like the first time (in __init__()).
-
-      mst = pt + pd.Timedelta('{}ns'.format(np.random.exponential(scale = 1.0 / s['megashock_lambda_a'])))
-      msv = s['random_state'].normal(loc = s['megashock_mean'], scale = sqrt(s['megashock_var']))
-      msv = msv if s['random_state'].randint(2) == 0 else -msv
-
-      self.megashocks[symbol].append({ 'MegashockTime' : mst, 'MegashockValue' : msv })
-
-      # The loop will continue until there are no more megashocks before the time requested
-      # by the calling method.
-
+    self.next_megashock[symbol] = max(first, last)
 
     # Once there are no more megashocks to apply (i.e. the next megashock is in the future, after
     # currentTime), then finally advance using the OU process to the requested time.
     v = self.compute_fundamental_at_timestamp(currentTime, 0, symbol, pt, pv)
+    fundamentals[currentTime] = v
 
     return (v)
 
@@ -51,10 +51,20 @@ class Order:
         return oid
 
     def to_dict(self):
-        as_dict = deepcopy(self).__dict__
+        # Order fields are immutable scalars, so a shallow copy of the attributes is a snapshot.
+        as_dict = self.__dict__.copy()
         as_dict['time_placed'] = self.time_placed.isoformat()
         return as_dict
 
+    def clone(self, **changes):
+        # Lightweight copy of this order, optionally with some fields changed (e.g. quantity
+        # and fill_price for an execution).  Unlike deepcopy, this neither re-runs __init__
+        # nor re-registers the order id, so it is cheap enough for the matching path.
+        order = object.__new__(self.__class__)
+        order.__dict__.update(self.__dict__)
+        order.__dict__.update(changes)
+        return order
+
     def __copy__(self):
         raise NotImplementedError
 
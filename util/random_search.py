@@ -1,3 +1,5 @@
+# Prints one comma-separated parameter tuple per line, which config/parallel.py can run as a sweep (see
+# util/grid_search.py).
 import argparse
 import itertools
 from util import numeric
@@ -1,3 +1,5 @@
+import pickle
+
 import numpy as np
 import pandas as pd
 from contextlib import contextmanager
@@ -18,11 +20,18 @@ silent_mode = False
 # Use it for all permanent logging print statements to allow fastest possible
 # execution when verbose flag is not set.  This is especially fast because
 # the arguments will not even be formatted when in silent mode.
+#
+# The arguments are still *evaluated* by the caller, though.  On hot paths,
+# where an argument costs something to build (fmtTime, an f-string, an
+# order's __str__), guard the call so nothing is evaluated in silent mode:
+#
+#   if not be_silent(): log_print ("At {}, ...", self.kernel.fmtTime(t))
 def log_print (str, *args):
   if not silent_mode: print (str.format(*args))
 
 
-# Accessor method for the global silent_mode variable.
+# Accessor method for the global silent_mode variable.  Used to gate log_print
+# calls whose arguments are expensive to evaluate.
 def be_silent ():
   return silent_mode
 
@@ -56,6 +65,29 @@ def get_wake_time(open_time, close_time, a=0, b=1):
 
     return wake_time
 
+# Read-only inputs (historical data files and the like) loaded once per process, by key.  A sweep of
+# simulations (see util.Sweep) loads them in the parent process before forking its workers, which then
+# share the parent's copy instead of each reading the files again.
+_shared_inputs = {}
+
+def shared_input(key, build):
+    """ Returns the input stored under key, calling build() to create it the first time.  Callers must not modify
+        the returned object.
+    """
+    if key not in _shared_inputs:
+        _shared_inputs[key] = build()
+    return _shared_inputs[key]
+
+def picklable(value):
+    """ Returns value if it can be pickled, else its repr: for results sent back from a forked simulation (a
+        variant of Kernel.forkVariants or a sweep worker) to the parent process.
+    """
+    try:
+        pickle.dumps(value)
+        return value
+    except Exception:
+        return repr(value)
+
 def numeric(s):
     """ Returns numeric type from string, stripping commas from the right.
         Adapted from https://stackoverflow.com/a/379966."""